@@ -0,0 +1,175 @@
+import asyncio
+import os
+from functools import partial
+
+from fastapi import APIRouter, Request
+from fastapi.responses import JSONResponse
+
+from food_detector import detect_food_items_async
+from cache import detection_cache
+from image_processor import detect_annotations_async
+from ingredients import ingredient_counts
+from prompts import CUISINES, DEFAULT_DIET, DIETS
+from recipe_generator import generate_recipe_suggestions_async, recipe_sections_async
+from utils import count_food_items, parse_recipe_sections
+
+# Inputs accepted in one batch request, and how many of them run at once
+API_BATCH_MAX_ITEMS = int(os.environ.get("API_BATCH_MAX_ITEMS", "32"))
+API_BATCH_CONCURRENCY = int(os.environ.get("API_BATCH_CONCURRENCY", "8"))
+
+router = APIRouter(prefix="/api")
+
+def error(message, status_code=400):
+    return JSONResponse({"error": message}, status_code=status_code)
+
+def recipe_request(body):
+    # Validates a suggest/detail request body; raises ValueError naming the bad field
+    if not isinstance(body, dict):
+        raise ValueError("request must be a JSON object")
+    ingredients = body.get("ingredients")
+    if not isinstance(ingredients, (list, dict)) or not ingredients:
+        raise ValueError("ingredients must be a non-empty list of names or an object of name: count")
+    if isinstance(ingredients, dict) and not all(isinstance(count, int) and not isinstance(count, bool) and count > 0 for count in ingredients.values()):
+        raise ValueError("ingredients counts must be positive integers")
+    counts = ingredient_counts(ingredients)
+    if not counts:
+        raise ValueError("ingredients contains no recognizable names")
+    diet = body.get("diet", DEFAULT_DIET)
+    if diet not in DIETS:
+        raise ValueError(f"diet must be one of {', '.join(DIETS)}")
+    cuisine = body.get("cuisine")
+    if cuisine not in CUISINES:
+        raise ValueError(f"cuisine must be one of {', '.join(CUISINES)}")
+    servings = body.get("servings", 4)
+    if isinstance(servings, bool) or not isinstance(servings, (int, float)) or servings <= 0:
+        raise ValueError("servings must be a positive number")
+    quick = body.get("quick", False)
+    if not isinstance(quick, bool):
+        raise ValueError("quick must be true or false")
+    return counts, diet, cuisine, servings, str(body.get("instructions") or ""), quick
+
+async def detect_one(image_bytes, quick=False):
+    if not image_bytes:
+        raise ValueError("empty image")
+    _, cache_key, annotations, cached = await detect_annotations_async(image_bytes, detect_food_items_async, False, quick)
+    result = {"hash": detection_cache.image_hash(cache_key), "cached": cached, "annotations": annotations, "counts": dict(count_food_items(annotations))}
+    if not annotations:
+        result["error"] = "no ingredients detected"
+    return result
+
+async def suggest_one(body):
+    counts, diet, cuisine, servings, instructions, quick = recipe_request(body)
+    recipes = await generate_recipe_suggestions_async(counts, diet, cuisine, servings, instructions, quick)
+    result = {"ingredients": dict(counts.items()), "recipes": recipes}
+    if not recipes:
+        result["error"] = "no recipes generated"
+    return result
+
+async def detail_one(body):
+    recipe_name = body.get("recipe") if isinstance(body, dict) else None
+    if not isinstance(recipe_name, str) or not recipe_name.strip():
+        raise ValueError("recipe must be a recipe name")
+    counts, diet, cuisine, servings, instructions, quick = recipe_request(body)
+    sections = await recipe_sections_async(recipe_name.strip(), counts, diet, cuisine, servings, instructions, parse_recipe_sections, quick=quick)
+    result = {"recipe": recipe_name.strip(), "sections": sections}
+    if not any(sections.values()):
+        result["error"] = "recipe generation failed"
+    return result
+
+async def run_batch(items, handle):
+    # Identical items in a batch share one model call through the caches and singleflight
+    semaphore = asyncio.Semaphore(API_BATCH_CONCURRENCY)
+    async def run(item):
+        async with semaphore:
+            try:
+                return await handle(item)
+            except ValueError as e:
+                return {"error": str(e)}
+            except Exception as e:
+                print(f"❌ API batch item failed: {e}")
+                return {"error": str(e)}
+    return await asyncio.gather(*(run(item) for item in items))
+
+async def single(handle, item):
+    try:
+        result = await handle(item)
+    except ValueError as e:
+        return error(str(e))
+    # Only a failed model call is reported as an error; bad input raised ValueError above
+    return JSONResponse(result, status_code=502 if "error" in result else 200)
+
+async def read_json(request):
+    try:
+        return await request.json()
+    except ValueError:
+        raise ValueError("body must be valid JSON")
+
+async def batch_items(request, field):
+    body = await read_json(request)
+    items = body.get(field) if isinstance(body, dict) else None
+    if not isinstance(items, list) or not items:
+        raise ValueError(f"{field} must be a non-empty list")
+    if len(items) > API_BATCH_MAX_ITEMS:
+        raise ValueError(f"at most {API_BATCH_MAX_ITEMS} {field} per batch")
+    return items
+
+def quick_param(request):
+    return request.query_params.get("quick", "").lower() in ("1", "true", "yes")
+
+@router.post("/detect")
+async def detect(request: Request):
+    # The image is the raw request body, or a multipart field named "file"
+    if request.headers.get("content-type", "").startswith("multipart/"):
+        form = await request.form()
+        upload = form.get("file")
+        image_bytes = await upload.read() if upload is not None and hasattr(upload, "read") else b""
+    else:
+        image_bytes = await request.body()
+    return await single(partial(detect_one, quick=quick_param(request)), image_bytes)
+
+@router.post("/detect/batch")
+async def detect_batch(request: Request):
+    # Multipart upload with one "files" field per image
+    form = await request.form()
+    uploads = [upload for upload in form.getlist("files") if hasattr(upload, "read")]
+    if not uploads:
+        return error("files must contain at least one image")
+    if len(uploads) > API_BATCH_MAX_ITEMS:
+        return error(f"at most {API_BATCH_MAX_ITEMS} files per batch")
+    images = [await upload.read() for upload in uploads]
+    results = await run_batch(images, partial(detect_one, quick=quick_param(request)))
+    for upload, result in zip(uploads, results):
+        result["filename"] = upload.filename
+    return JSONResponse({"results": results})
+
+@router.post("/suggest")
+async def suggest(request: Request):
+    try:
+        body = await read_json(request)
+    except ValueError as e:
+        return error(str(e))
+    return await single(suggest_one, body)
+
+@router.post("/suggest/batch")
+async def suggest_batch(request: Request):
+    try:
+        items = await batch_items(request, "requests")
+    except ValueError as e:
+        return error(str(e))
+    return JSONResponse({"results": await run_batch(items, suggest_one)})
+
+@router.post("/detail")
+async def detail(request: Request):
+    try:
+        body = await read_json(request)
+    except ValueError as e:
+        return error(str(e))
+    return await single(detail_one, body)
+
+@router.post("/detail/batch")
+async def detail_batch(request: Request):
+    try:
+        items = await batch_items(request, "requests")
+    except ValueError as e:
+        return error(str(e))
+    return JSONResponse({"results": await run_batch(items, detail_one)})
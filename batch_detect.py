@@ -0,0 +1,171 @@
+import argparse
+import json
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from food_detector import detect_food_items
+from image_processor import begin_detection, cache_detection, create_annotated_image, cv2
+from cache import detection_cache
+from detectors import tiered_detector
+from models import api_key_configured
+from storage import shared_store
+from utils import count_food_items
+
+IMAGE_EXTENSIONS = (".jpg", ".jpeg", ".png", ".webp", ".heic", ".heif")
+
+class RateLimiter:
+    def __init__(self, per_second):
+        self.interval = 1.0 / per_second if per_second > 0 else 0
+        self._next = time.monotonic()
+        self._lock = threading.Lock()
+
+    def wait(self):
+        if not self.interval:
+            return
+        with self._lock:
+            now = time.monotonic()
+            start = max(now, self._next)
+            self._next = start + self.interval
+        if start > now:
+            time.sleep(start - now)
+
+def iter_image_paths(input_dir=None, manifest=None):
+    if manifest:
+        with open(manifest, 'r', encoding='utf-8') as f:
+            for line in f:
+                line = line.strip()
+                if not line:
+                    continue
+                yield json.loads(line)["path"] if line.startswith("{") else line
+    if input_dir:
+        for root, dirs, files in os.walk(input_dir):
+            dirs.sort()
+            for name in sorted(files):
+                if name.lower().endswith(IMAGE_EXTENSIONS):
+                    yield os.path.join(root, name)
+
+def load_completed(output_path):
+    # Failed entries are left out so a resumed run retries them
+    completed = set()
+    if not os.path.exists(output_path):
+        return completed
+    with open(output_path, 'r', encoding='utf-8') as f:
+        for line in f:
+            try:
+                record = json.loads(line)
+            except ValueError:
+                continue
+            if not record.get("error"):
+                completed.add(record["path"])
+    return completed
+
+def detect_one(path, limiter, annotated_dir=None):
+    record = {"path": path}
+    timings = {}
+    try:
+        start = time.perf_counter()
+        with open(path, 'rb') as img_file:
+            image_bytes = img_file.read()
+        image, cache_key, annotations, prepared, model = begin_detection(image_bytes)
+        timings["prepare_ms"] = round((time.perf_counter() - start) * 1000, 1)
+        record["hash"] = detection_cache.image_hash(cache_key)
+        record["cached"] = annotations is not None
+
+        if annotations is None:
+            payload, mime_type, stats = prepared
+            record["bytes_sent"] = stats["bytes_after"]
+            # Only calls that escalate to Gemini count against the rate limit
+            answered = set()
+            def detect_remote(payload, mime_type):
+                limiter.wait()
+                return detect_food_items(payload, mime_type, model=model, on_model=answered.add)
+
+            start = time.perf_counter()
+            annotations = tiered_detector.detect(image, payload, mime_type, detect_remote)
+            timings["detect_ms"] = round((time.perf_counter() - start) * 1000, 1)
+            cache_detection(cache_key, model, answered, annotations)
+
+        record["annotations"] = annotations
+        record["counts"] = dict(count_food_items(annotations))
+        if not annotations:
+            record["error"] = "no ingredients detected"
+
+        if annotated_dir and annotations and image is not None:
+            start = time.perf_counter()
+            annotated = create_annotated_image(image, annotations)
+            if annotated is not None:
+                ok, encoded = cv2.imencode(".jpg", annotated)
+                if ok:
+                    annotated_path = os.path.join(annotated_dir, f"{record['hash']}.jpg")
+                    with open(annotated_path, 'wb') as f:
+                        f.write(encoded.tobytes())
+                    record["annotated_path"] = annotated_path
+            timings["annotate_ms"] = round((time.perf_counter() - start) * 1000, 1)
+    except Exception as e:
+        record["error"] = str(e)
+    record["timings"] = timings
+    return record
+
+def run_batch(paths, output_path, workers=4, rate=1.0, annotated_dir=None):
+    completed = load_completed(output_path)
+    if annotated_dir:
+        os.makedirs(annotated_dir, exist_ok=True)
+    output_dir = os.path.dirname(output_path)
+    if output_dir:
+        os.makedirs(output_dir, exist_ok=True)
+
+    limiter = RateLimiter(rate)
+    # Bound the number of submitted-but-unfinished images so huge directories don't queue up in memory
+    slots = threading.BoundedSemaphore(workers * 2)
+    write_lock = threading.Lock()
+    totals = {"done": 0, "failed": 0, "skipped": 0}
+
+    with open(output_path, 'a', encoding='utf-8') as out:
+        def finish(future):
+            record = future.result()
+            with write_lock:
+                out.write(json.dumps(record) + "\n")
+                out.flush()
+                totals["failed" if record.get("error") else "done"] += 1
+                processed = totals["done"] + totals["failed"]
+                if processed % 50 == 0:
+                    print(f"📊 Processed {processed} images ({totals['failed']} failed)")
+            slots.release()
+
+        with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="batch-detect") as executor:
+            for path in paths:
+                if path in completed:
+                    totals["skipped"] += 1
+                    continue
+                slots.acquire()
+                executor.submit(detect_one, path, limiter, annotated_dir).add_done_callback(finish)
+
+    print(f"✅ Batch finished: {totals['done']} detected, {totals['failed']} failed, {totals['skipped']} already done")
+    print(f"📊 Detection cache stats: {detection_cache.stats()}")
+    if shared_store is not None:
+        print(f"📊 Shared store stats: {shared_store.stats()}")
+    print(f"📊 Detector tier stats: {tiered_detector.stats()}")
+    return totals
+
+def main():
+    parser = argparse.ArgumentParser(description="Run ingredient detection over a directory or manifest of images.")
+    parser.add_argument("--input-dir", help="Directory to scan recursively for images")
+    parser.add_argument("--manifest", help="File listing image paths, one per line (plain paths or JSON objects with a 'path' key)")
+    parser.add_argument("--output", default="data/batch_detections.jsonl", help="JSONL results file; existing results are skipped on resume")
+    parser.add_argument("--annotated-dir", help="Also write annotated images here, named by content hash")
+    parser.add_argument("--workers", type=int, default=4, help="Concurrent detections")
+    parser.add_argument("--rate", type=float, default=1.0, help="Max Gemini detection calls per second (0 disables the limit)")
+    args = parser.parse_args()
+    if not api_key_configured():
+        print("❌ GEMINI_API_KEY environment variable not set")
+        exit(1)
+
+    if not args.input_dir and not args.manifest:
+        parser.error("one of --input-dir or --manifest is required")
+
+    run_batch(iter_image_paths(args.input_dir, args.manifest), args.output, args.workers, args.rate, args.annotated_dir)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,113 @@
+"""
+Measure the local recipe corpus at scale: bulk import, reload from SQLite,
+incremental adds and suggestion query latency.
+
+Generates a synthetic corpus whose ingredient popularity follows a Zipf-like
+curve, like real recipe collections, then queries it with fridge selections
+drawn the same way. A query is answered when enough recipes clear the
+coverage bar; otherwise the app would ask Gemini.
+
+    python benchmarks/bench_corpus.py --recipes 100000 --queries 2000
+"""
+import argparse
+import json
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from corpus import CORPUS_MIN_COVERAGE, CORPUS_MIN_RESULTS, RecipeCorpus
+from prompts import CUISINES, DIETS
+
+def make_vocabulary(size):
+    return [f"ingredient {i}" for i in range(size)]
+
+def pick_ingredients(rng, vocabulary, weights, low, high):
+    return list(set(rng.choices(vocabulary, weights=weights, k=rng.randint(low, high))))
+
+def make_recipes(rng, count, vocabulary, weights):
+    for i in range(count):
+        yield f"Recipe {i}", pick_ingredients(rng, vocabulary, weights, 2, 8), rng.choice(CUISINES), rng.choice(list(DIETS))
+
+def percentile(values, fraction):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * fraction))]
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the local recipe corpus.")
+    parser.add_argument("--recipes", type=int, default=100000)
+    parser.add_argument("--vocabulary", type=int, default=600, help="Distinct ingredients")
+    parser.add_argument("--queries", type=int, default=2000)
+    parser.add_argument("--adds", type=int, default=1000, help="Incremental single-recipe adds to time")
+    parser.add_argument("--seed", type=int, default=7)
+    parser.add_argument("--output", help="Also write the results here as JSON")
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    vocabulary = make_vocabulary(args.vocabulary)
+    weights = [1 / (rank + 1) for rank in range(len(vocabulary))]
+
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, "corpus.sqlite3")
+        corpus = RecipeCorpus(path, CORPUS_MIN_COVERAGE, CORPUS_MIN_RESULTS)
+        start = time.perf_counter()
+        imported = corpus.add_many(make_recipes(rng, args.recipes, vocabulary, weights))
+        import_s = time.perf_counter() - start
+
+        reloaded = RecipeCorpus(path, CORPUS_MIN_COVERAGE, CORPUS_MIN_RESULTS)
+        start = time.perf_counter()
+        reloaded.load()
+        load_s = time.perf_counter() - start
+
+        latencies, answered = [], 0
+        for _ in range(args.queries):
+            selection = pick_ingredients(rng, vocabulary, weights, 4, 10)
+            start = time.perf_counter()
+            names = corpus.suggest(selection, rng.choice(list(DIETS)), rng.choice(CUISINES))
+            latencies.append((time.perf_counter() - start) * 1000)
+            answered += bool(names)
+
+        add_latencies = []
+        for i in range(args.adds):
+            recipe = (f"Added {i}", pick_ingredients(rng, vocabulary, weights, 2, 8), rng.choice(CUISINES), rng.choice(list(DIETS)))
+            start = time.perf_counter()
+            corpus.add(*recipe)
+            add_latencies.append((time.perf_counter() - start) * 1000)
+        # The first query after adds rebuilds the touched postings
+        start = time.perf_counter()
+        corpus.suggest(pick_ingredients(rng, vocabulary, weights, 4, 10), "Non-Vegetarian", CUISINES[0])
+        after_adds_ms = (time.perf_counter() - start) * 1000
+
+    report = {
+        "recipes": imported,
+        "vocabulary": args.vocabulary,
+        "import_s": round(import_s, 3),
+        "load_s": round(load_s, 3),
+        "query_ms": {
+            "p50": round(statistics.median(latencies), 3),
+            "p95": round(percentile(latencies, 0.95), 3),
+            "p99": round(percentile(latencies, 0.99), 3),
+            "max": round(max(latencies), 3),
+        },
+        "answered_locally": round(answered / args.queries, 3),
+        "add_ms": {"p50": round(statistics.median(add_latencies), 3), "p95": round(percentile(add_latencies, 0.95), 3)},
+        "first_query_after_adds_ms": round(after_adds_ms, 3),
+    }
+
+    print(f"📊 {report['recipes']} recipes over {args.vocabulary} ingredients: import {report['import_s']}s, reload {report['load_s']}s")
+    print(f"   query ms: p50 {report['query_ms']['p50']}, p95 {report['query_ms']['p95']}, p99 {report['query_ms']['p99']}, max {report['query_ms']['max']}")
+    print(f"   answered locally: {report['answered_locally']:.1%} (coverage >= {CORPUS_MIN_COVERAGE}, >= {CORPUS_MIN_RESULTS} recipes)")
+    print(f"   incremental add ms: p50 {report['add_ms']['p50']}, p95 {report['add_ms']['p95']}; first query after adds {report['first_query_after_adds_ms']} ms")
+
+    if args.output:
+        os.makedirs(os.path.dirname(args.output) or ".", exist_ok=True)
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+        print(f"✅ Wrote {args.output}")
+
+if __name__ == "__main__":
+    main()
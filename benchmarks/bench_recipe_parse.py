@@ -0,0 +1,125 @@
+"""
+Compare the free-text section parser with the structured JSON parser.
+
+Generates synthetic recipes in both formats, including the kinds of formatting
+drift seen in real responses, and reports parse time and failure rate.
+A recipe counts as failed when any rendered section comes back empty.
+
+    python benchmarks/bench_recipe_parse.py --recipes 2000
+"""
+import argparse
+import json
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from utils import parse_recipe_sections, parse_structured_recipe
+
+RENDERED_SECTIONS = ['ingredients', 'prep_time', 'cook_time', 'equipment', 'calories', 'instructions', 'tips']
+
+TEXT_HEADERS = [
+    ('INGREDIENTS:', 'ingredients'),
+    ('PREP TIME:', 'prep_time'),
+    ('COOK TIME:', 'cook_time'),
+    ('EQUIPMENT NEEDED:', 'equipment'),
+    ('SERVING SIZE:', 'serving_size'),
+    ('CALORIES:', 'calories'),
+    ('INSTRUCTIONS:', 'instructions'),
+    ('TIPS FOR SUCCESS:', 'tips'),
+]
+
+def sample_recipe(rng):
+    return {
+        "ingredients": [f"{rng.randint(1, 500)} g ingredient {i}" for i in range(rng.randint(5, 15))],
+        "prep_minutes": rng.randint(5, 45),
+        "cook_minutes": rng.randint(5, 90),
+        "equipment": [f"tool {i}" for i in range(rng.randint(2, 6))],
+        "serving_size": rng.randint(1, 8),
+        "calories_per_serving": rng.randint(150, 900),
+        "instructions": [f"Do step {i} carefully until done." for i in range(rng.randint(4, 12))],
+        "tips": [f"Tip {i}" for i in range(rng.randint(1, 4))],
+    }
+
+def as_text(recipe, rng, drift):
+    values = {
+        'ingredients': recipe['ingredients'],
+        'prep_time': [str(recipe['prep_minutes'])],
+        'cook_time': [str(recipe['cook_minutes'])],
+        'equipment': recipe['equipment'],
+        'serving_size': [f"Serves {recipe['serving_size']}"],
+        'calories': [str(recipe['calories_per_serving'])],
+        'instructions': [f"{i}. {step}" for i, step in enumerate(recipe['instructions'], 1)],
+        'tips': recipe['tips'],
+    }
+    lines = []
+    for header, section in TEXT_HEADERS:
+        body = values[section]
+        if drift and rng.random() < 0.15:
+            # Typical drift: markdown headings without the colon, or the value on the header line
+            kind = rng.choice(["markdown", "inline"])
+            if kind == "markdown":
+                lines.append(f"## {header.rstrip(':').title()}")
+                lines.extend(body)
+            else:
+                lines.append(f"**{header}** {body[0]}")
+                lines.extend(body[1:])
+            continue
+        lines.append(f"**{header}**" if drift and rng.random() < 0.5 else header)
+        lines.extend(body)
+        lines.append("")
+    return "\n".join(lines)
+
+def as_json(recipe, rng, drift):
+    data = dict(recipe)
+    if drift and rng.random() < 0.15:
+        kind = rng.choice(["string_number", "fenced", "truncated"])
+        if kind == "string_number":
+            data["prep_minutes"] = f"{data['prep_minutes']} minutes"
+        elif kind == "fenced":
+            return f"```json\n{json.dumps(data)}\n```"
+        else:
+            text = json.dumps(data)
+            return text[:int(len(text) * 0.8)]
+    return json.dumps(data)
+
+def run(parse, documents):
+    failures = 0
+    start = time.perf_counter()
+    for document in documents:
+        sections = parse(document)
+        if sections is None or not all(sections[name] for name in RENDERED_SECTIONS):
+            failures += 1
+    elapsed = time.perf_counter() - start
+    return {"us_per_recipe": round(elapsed / len(documents) * 1e6, 2), "failure_rate": round(failures / len(documents), 4)}
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--recipes", type=int, default=2000)
+    parser.add_argument("--seed", type=int, default=7)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    recipes = [sample_recipe(rng) for _ in range(args.recipes)]
+
+    results = {}
+    for drift in (False, True):
+        label = "drift" if drift else "clean"
+        texts = [as_text(recipe, rng, drift) for recipe in recipes]
+        documents = [as_json(recipe, rng, drift) for recipe in recipes]
+        results[f"text_{label}"] = run(parse_recipe_sections, texts)
+        # Silence the per-recipe rejection warnings while timing
+        stdout, sys.stdout = sys.stdout, open(os.devnull, "w")
+        try:
+            results[f"json_{label}"] = run(parse_structured_recipe, documents)
+        finally:
+            sys.stdout.close()
+            sys.stdout = stdout
+
+    for name, result in results.items():
+        print(f"{name:12s} {result['us_per_recipe']:8.2f} µs/recipe   failure rate {result['failure_rate']:.2%}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,114 @@
+"""
+Measure cold-start cost: where import time goes, how long building the app
+takes, and how long the background warm-up needs before /ready turns green.
+
+Each run starts a fresh interpreter with -X importtime, so nothing is cached
+in-process. Cumulative import times are reported for the project modules and
+the heavy third-party packages, as the median over all runs.
+
+    python benchmarks/import_time.py --runs 5
+    python benchmarks/import_time.py --module server --output benchmarks/results/import.json
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+HEAVY_PACKAGES = ("gradio", "fastapi", "uvicorn", "numpy", "cv2", "google.generativeai", "google.api_core", "grpc", "pandas", "matplotlib", "PIL")
+
+CHILD = """
+import sys, time, json
+start = time.perf_counter()
+import {module}
+imported = time.perf_counter()
+loaded = [name for name in {heavy!r} if name in sys.modules]
+import server
+app = server.create_app()
+built = time.perf_counter()
+server.warm_up()
+warm = time.perf_counter()
+deferred = [name for name in {heavy!r} if name in sys.modules and name not in loaded]
+print("@@" + json.dumps({{"import_s": imported - start, "create_app_s": built - imported, "warm_up_s": warm - built, "loaded": loaded, "deferred": deferred}}), file=sys.stderr)
+"""
+
+def project_modules():
+    return {name[:-3] for name in os.listdir(ROOT) if name.endswith(".py")}
+
+def parse_importtime(stderr):
+    # Lines look like "import time:   self [us] | cumulative | imported package"
+    cumulative = {}
+    summary = None
+    for line in stderr.splitlines():
+        if line.startswith("@@"):
+            summary = json.loads(line[2:])
+            continue
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        _, cumulative_us, name = line.split(":", 1)[1].split("|")
+        cumulative.setdefault(name.strip(), int(cumulative_us) / 1e6)
+    return cumulative, summary
+
+def run_once(module):
+    env = dict(os.environ)
+    # A placeholder key is enough: configuring the SDK and building clients makes no network calls
+    env.setdefault("GEMINI_API_KEY", "import-time-benchmark")
+    env["GEMINI_FAKE"] = ""
+    code = CHILD.format(module=module, heavy=HEAVY_PACKAGES)
+    result = subprocess.run([sys.executable, "-X", "importtime", "-c", code], cwd=ROOT, env=env, capture_output=True, text=True)
+    cumulative, summary = parse_importtime(result.stderr)
+    if summary is None:
+        raise RuntimeError(f"benchmark child failed:\n{result.stderr[-2000:]}")
+    return cumulative, summary
+
+def main():
+    parser = argparse.ArgumentParser(description="Break down cold-start time into imports, app construction and warm-up.")
+    parser.add_argument("--runs", type=int, default=3, help="Fresh interpreters to average over")
+    parser.add_argument("--module", default="main", help="Entry module whose import is measured")
+    parser.add_argument("--top", type=int, default=15, help="Slowest project modules to list")
+    parser.add_argument("--output", help="Also write the results here as JSON")
+    args = parser.parse_args()
+
+    runs = [run_once(args.module) for _ in range(args.runs)]
+    ours = project_modules()
+
+    def median_of(name):
+        values = [cumulative[name] for cumulative, _ in runs if name in cumulative]
+        return round(statistics.median(values), 4) if values else None
+
+    report = {
+        "runs": args.runs,
+        "module": args.module,
+        "import_s": round(statistics.median(s["import_s"] for _, s in runs), 4),
+        "create_app_s": round(statistics.median(s["create_app_s"] for _, s in runs), 4),
+        "warm_up_s": round(statistics.median(s["warm_up_s"] for _, s in runs), 4),
+        "heavy_loaded_at_import": runs[-1][1]["loaded"],
+        "heavy_deferred_to_warm_up": runs[-1][1]["deferred"],
+        "packages": {name: median_of(name) for name in HEAVY_PACKAGES if median_of(name) is not None},
+        "project": dict(sorted(
+            ((name, median_of(name)) for name in ours if median_of(name) is not None),
+            key=lambda item: -item[1],
+        )[:args.top]),
+    }
+
+    print(f"📊 import {args.module}: {report['import_s']:.3f}s, create_app: {report['create_app_s']:.3f}s, warm-up: {report['warm_up_s']:.3f}s")
+    print(f"   heavy packages loaded by the import: {', '.join(report['heavy_loaded_at_import']) or 'none'}")
+    print(f"   deferred to warm-up: {', '.join(report['heavy_deferred_to_warm_up']) or 'none'}")
+    print("   packages (cumulative, wherever first imported):")
+    for name, seconds in sorted(report["packages"].items(), key=lambda item: -item[1]):
+        print(f"     {name:<22} {seconds:.3f}s")
+    print("   project modules (cumulative):")
+    for name, seconds in report["project"].items():
+        print(f"     {name:<22} {seconds:.3f}s")
+
+    if args.output:
+        os.makedirs(os.path.dirname(args.output) or ".", exist_ok=True)
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+        print(f"✅ Wrote {args.output}")
+
+if __name__ == "__main__":
+    main()
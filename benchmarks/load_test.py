@@ -0,0 +1,338 @@
+"""
+Offline load test: drives the real Gradio handlers with simulated users while
+every Gemini call is answered by fake_gemini with a configurable latency
+distribution, so no quota is spent.
+
+Each simulated session uploads an image, selects the detected ingredients,
+asks for suggestions and opens the first recipe. Per-handler p50/p95/p99,
+throughput, the per-stage breakdown from metrics.py and the memory
+high-water mark are written as JSON for diffing between versions.
+
+    python benchmarks/load_test.py --users 20 --sessions 5 --time-scale 0.1
+    python benchmarks/load_test.py --responses data/recorded.jsonl --baseline benchmarks/results/previous.json
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import types
+from concurrent.futures import ThreadPoolExecutor
+
+try:
+    import resource
+except ImportError:
+    resource = None
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+HANDLERS = ("upload_and_detect", "get_recipes", "show_recipe_details")
+
+def percentile(sorted_values, fraction):
+    if not sorted_values:
+        return 0.0
+    return sorted_values[min(len(sorted_values) - 1, int(len(sorted_values) * fraction))]
+
+def max_rss_mb():
+    if resource is None:
+        return None
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is in kilobytes on Linux and bytes on macOS
+    return round(rss / (1024 * 1024 if sys.platform == "darwin" else 1024), 1)
+
+def git_revision():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=ROOT, capture_output=True, text=True, timeout=5).stdout.strip() or None
+    except (OSError, subprocess.SubprocessError):
+        return None
+
+def make_images(count, width, height, directory, seed):
+    import cv2
+    import numpy as np
+
+    rng = np.random.default_rng(seed)
+    paths = []
+    for i in range(count):
+        # Coloured blocks over a noisy background compress roughly like a fridge photo
+        image = rng.integers(90, 140, (height, width, 3), dtype=np.uint8)
+        for _ in range(8):
+            x, y = int(rng.integers(0, width - 200)), int(rng.integers(0, height - 200))
+            image[y:y + 200, x:x + 200] = rng.integers(0, 255, 3)
+        path = os.path.join(directory, f"bench_{i}.jpg")
+        cv2.imwrite(path, image, [cv2.IMWRITE_JPEG_QUALITY, 90])
+        paths.append(path)
+    return paths
+
+def configure_environment(args):
+    # Must run before the app modules are imported, since they read their settings at import time
+    os.environ.setdefault("GEMINI_API_KEY", "offline-benchmark")
+    os.environ.setdefault("GEMINI_RATE_LIMITS", "")
+    if not args.warm_cache:
+        os.environ["DETECTION_CACHE_SIZE"] = "0"
+        os.environ["RECIPE_CACHE_BACKEND"] = "none"
+
+def install_fake(args):
+    import models
+    from fake_gemini import FakeGenerativeModel, ReplayResponder, latency_distribution
+
+    responder = ReplayResponder(args.responses) if args.responses else None
+    distributions = {"pro": args.pro_latency, "flash": args.flash_latency}
+
+    def fake_model(name):
+        sample = latency_distribution(distributions["pro" if "pro" in name else "flash"], args.seed)
+        return FakeGenerativeModel(
+            name,
+            latency=lambda: sample() * args.time_scale,
+            failure_rate=args.failure_rate,
+            responder=responder,
+            seed=args.seed,
+        )
+
+    models.GenerativeModel = fake_model
+    models._models.clear()
+
+class Recorder:
+    def __init__(self):
+        self.latencies = {name: [] for name in HANDLERS}
+        self.errors = {name: 0 for name in HANDLERS}
+        self._lock = threading.Lock()
+
+    def add(self, handler, seconds, ok):
+        with self._lock:
+            self.latencies[handler].append(seconds)
+            if not ok:
+                self.errors[handler] += 1
+
+def choice_values(component):
+    return [choice[1] if isinstance(choice, (list, tuple)) else choice for choice in (component.choices or [])]
+
+def recipe_failed(outputs):
+    if isinstance(outputs, str):
+        outputs = (outputs,)
+    return any(isinstance(html, str) and "❌" in html for html in outputs)
+
+def quick_session(session_id, args):
+    return random.Random(f"{args.seed}-{session_id}").random() < args.quick_share
+
+def run_session_sync(app, recorder, image_path, session_id, args):
+    quick = quick_session(session_id, args)
+    start = time.perf_counter()
+    _, ingredients, _ = app.upload_and_detect(types.SimpleNamespace(name=image_path), app.detect_food_items, quick)
+    selected = choice_values(ingredients)[:args.select]
+    recorder.add("upload_and_detect", time.perf_counter() - start, bool(selected))
+    if not selected:
+        return
+
+    start = time.perf_counter()
+    recipes = choice_values(app.get_recipes(selected, args.diet, args.cuisine, args.servings, "", session_id, quick))
+    recorder.add("get_recipes", time.perf_counter() - start, bool(recipes))
+    if not recipes:
+        return
+
+    start = time.perf_counter()
+    outputs = app.show_recipe_details(recipes[0], selected, args.diet, args.cuisine, args.servings, "", app.parse_recipe_sections, session_id, quick)
+    recorder.add("show_recipe_details", time.perf_counter() - start, not recipe_failed(outputs))
+
+async def run_session_async(app, recorder, image_path, session_id, args):
+    quick = quick_session(session_id, args)
+    start = time.perf_counter()
+    _, ingredients, _ = await app.upload_and_detect_async(types.SimpleNamespace(name=image_path), app.detect_food_items_async, quick)
+    selected = choice_values(ingredients)[:args.select]
+    recorder.add("upload_and_detect", time.perf_counter() - start, bool(selected))
+    if not selected:
+        return
+
+    start = time.perf_counter()
+    recipes = choice_values(await app.get_recipes_async(selected, args.diet, args.cuisine, args.servings, "", session_id, quick))
+    recorder.add("get_recipes", time.perf_counter() - start, bool(recipes))
+    if not recipes:
+        return
+
+    start = time.perf_counter()
+    outputs = await app.show_recipe_details_async(recipes[0], selected, args.diet, args.cuisine, args.servings, "", app.parse_recipe_sections, session_id, quick)
+    recorder.add("show_recipe_details", time.perf_counter() - start, not recipe_failed(outputs))
+
+def load_app():
+    from food_detector import detect_food_items, detect_food_items_async
+    from image_processor import upload_and_detect, upload_and_detect_async
+    from recipe_generator import get_recipes, get_recipes_async, show_recipe_details, show_recipe_details_async
+    from utils import parse_recipe_sections
+    return types.SimpleNamespace(
+        detect_food_items=detect_food_items,
+        detect_food_items_async=detect_food_items_async,
+        upload_and_detect=upload_and_detect,
+        upload_and_detect_async=upload_and_detect_async,
+        get_recipes=get_recipes,
+        get_recipes_async=get_recipes_async,
+        show_recipe_details=show_recipe_details,
+        show_recipe_details_async=show_recipe_details_async,
+        parse_recipe_sections=parse_recipe_sections,
+    )
+
+def run_load(app, images, args):
+    recorder = Recorder()
+    rng = random.Random(args.seed)
+    plans = [[rng.choice(images) for _ in range(args.sessions)] for _ in range(args.users)]
+
+    def user_sync(user, plan):
+        for n, image_path in enumerate(plan):
+            try:
+                run_session_sync(app, recorder, image_path, f"user-{user}-{n}", args)
+            except Exception as e:
+                print(f"❌ Session failed: {e}")
+            time.sleep(args.think_time)
+
+    async def user_async(user, plan):
+        for n, image_path in enumerate(plan):
+            try:
+                await run_session_async(app, recorder, image_path, f"user-{user}-{n}", args)
+            except Exception as e:
+                print(f"❌ Session failed: {e}")
+            await asyncio.sleep(args.think_time)
+
+    async def all_users_async():
+        await asyncio.gather(*(user_async(user, plan) for user, plan in enumerate(plans)))
+
+    start = time.perf_counter()
+    if args.mode == "async":
+        asyncio.run(all_users_async())
+    else:
+        with ThreadPoolExecutor(max_workers=args.users) as executor:
+            list(executor.map(user_sync, range(args.users), plans))
+    return recorder, time.perf_counter() - start
+
+def summarize(recorder, wall_seconds):
+    import metrics
+    import prompts
+    import router
+
+    handlers = {}
+    for name in HANDLERS:
+        values = sorted(recorder.latencies[name])
+        handlers[name] = {
+            "count": len(values),
+            "errors": recorder.errors[name],
+            "p50_ms": round(percentile(values, 0.50) * 1000, 2),
+            "p95_ms": round(percentile(values, 0.95) * 1000, 2),
+            "p99_ms": round(percentile(values, 0.99) * 1000, 2),
+            "mean_ms": round(sum(values) / len(values) * 1000, 2) if values else 0.0,
+            "throughput_per_s": round(len(values) / wall_seconds, 2),
+        }
+
+    stages = {}
+    for (stage,), entry in sorted(metrics.STAGE_SECONDS.values.items()):
+        count = sum(entry[:-1])
+        stages[stage] = {
+            "count": count,
+            "failures": int(metrics.STAGE_FAILURES.values.get((stage,), 0)),
+            "mean_ms": round(entry[-1] / count * 1000, 3) if count else 0.0,
+            "throughput_per_s": round(count / wall_seconds, 2),
+        }
+
+    # Latency per route, so quick, loaded and over-budget routes can be compared with the default one
+    routes = {}
+    for (stage, model, reason), entry in sorted(router.ROUTE_SECONDS.values.items()):
+        count = sum(entry[:-1])
+        routes[f"{stage}/{model}/{reason}"] = {
+            "count": count,
+            "failures": int(router.ROUTE_FAILURES.values.get((stage, model, reason), 0)),
+            "mean_ms": round(entry[-1] / count * 1000, 3) if count else 0.0,
+        }
+    return handlers, stages, routes, prompts.token_report()
+
+def compare(results, baseline_path):
+    with open(baseline_path, 'r', encoding='utf-8') as f:
+        baseline = json.load(f)
+    print(f"\n📊 Change vs {baseline_path} ({baseline.get('git_revision')})")
+    for name, current in results["handlers"].items():
+        previous = baseline.get("handlers", {}).get(name)
+        if not previous:
+            continue
+        changes = []
+        for key in ("p50_ms", "p95_ms", "p99_ms", "throughput_per_s"):
+            if previous[key]:
+                changes.append(f"{key} {(current[key] - previous[key]) / previous[key] * 100:+.1f}%")
+        print(f"  {name}: {', '.join(changes)}")
+
+def main():
+    parser = argparse.ArgumentParser(description="Offline load test against a fake Gemini backend.")
+    parser.add_argument("--users", type=int, default=10, help="Concurrent simulated users")
+    parser.add_argument("--sessions", type=int, default=3, help="Sessions each user runs back to back")
+    parser.add_argument("--mode", choices=("sync", "async"), default="async", help="Drive the sync handlers from threads or the async handlers from one event loop")
+    parser.add_argument("--pro-latency", default="lognormal:6,0.4", help="Latency distribution for pro models (fixed:s, uniform:a,b, normal:mean,sd, lognormal:median,sigma)")
+    parser.add_argument("--flash-latency", default="lognormal:1.5,0.3", help="Latency distribution for flash models")
+    parser.add_argument("--time-scale", type=float, default=1.0, help="Multiply every simulated latency, e.g. 0.1 for a quick run")
+    parser.add_argument("--failure-rate", type=float, default=0.0, help="Fraction of fake calls failing with 429/503")
+    parser.add_argument("--responses", help="JSONL of recorded responses to replay (see GEMINI_RECORD)")
+    parser.add_argument("--images", help="Directory of real images to upload instead of synthetic ones")
+    parser.add_argument("--distinct-images", type=int, default=20, help="Synthetic images to generate")
+    parser.add_argument("--image-size", default="2048x1536", help="Synthetic image size, WIDTHxHEIGHT")
+    parser.add_argument("--select", type=int, default=3, help="Detected ingredients each user selects")
+    parser.add_argument("--diet", default="Any")
+    parser.add_argument("--cuisine", default="Any")
+    parser.add_argument("--servings", type=int, default=2)
+    parser.add_argument("--quick-share", type=float, default=0.0, help="Fraction of sessions that turn on quick mode")
+    parser.add_argument("--think-time", type=float, default=0.0, help="Seconds each user pauses between sessions")
+    parser.add_argument("--warm-cache", action="store_true", help="Keep the detection and recipe caches enabled")
+    parser.add_argument("--seed", type=int, default=7)
+    parser.add_argument("--output", help="Results file (default benchmarks/results/load-<timestamp>.json)")
+    parser.add_argument("--baseline", help="Earlier results file to compare against")
+    args = parser.parse_args()
+
+    configure_environment(args)
+    app = load_app()
+    install_fake(args)
+
+    with tempfile.TemporaryDirectory() as image_dir:
+        if args.images:
+            images = [os.path.join(args.images, name) for name in sorted(os.listdir(args.images))
+                      if name.lower().endswith((".jpg", ".jpeg", ".png", ".webp"))]
+        else:
+            width, height = (int(v) for v in args.image_size.lower().split("x"))
+            images = make_images(args.distinct_images, width, height, image_dir, args.seed)
+        rss_before = max_rss_mb()
+        print(f"🔍 {args.users} users x {args.sessions} sessions ({args.mode}) over {len(images)} images")
+        recorder, wall_seconds = run_load(app, images, args)
+
+    handlers, stages, routes, tokens = summarize(recorder, wall_seconds)
+    results = {
+        "git_revision": git_revision(),
+        "created": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "config": {key: value for key, value in vars(args).items() if key not in ("output", "baseline")},
+        "wall_seconds": round(wall_seconds, 3),
+        "handlers": handlers,
+        "stages": stages,
+        "routes": routes,
+        "tokens": tokens,
+        "memory": {"max_rss_mb_before": rss_before, "max_rss_mb": max_rss_mb()},
+    }
+
+    for name, stats in handlers.items():
+        print(f"  {name:<20} n={stats['count']:<5} err={stats['errors']:<3} p50={stats['p50_ms']:.1f}ms "
+              f"p95={stats['p95_ms']:.1f}ms p99={stats['p99_ms']:.1f}ms {stats['throughput_per_s']:.2f}/s")
+    for name, stats in stages.items():
+        print(f"  stage {name:<16} n={stats['count']:<5} mean={stats['mean_ms']:.2f}ms")
+    for name, stats in routes.items():
+        print(f"  route {name:<40} n={stats['count']:<5} err={stats['failures']:<3} mean={stats['mean_ms']:.2f}ms")
+    for group in ("stage", "model"):
+        for name, counts in sorted(tokens[group].items()):
+            print(f"  tokens {group} {name:<20} in={counts['input']:<8} out={counts['output']:<8} cached={counts['cached']}")
+    print(f"  memory high-water mark: {results['memory']['max_rss_mb']} MB")
+
+    output = args.output or os.path.join(ROOT, "benchmarks", "results", f"load-{time.strftime('%Y%m%d-%H%M%S')}.json")
+    os.makedirs(os.path.dirname(output), exist_ok=True)
+    with open(output, 'w', encoding='utf-8') as f:
+        json.dump(results, f, indent=2, sort_keys=True)
+    print(f"✅ Results written to {output}")
+
+    if args.baseline:
+        compare(results, args.baseline)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,254 @@
+import copy
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+from ingredients import ingredient_counts
+from storage import create_store, shared_store
+
+def hash_bytes(data):
+    return hashlib.sha256(data).hexdigest()
+
+class LRUCache:
+    def __init__(self, max_entries=256, ttl_seconds=3600):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            expires_at, value = entry
+            if expires_at is not None and expires_at < time.time():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return value
+
+    def set(self, key, value):
+        expires_at = time.time() + self.ttl_seconds if self.ttl_seconds else None
+        with self._lock:
+            self._entries[key] = (expires_at, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def __len__(self):
+        return len(self._entries)
+
+class SQLiteCache:
+    def __init__(self, path, max_entries=1024, ttl_seconds=None):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._lock = threading.Lock()
+        with self._lock, self._conn:
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS cache ("
+                "key TEXT PRIMARY KEY, value TEXT NOT NULL, expires_at REAL, accessed_at REAL NOT NULL)"
+            )
+            self._conn.execute("CREATE INDEX IF NOT EXISTS cache_accessed ON cache (accessed_at)")
+
+    def get(self, key):
+        now = time.time()
+        with self._lock, self._conn:
+            row = self._conn.execute("SELECT value, expires_at FROM cache WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                return None
+            if row[1] is not None and row[1] < now:
+                self._conn.execute("DELETE FROM cache WHERE key = ?", (key,))
+                return None
+            self._conn.execute("UPDATE cache SET accessed_at = ? WHERE key = ?", (now, key))
+        return json.loads(row[0])
+
+    def set(self, key, value):
+        now = time.time()
+        expires_at = now + self.ttl_seconds if self.ttl_seconds else None
+        with self._lock, self._conn:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO cache (key, value, expires_at, accessed_at) VALUES (?, ?, ?, ?)",
+                (key, json.dumps(value), expires_at, now),
+            )
+            excess = self._conn.execute("SELECT COUNT(*) FROM cache").fetchone()[0] - self.max_entries
+            if excess > 0:
+                self._conn.execute(
+                    "DELETE FROM cache WHERE key IN (SELECT key FROM cache ORDER BY accessed_at LIMIT ?)", (excess,)
+                )
+
+    def __len__(self):
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM cache").fetchone()[0]
+
+class SharedStoreCache:
+    """
+    Adapter for a store shared between instances. Any client exposing
+    get(key) and set(key, value, ex=seconds) works, e.g. redis.Redis; eviction
+    is left to the store's own policy.
+    """
+    def __init__(self, client, prefix="smart-fridge-chef:", ttl_seconds=None):
+        self.client = client
+        self.prefix = prefix
+        self.ttl_seconds = ttl_seconds
+
+    def get(self, key):
+        try:
+            raw = self.client.get(self.prefix + key)
+        except Exception as e:
+            print(f"⚠ Shared cache read failed: {e}")
+            return None
+        return json.loads(raw) if raw is not None else None
+
+    def set(self, key, value):
+        try:
+            self.client.set(self.prefix + key, json.dumps(value), ex=self.ttl_seconds or None)
+        except Exception as e:
+            print(f"⚠ Shared cache write failed: {e}")
+
+def create_cache_backend(kind, max_entries=1024, ttl_seconds=None, path=None, url=None, store=None):
+    kind = (kind or "memory").lower()
+    if kind == "shared":
+        # Values go through the shared artifact store (see STORAGE_BACKEND) so every instance sees them
+        if store is None:
+            print("❌ The shared cache backend needs STORAGE_BACKEND to be set; falling back to memory")
+            return LRUCache(max_entries, ttl_seconds)
+        return store.json("recipe", ttl_seconds)
+    if kind == "memory":
+        return LRUCache(max_entries, ttl_seconds)
+    if kind == "sqlite":
+        return SQLiteCache(path or "data/cache.sqlite3", max_entries, ttl_seconds)
+    if kind == "redis":
+        try:
+            import redis
+        except ImportError:
+            print("❌ The redis cache backend needs the 'redis' package; falling back to memory")
+            return LRUCache(max_entries, ttl_seconds)
+        return SharedStoreCache(redis.Redis.from_url(url or "redis://localhost:6379/0"), ttl_seconds=ttl_seconds)
+    if kind == "none":
+        return None
+    raise ValueError(f"Unknown cache backend: {kind}")
+
+def normalize_text(text):
+    return " ".join((text or "").split()).lower()
+
+def canonical_recipe_params(selected_ingredients, diet_type, cuisine_type, serving_size, additional_instructions="", recipe_name=None):
+    params = {
+        "ingredients": ingredient_counts(selected_ingredients).key(),
+        "diet": diet_type,
+        "cuisine": cuisine_type,
+        "servings": int(serving_size) if float(serving_size).is_integer() else float(serving_size),
+        "instructions": normalize_text(additional_instructions),
+    }
+    if recipe_name is not None:
+        params["recipe"] = normalize_text(recipe_name)
+    return params
+
+class RecipeCache:
+    def __init__(self, backend):
+        self.backend = backend
+        self.hits = 0
+        self.misses = 0
+
+    def key(self, kind, model, params):
+        payload = json.dumps({"kind": kind, "model": model, "params": params}, sort_keys=True, separators=(",", ":"))
+        return hash_bytes(payload.encode("utf-8"))
+
+    def get(self, key):
+        value = self.backend.get(key) if self.backend is not None else None
+        if value is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        return copy.deepcopy(value)
+
+    def set(self, key, value):
+        if self.backend is not None:
+            self.backend.set(key, copy.deepcopy(value))
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {"hits": self.hits, "misses": self.misses, "hit_rate": self.hits / lookups if lookups else 0.0}
+
+class DetectionCache:
+    def __init__(self, max_entries=256, ttl_seconds=86400, disk_dir=None, store=None):
+        self.memory = LRUCache(max_entries, ttl_seconds)
+        # Behind memory sits the shared store if there is one, else an optional local directory
+        if store is not None:
+            self.store = store.json("detection", ttl_seconds)
+        elif disk_dir:
+            self.store = create_store("file", disk_dir).json("detection", ttl_seconds)
+        else:
+            self.store = None
+        self.hits = 0
+        self.misses = 0
+        self.store_hits = 0
+
+    def key(self, image_bytes, model=None):
+        # Each model's detections are kept apart, so a quick answer never serves a normal request
+        digest = hash_bytes(image_bytes)
+        return f"{digest}-{model}" if model else digest
+
+    def image_hash(self, key):
+        # The SHA-256 of the image, without the model a key adds after it
+        return key.partition("-")[0]
+
+    def get(self, key):
+        annotations = self.memory.get(key)
+        if annotations is None and self.store is not None:
+            annotations = self.store.get(key)
+            if annotations is not None:
+                self.store_hits += 1
+                self.memory.set(key, annotations)
+        if annotations is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        return copy.deepcopy(annotations)
+
+    def set(self, key, annotations):
+        # Empty results usually mean the model call failed, so never pin them
+        if not annotations:
+            return
+        annotations = copy.deepcopy(annotations)
+        self.memory.set(key, annotations)
+        if self.store is not None:
+            self.store.set(key, annotations)
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "store_hits": self.store_hits,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "entries": len(self.memory),
+        }
+
+detection_cache = DetectionCache(
+    max_entries=int(os.environ.get("DETECTION_CACHE_SIZE", "256")),
+    ttl_seconds=int(os.environ.get("DETECTION_CACHE_TTL", "86400")),
+    disk_dir=os.environ.get("DETECTION_CACHE_DIR") or None,
+    store=shared_store,
+)
+
+recipe_cache = RecipeCache(create_cache_backend(
+    os.environ.get("RECIPE_CACHE_BACKEND", "shared" if shared_store is not None else "memory"),
+    max_entries=int(os.environ.get("RECIPE_CACHE_SIZE", "1024")),
+    ttl_seconds=int(os.environ.get("RECIPE_CACHE_TTL", "21600")),
+    path=os.environ.get("RECIPE_CACHE_PATH", "data/recipe_cache.sqlite3"),
+    url=os.environ.get("RECIPE_CACHE_URL"),
+    store=shared_store,
+))
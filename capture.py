@@ -0,0 +1,250 @@
+import argparse
+import json
+import os
+import time
+from functools import partial
+
+import numpy as np
+
+from batch_detect import IMAGE_EXTENSIONS
+from cache import detection_cache
+from detectors import tiered_detector
+from food_detector import DETECTION_MODEL, detect_food_items
+from image_processor import cache_detection, decode_image, open_camera, prepare_for_detection
+from lazy import lazy_module
+from metrics import Counter, timed
+from models import api_key_configured
+from router import model_router
+from utils import count_food_items
+
+cv2 = lazy_module("cv2")
+
+# Bits that must differ between a frame's hash and the last detected scene's before detection runs again
+CAPTURE_CHANGE_THRESHOLD = int(os.environ.get("CAPTURE_CHANGE_THRESHOLD", "10"))
+# Seconds after which an unchanged scene is detected again anyway (0 never refreshes)
+CAPTURE_REFRESH_SECONDS = float(os.environ.get("CAPTURE_REFRESH_SECONDS", "0"))
+CAPTURE_DEVICE = os.environ.get("CAPTURE_DEVICE", "0")
+
+CAPTURE_FRAMES = Counter("smart_fridge_capture_frames_total", "Captured frames by outcome (detected, reused, failed)", ("outcome",))
+
+# The hash keeps the lowest 8x8 frequencies of a 32x32 DCT of the grayscale frame
+HASH_SIZE = 8
+DCT_SIZE = 32
+
+def dct_matrix(n):
+    k = np.arange(n)[:, None]
+    i = np.arange(n)[None, :]
+    matrix = np.cos(np.pi * (2 * i + 1) * k / (2 * n)) * np.sqrt(2 / n)
+    matrix[0] /= np.sqrt(2)
+    return matrix
+
+DCT = dct_matrix(DCT_SIZE)
+
+def block_means(gray, size):
+    # Area-average downscale for any frame size: sum uneven blocks with reduceat, then divide by their areas
+    height, width = gray.shape
+    rows = np.arange(size) * height // size
+    cols = np.arange(size) * width // size
+    sums = np.add.reduceat(np.add.reduceat(gray, rows, axis=0), cols, axis=1)
+    areas = np.outer(np.diff(np.append(rows, height)), np.diff(np.append(cols, width)))
+    return sums / areas
+
+def perceptual_hash(image):
+    # Striding first keeps the grayscale conversion cheap on full-resolution camera frames
+    step = max(1, min(image.shape[:2]) // (DCT_SIZE * 4))
+    pixels = image[::step, ::step]
+    if pixels.ndim == 3:
+        # OpenCV frames are BGR
+        gray = pixels[..., :3].astype(np.float32) @ np.array([0.114, 0.587, 0.299], dtype=np.float32)
+    else:
+        gray = pixels.astype(np.float32)
+    if min(gray.shape) < DCT_SIZE:
+        gray = cv2.resize(gray, (DCT_SIZE, DCT_SIZE), interpolation=cv2.INTER_LINEAR)
+    low = (DCT @ block_means(gray, DCT_SIZE) @ DCT.T)[:HASH_SIZE, :HASH_SIZE].ravel()
+    # The DC term only tracks overall brightness, so it is left out of the median
+    bits = low > np.median(low[1:])
+    return int.from_bytes(np.packbits(bits).tobytes(), "big")
+
+def hamming_distance(a, b):
+    return bin(a ^ b).count("1")
+
+def frame_bytes(frame):
+    # Frames arrive as encoded image bytes (files) or decoded BGR arrays (cameras, in-process producers)
+    if isinstance(frame, np.ndarray):
+        ok, encoded = cv2.imencode(".jpg", frame)
+        if not ok:
+            raise ValueError("could not encode frame")
+        return encoded.tobytes(), frame
+    return frame, decode_image(frame)
+
+class ContinuousCapture:
+    """
+    Ingests a stream of frames from a fixed camera and runs detection only
+    when the scene changes. Each frame gets a 64-bit perceptual hash; while
+    it stays within threshold bits of the hash of the last detected frame,
+    that frame's annotations are reused. Comparing against the last detected
+    frame rather than the previous one means slow drift still adds up to a
+    change eventually.
+    """
+    def __init__(self, detect_food_items, threshold=None, refresh_seconds=None):
+        self.detect_food_items = detect_food_items
+        self.threshold = CAPTURE_CHANGE_THRESHOLD if threshold is None else threshold
+        self.refresh_seconds = CAPTURE_REFRESH_SECONDS if refresh_seconds is None else refresh_seconds
+        self.scene_hash = None
+        self.scene_time = 0.0
+        self.annotations = []
+        self.totals = {"frames": 0, "detected": 0, "reused": 0, "failed": 0}
+
+    def changed(self, frame_hash):
+        if self.scene_hash is None:
+            return True, None
+        distance = hamming_distance(frame_hash, self.scene_hash)
+        stale = self.refresh_seconds and time.monotonic() - self.scene_time >= self.refresh_seconds
+        return distance > self.threshold or bool(stale), distance
+
+    def submit(self, frame, name=None):
+        record = {"frame": name if name is not None else self.totals["frames"]}
+        self.totals["frames"] += 1
+        try:
+            start = time.perf_counter()
+            with timed("frame_hash"):
+                image_bytes, image = frame_bytes(frame)
+                if image is None:
+                    raise ValueError("could not decode frame")
+                frame_hash = perceptual_hash(image)
+            record["hash_ms"] = round((time.perf_counter() - start) * 1000, 2)
+            record["phash"] = f"{frame_hash:016x}"
+            changed, distance = self.changed(frame_hash)
+            record["distance"] = distance
+            record["detected"] = changed
+            outcome = "reused"
+            if changed:
+                start = time.perf_counter()
+                annotations = self.detect(image_bytes, image)
+                record["detect_ms"] = round((time.perf_counter() - start) * 1000, 1)
+                record["annotations"] = annotations
+                # An empty result is usually a failed call, so the scene isn't adopted and the next frame tries again
+                if annotations:
+                    self.annotations = annotations
+                    self.scene_hash = frame_hash
+                    self.scene_time = time.monotonic()
+                    outcome = "detected"
+                else:
+                    record["error"] = "no ingredients detected"
+                    outcome = "failed"
+        except Exception as e:
+            record["error"] = str(e)
+            outcome = "failed"
+        self.totals[outcome] += 1
+        CAPTURE_FRAMES.inc(outcome)
+        record["counts"] = dict(count_food_items(self.annotations))
+        return record
+
+    def detect(self, image_bytes, image):
+        model = model_router.choose("detect", DETECTION_MODEL)
+        cache_key = detection_cache.key(image_bytes, model)
+        annotations = detection_cache.get(cache_key)
+        if annotations is None:
+            payload, mime_type, _ = prepare_for_detection(image_bytes, image)
+            answered = set()
+            with timed("detect") as stage:
+                annotations = tiered_detector.detect(image, payload, mime_type, partial(self.detect_food_items, model=model, on_model=answered.add))
+                stage.failed = not annotations
+            cache_detection(cache_key, model, answered, annotations)
+        print(f"🔍 Scene changed, detected {len(annotations)} items")
+        return annotations
+
+    def run(self, frames, output_path=None):
+        # frames yields (name, frame) pairs from any source
+        out = None
+        if output_path:
+            os.makedirs(os.path.dirname(output_path) or ".", exist_ok=True)
+            out = open(output_path, "a", encoding="utf-8")
+        try:
+            for name, frame in frames:
+                record = self.submit(frame, name)
+                if out:
+                    out.write(json.dumps(record) + "\n")
+                    out.flush()
+                if self.totals["frames"] % 50 == 0:
+                    print(f"📊 Capture stats: {self.stats()}")
+        finally:
+            if out:
+                out.close()
+        print(f"✅ Capture finished: {self.stats()}")
+        return self.totals
+
+    def stats(self):
+        stats = dict(self.totals)
+        stats["detections_saved"] = round(self.totals["reused"] / self.totals["frames"], 3) if self.totals["frames"] else 0.0
+        return stats
+
+def iter_directory_frames(watch_dir, poll_interval=1.0, idle_timeout=None):
+    # Cameras drop files into the directory; a file is read once its size has held still for one poll
+    seen = set()
+    sizes = {}
+    last_frame = time.monotonic()
+    while True:
+        entries = []
+        for entry in os.scandir(watch_dir):
+            if entry.is_file() and entry.name.lower().endswith(IMAGE_EXTENSIONS) and entry.path not in seen:
+                stat = entry.stat()
+                entries.append((stat.st_mtime, entry.name, entry.path, stat.st_size))
+        ready = []
+        for _, _, path, size in sorted(entries):
+            if sizes.get(path) == size:
+                ready.append(path)
+            sizes[path] = size
+        for path in ready:
+            seen.add(path)
+            sizes.pop(path, None)
+            with open(path, "rb") as f:
+                yield path, f.read()
+            last_frame = time.monotonic()
+        if idle_timeout is not None and not entries and time.monotonic() - last_frame >= idle_timeout:
+            return
+        if not ready:
+            time.sleep(poll_interval)
+
+def iter_camera_frames(device=CAPTURE_DEVICE, interval=1.0, limit=None):
+    camera = open_camera(device)
+    if camera is None:
+        return
+    try:
+        count = 0
+        while limit is None or count < limit:
+            ok, frame = camera.read()
+            if not ok:
+                print(f"⚠ Camera {device} stopped returning frames")
+                return
+            yield f"camera:{device}:{count}", frame
+            count += 1
+            time.sleep(interval)
+    finally:
+        camera.release()
+
+def main():
+    parser = argparse.ArgumentParser(description="Detect ingredients continuously from a camera or a directory of frames, skipping frames whose scene has not changed.")
+    parser.add_argument("--watch-dir", help="Directory that frames are written into")
+    parser.add_argument("--camera", nargs="?", const=CAPTURE_DEVICE, help=f"Read frames from an OpenCV camera index or stream URL (default {CAPTURE_DEVICE})")
+    parser.add_argument("--interval", type=float, default=1.0, help="Seconds between camera frames, or between directory polls")
+    parser.add_argument("--idle-timeout", type=float, help="Stop watching the directory after this many seconds without new frames")
+    parser.add_argument("--threshold", type=int, default=CAPTURE_CHANGE_THRESHOLD, help="Hash bits (of 64) that must change before detection runs again")
+    parser.add_argument("--refresh", type=float, default=CAPTURE_REFRESH_SECONDS, help="Re-detect an unchanged scene after this many seconds (0 never)")
+    parser.add_argument("--output", default="data/capture.jsonl", help="JSONL file with one record per frame")
+    args = parser.parse_args()
+    if not api_key_configured():
+        print("❌ GEMINI_API_KEY environment variable not set")
+        exit(1)
+
+    if args.watch_dir:
+        frames = iter_directory_frames(args.watch_dir, args.interval, args.idle_timeout)
+    elif args.camera is not None:
+        frames = iter_camera_frames(args.camera, args.interval)
+    else:
+        parser.error("one of --watch-dir or --camera is required")
+
+    ContinuousCapture(detect_food_items, args.threshold, args.refresh).run(frames, args.output)
+
+if __name__ == "__main__":
+    main()
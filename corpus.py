@@ -0,0 +1,197 @@
+import argparse
+import json
+import os
+import re
+import sqlite3
+import threading
+import time
+
+import numpy as np
+
+from cache import normalize_text
+from ingredients import vocabulary
+from metrics import Counter
+
+RECIPE_CORPUS = os.environ.get("RECIPE_CORPUS", "false").lower() in ("1", "true", "yes")
+RECIPE_CORPUS_PATH = os.environ.get("RECIPE_CORPUS_PATH", "data/recipe_corpus.sqlite3")
+# Fraction of a recipe's indexed ingredients the selection must cover for the recipe to be suggested
+CORPUS_MIN_COVERAGE = float(os.environ.get("CORPUS_MIN_COVERAGE", "0.75"))
+# Recipes that must clear the coverage bar before the corpus answers instead of Gemini
+CORPUS_MIN_RESULTS = int(os.environ.get("CORPUS_MIN_RESULTS", "5"))
+
+CORPUS_LOOKUPS = Counter("smart_fridge_corpus_lookups_total", "Recipe suggestions answered from the local corpus (hit) or passed on to Gemini (miss, skipped)", ("outcome",))
+
+class GrowableArray:
+    # NumPy column that grows in place, so adding a recipe doesn't rebuild the whole index
+    def __init__(self, dtype, capacity=1024):
+        self.data = np.zeros(capacity, dtype=dtype)
+        self.size = 0
+
+    def append(self, value):
+        if self.size == len(self.data):
+            self.data = np.concatenate([self.data, np.zeros_like(self.data)])
+        self.data[self.size] = value
+        self.size += 1
+
+    def view(self):
+        return self.data[:self.size]
+
+def ingredients_in(text, names):
+    # Selected ingredients a generated recipe actually uses; the prefix match also catches plurals
+    text = text.lower()
+    return [name for name in names if re.search(rf"\b{re.escape(name)}", text)]
+
+class RecipeCorpus:
+    """
+    Local recipe corpus with an inverted index from ingredient to recipe.
+    Each recipe is indexed by the fridge ingredients it needs and tagged with
+    a cuisine and diet. A query counts, for every recipe at once, how many of
+    its ingredients the selection covers by concatenating the postings of the
+    selected ingredients and taking np.bincount; recipes of the wrong cuisine
+    or diet are masked out and the rest ranked by coverage. Recipes persist in
+    SQLite and are added to the in-memory index as they arrive.
+    """
+    def __init__(self, path=None, min_coverage=0.75, min_results=5):
+        self.path = path
+        self.min_coverage = min_coverage
+        self.min_results = min_results
+        self.names = []
+        self.keys = set()
+        # Postings are keyed by the shared vocabulary's ingredient IDs
+        self.postings = {}
+        # np.ndarray per ingredient, rebuilt only for the postings a new recipe touched
+        self._posting_arrays = {}
+        self.sizes = GrowableArray(np.int32)
+        self.cuisines = GrowableArray(np.int16)
+        self.vegetarian = GrowableArray(np.bool_)
+        self.cuisine_ids = {}
+        self.loaded = False
+        self._conn = None
+        self._lock = threading.Lock()
+
+    def _connect(self):
+        if self._conn is None and self.path:
+            directory = os.path.dirname(self.path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            self._conn = sqlite3.connect(self.path, check_same_thread=False)
+            with self._conn:
+                self._conn.execute(
+                    "CREATE TABLE IF NOT EXISTS recipes ("
+                    "id INTEGER PRIMARY KEY, name TEXT NOT NULL, cuisine TEXT NOT NULL, diet TEXT NOT NULL, "
+                    "ingredients TEXT NOT NULL, source TEXT, UNIQUE (name, cuisine))"
+                )
+        return self._conn
+
+    def load(self):
+        # Loading 100k recipes takes about a second, so it happens on first use (or in warm-up)
+        with self._lock:
+            if self.loaded:
+                return
+            start = time.perf_counter()
+            conn = self._connect()
+            if conn is not None:
+                for name, cuisine, diet, ingredients in conn.execute("SELECT name, cuisine, diet, ingredients FROM recipes ORDER BY id"):
+                    self._index(name, json.loads(ingredients), cuisine, diet)
+            self.loaded = True
+        print(f"📚 Loaded {len(self.names)} corpus recipes in {time.perf_counter() - start:.2f}s")
+
+    def _index(self, name, ingredients, cuisine, diet):
+        key = (normalize_text(name), cuisine)
+        if key in self.keys:
+            return False
+        row = len(self.names)
+        self.keys.add(key)
+        self.names.append(name)
+        for ingredient in ingredients:
+            ingredient_id = vocabulary.id(ingredient)
+            self.postings.setdefault(ingredient_id, []).append(row)
+            self._posting_arrays.pop(ingredient_id, None)
+        self.sizes.append(len(ingredients))
+        self.cuisines.append(self.cuisine_ids.setdefault(cuisine, len(self.cuisine_ids)))
+        self.vegetarian.append(diet == "Vegetarian")
+        return True
+
+    def add_many(self, recipes, source="import"):
+        # recipes yields (name, ingredients, cuisine, diet); duplicates of a stored recipe are skipped
+        self.load()
+        added = []
+        with self._lock:
+            for name, ingredients, cuisine, diet in recipes:
+                ingredients = sorted({vocabulary.label(item) for item in ingredients} - {""})
+                if name and ingredients and self._index(name, ingredients, cuisine, diet):
+                    added.append((name, cuisine, diet, json.dumps(ingredients), source))
+            conn = self._connect()
+            if conn is not None and added:
+                with conn:
+                    conn.executemany("INSERT OR IGNORE INTO recipes (name, cuisine, diet, ingredients, source) VALUES (?, ?, ?, ?, ?)", added)
+        return len(added)
+
+    def add(self, name, ingredients, cuisine, diet, source="generated"):
+        return self.add_many([(name, ingredients, cuisine, diet)], source) == 1
+
+    def _posting(self, ingredient_id):
+        array = self._posting_arrays.get(ingredient_id)
+        if array is None:
+            array = self._posting_arrays[ingredient_id] = np.array(self.postings[ingredient_id], dtype=np.int32)
+        return array
+
+    def suggest(self, ingredients, diet_type, cuisine_type, limit=5):
+        # Returns up to limit recipe names, or None when too few recipes are covered well enough
+        self.load()
+        with self._lock:
+            ids = [i for i in {vocabulary.id(item) for item in ingredients} if i in self.postings]
+            if not ids or cuisine_type not in self.cuisine_ids:
+                return None
+            count = len(self.names)
+            overlap = np.bincount(np.concatenate([self._posting(i) for i in ids]), minlength=count)
+            coverage = overlap / self.sizes.view()
+            mask = (coverage >= self.min_coverage) & (self.cuisines.view() == self.cuisine_ids[cuisine_type])
+            if diet_type == "Vegetarian":
+                mask &= self.vegetarian.view()
+            candidates = np.flatnonzero(mask)
+            if len(candidates) < self.min_results:
+                return None
+            # Full coverage first, then recipes that use more of the selection
+            score = coverage[candidates] + overlap[candidates] / 1000
+            top = candidates[np.argpartition(-score, limit - 1)[:limit]] if len(candidates) > limit else candidates
+            top = top[np.argsort(-(coverage[top] + overlap[top] / 1000), kind="stable")]
+            return [self.names[row] for row in top]
+
+    def stats(self):
+        return {"recipes": len(self.names), "ingredients": len(self.postings), "cuisines": len(self.cuisine_ids)}
+
+def iter_dataset(path):
+    # JSONL with "name", "ingredients", "cuisine" and optional "diet" (default Non-Vegetarian) per line
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            line = line.strip()
+            if not line:
+                continue
+            record = json.loads(line)
+            yield record["name"], record["ingredients"], record["cuisine"], record.get("diet", "Non-Vegetarian")
+
+recipe_corpus = RecipeCorpus(RECIPE_CORPUS_PATH, CORPUS_MIN_COVERAGE, CORPUS_MIN_RESULTS) if RECIPE_CORPUS else None
+
+def main():
+    parser = argparse.ArgumentParser(description="Import recipes into the local corpus or query it.")
+    parser.add_argument("--path", default=RECIPE_CORPUS_PATH, help="SQLite file holding the corpus")
+    parser.add_argument("--import", dest="dataset", help="JSONL dataset to add (name, ingredients, cuisine, diet)")
+    parser.add_argument("--query", help="Comma-separated ingredients to suggest recipes for")
+    parser.add_argument("--cuisine", default="Italian")
+    parser.add_argument("--diet", default="Non-Vegetarian")
+    args = parser.parse_args()
+
+    corpus = RecipeCorpus(args.path, CORPUS_MIN_COVERAGE, CORPUS_MIN_RESULTS)
+    if args.dataset:
+        start = time.perf_counter()
+        added = corpus.add_many(iter_dataset(args.dataset))
+        print(f"✅ Imported {added} recipes in {time.perf_counter() - start:.2f}s")
+    if args.query:
+        start = time.perf_counter()
+        names = corpus.suggest(args.query.split(","), args.diet, args.cuisine)
+        print(f"🔍 {names or 'Not enough coverage; Gemini would be asked'} ({(time.perf_counter() - start) * 1000:.2f} ms)")
+    print(f"📊 Corpus stats: {corpus.stats()}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,224 @@
+import asyncio
+import os
+import threading
+import time
+import traceback
+from collections import deque
+
+import numpy as np
+
+from lazy import lazy_module
+
+cv2 = lazy_module("cv2")
+
+LOCAL_DETECTOR_MODEL = os.environ.get("LOCAL_DETECTOR_MODEL")
+LOCAL_DETECTOR_LABELS = os.environ.get("LOCAL_DETECTOR_LABELS")
+LOCAL_DETECTOR_CLASSES = [c.strip().lower() for c in os.environ.get("LOCAL_DETECTOR_CLASSES", "").split(",") if c.strip()]
+LOCAL_DETECTOR_INPUT_SIZE = int(os.environ.get("LOCAL_DETECTOR_INPUT_SIZE", "640"))
+LOCAL_DETECTOR_SCORE = float(os.environ.get("LOCAL_DETECTOR_SCORE", "0.25"))
+LOCAL_ACCEPT_CONFIDENCE = float(os.environ.get("LOCAL_ACCEPT_CONFIDENCE", "0.6"))
+LOCAL_MIN_COVERAGE = float(os.environ.get("LOCAL_MIN_COVERAGE", "0.05"))
+
+class LocalDnnDetector:
+    """
+    YOLO-style ONNX model run on the CPU through OpenCV DNN. Both the
+    (anchors, 5 + classes) layout with objectness and the transposed
+    (4 + classes, anchors) layout of newer exports are understood.
+    """
+    name = "local"
+
+    def __init__(self, net, labels, input_size=640, score_threshold=0.25, nms_threshold=0.45, classes=None):
+        self.net = net
+        self.labels = [label.strip().lower() for label in labels]
+        self.input_size = input_size
+        self.score_threshold = score_threshold
+        self.nms_threshold = nms_threshold
+        # Classes outside the allow-list (e.g. "person" in COCO) are never reported as ingredients
+        self.allowed = np.array([not classes or label in classes for label in self.labels])
+        # cv2.dnn.Net is not safe to share between threads
+        self._lock = threading.Lock()
+
+    @classmethod
+    def load(cls, model_path, labels_path, **kwargs):
+        with open(labels_path, 'r', encoding='utf-8') as f:
+            labels = [line for line in f.read().splitlines() if line.strip()]
+        net = cv2.dnn.readNet(model_path)
+        print(f"✅ Loaded local detector {model_path} with {len(labels)} classes")
+        return cls(net, labels, **kwargs)
+
+    def detect(self, image):
+        # The image is stretched rather than letterboxed, so boxes map straight back to 0-1000
+        blob = cv2.dnn.blobFromImage(image, 1 / 255.0, (self.input_size, self.input_size), swapRB=True, crop=False)
+        with self._lock:
+            self.net.setInput(blob)
+            output = self.net.forward()
+
+        rows = output[0]
+        if rows.shape[1] not in (4 + len(self.labels), 5 + len(self.labels)):
+            rows = rows.T
+        if rows.shape[1] == 5 + len(self.labels):
+            scores = rows[:, 5:] * rows[:, 4:5]
+        else:
+            scores = rows[:, 4:]
+        class_ids = scores.argmax(axis=1)
+        confidences = scores[np.arange(len(scores)), class_ids]
+        keep = (confidences >= self.score_threshold) & self.allowed[class_ids]
+        if not keep.any():
+            return []
+
+        centers = rows[keep, :4]
+        class_ids = class_ids[keep]
+        confidences = confidences[keep]
+        boxes = np.column_stack([centers[:, 0] - centers[:, 2] / 2, centers[:, 1] - centers[:, 3] / 2, centers[:, 2], centers[:, 3]])
+        picked = cv2.dnn.NMSBoxes(boxes.tolist(), confidences.tolist(), self.score_threshold, self.nms_threshold)
+
+        scale = 1000 / self.input_size
+        annotations = []
+        for i in np.array(picked).flatten():
+            x, y, w, h = boxes[i]
+            box = [y, x, y + h, x + w]
+            annotations.append({
+                "label": self.labels[class_ids[i]],
+                "box_2d": [int(min(max(v * scale, 0), 1000)) for v in box],
+                "confidence": round(float(confidences[i]), 3),
+            })
+        return annotations
+
+def box_coverage(annotations, grid=100):
+    # Union of the boxes on a coarse grid, so overlapping detections are not counted twice
+    mask = np.zeros((grid, grid), dtype=bool)
+    for ann in annotations:
+        ymin, xmin, ymax, xmax = (int(v * grid / 1000) for v in ann["box_2d"])
+        mask[ymin:max(ymax, ymin + 1), xmin:max(xmax, xmin + 1)] = True
+    return float(mask.mean())
+
+class TierStats:
+    def __init__(self, window=500):
+        self.calls = 0
+        self.accepted = 0
+        self.latencies = deque(maxlen=window)
+        self._lock = threading.Lock()
+
+    def record(self, seconds, accepted):
+        with self._lock:
+            self.calls += 1
+            self.accepted += int(accepted)
+            self.latencies.append(seconds * 1000)
+
+    def snapshot(self):
+        with self._lock:
+            latencies = sorted(self.latencies)
+            calls, accepted = self.calls, self.accepted
+        return {
+            "calls": calls,
+            "accepted": accepted,
+            "hit_rate": accepted / calls if calls else 0.0,
+            "avg_ms": round(sum(latencies) / len(latencies), 1) if latencies else 0.0,
+            "p95_ms": round(latencies[int(len(latencies) * 0.95)], 1) if latencies else 0.0,
+        }
+
+class TieredDetector:
+    """
+    Tries the local detector first and escalates to the remote detector
+    (Gemini) only when the local result is not trustworthy: nothing found,
+    any kept box below min_confidence, or boxes covering too little of the
+    image to plausibly account for everything in it.
+    """
+    def __init__(self, local=None, min_confidence=0.6, min_coverage=0.05):
+        self.local = local
+        self.min_confidence = min_confidence
+        self.min_coverage = min_coverage
+        self.tiers = {"local": TierStats(), "gemini": TierStats()}
+
+    def _run_local(self, image):
+        if self.local is None or image is None:
+            return None
+        start = time.perf_counter()
+        try:
+            annotations = self.local.detect(image)
+        except Exception as e:
+            print(f"❌ Local detection error: {e}")
+            traceback.print_exc()
+            annotations = []
+        accepted = bool(annotations) and self.accepts(annotations)
+        self.tiers["local"].record(time.perf_counter() - start, accepted)
+        if not accepted:
+            print(f"⚠ Local detector not confident ({len(annotations)} items), escalating to Gemini")
+            return None
+        print(f"⚡ Local detector found {len(annotations)} items")
+        return annotations
+
+    def accepts(self, annotations):
+        confidence = min(ann.get("confidence", 0) for ann in annotations)
+        return confidence >= self.min_confidence and box_coverage(annotations) >= self.min_coverage
+
+    def detect(self, image, payload, mime_type, detect_remote):
+        annotations = self._run_local(image)
+        if annotations is not None:
+            return annotations
+        start = time.perf_counter()
+        annotations = detect_remote(payload, mime_type)
+        self.tiers["gemini"].record(time.perf_counter() - start, bool(annotations))
+        return annotations
+
+    async def detect_async(self, image, payload, mime_type, detect_remote_async):
+        annotations = None
+        if self.local is not None:
+            annotations = await asyncio.to_thread(self._run_local, image)
+        if annotations is not None:
+            return annotations
+        start = time.perf_counter()
+        annotations = await detect_remote_async(payload, mime_type)
+        self.tiers["gemini"].record(time.perf_counter() - start, bool(annotations))
+        return annotations
+
+    def stream(self, image, payload, mime_type, stream_remote):
+        # Like detect, but yields Gemini's annotations one by one as they arrive
+        annotations = self._run_local(image)
+        if annotations is not None:
+            yield from annotations
+            return
+        start = time.perf_counter()
+        found = 0
+        for annotation in stream_remote(payload, mime_type):
+            found += 1
+            yield annotation
+        self.tiers["gemini"].record(time.perf_counter() - start, bool(found))
+
+    async def stream_async(self, image, payload, mime_type, stream_remote_async):
+        annotations = None
+        if self.local is not None:
+            annotations = await asyncio.to_thread(self._run_local, image)
+        if annotations is not None:
+            for annotation in annotations:
+                yield annotation
+            return
+        start = time.perf_counter()
+        found = 0
+        async for annotation in stream_remote_async(payload, mime_type):
+            found += 1
+            yield annotation
+        self.tiers["gemini"].record(time.perf_counter() - start, bool(found))
+
+    def stats(self):
+        return {name: tier.snapshot() for name, tier in self.tiers.items()}
+
+def load_local_detector():
+    if not LOCAL_DETECTOR_MODEL:
+        return None
+    if not LOCAL_DETECTOR_LABELS:
+        print("❌ LOCAL_DETECTOR_LABELS must be set alongside LOCAL_DETECTOR_MODEL; using Gemini only")
+        return None
+    try:
+        return LocalDnnDetector.load(
+            LOCAL_DETECTOR_MODEL,
+            LOCAL_DETECTOR_LABELS,
+            input_size=LOCAL_DETECTOR_INPUT_SIZE,
+            score_threshold=LOCAL_DETECTOR_SCORE,
+            classes=LOCAL_DETECTOR_CLASSES,
+        )
+    except Exception as e:
+        print(f"❌ Could not load local detector: {e}; using Gemini only")
+        return None
+
+tiered_detector = TieredDetector(load_local_detector(), LOCAL_ACCEPT_CONFIDENCE, LOCAL_MIN_COVERAGE)
@@ -0,0 +1,254 @@
+import asyncio
+import json
+import math
+import os
+import random
+import threading
+import time
+
+# Offline stand-in for google.generativeai.GenerativeModel, used when GEMINI_FAKE is set
+GEMINI_FAKE = os.environ.get("GEMINI_FAKE", "false").lower() in ("1", "true", "yes")
+GEMINI_FAKE_LATENCY = float(os.environ.get("GEMINI_FAKE_LATENCY", "0.5"))
+GEMINI_FAKE_JITTER = float(os.environ.get("GEMINI_FAKE_JITTER", "0.2"))
+GEMINI_FAKE_FAILURE_RATE = float(os.environ.get("GEMINI_FAKE_FAILURE_RATE", "0"))
+# Real responses are appended here as JSON lines, ready to be replayed by the fake
+GEMINI_RECORD = os.environ.get("GEMINI_RECORD")
+
+DETECTION_RESPONSE = json.dumps([
+    {"label": "tomato", "box_2d": [120, 80, 380, 330]},
+    {"label": "tomato", "box_2d": [140, 360, 400, 600]},
+    {"label": "onion", "box_2d": [500, 150, 800, 420]},
+    {"label": "bell pepper", "box_2d": [480, 560, 860, 900]},
+])
+
+SUGGESTION_RESPONSE = """1. Shakshuka
+2. Stuffed Bell Peppers
+3. Tomato Onion Curry
+4. Roasted Vegetable Pasta
+5. Pepper and Tomato Frittata"""
+
+DETAIL_RESPONSE = """INGREDIENTS:
+- 2 tomatoes (detected)
+- 1 onion (detected)
+- 1 bell pepper (detected)
+- 2 tbsp olive oil (additional)
+
+PREP TIME:
+10
+
+COOK TIME:
+25
+
+EQUIPMENT NEEDED:
+- Skillet
+- Chef's knife
+
+SERVING SIZE:
+Serves 2 people
+
+CALORIES:
+320
+
+INSTRUCTIONS:
+1. Chop the vegetables.
+2. Soften the onion and pepper in oil.
+3. Add the tomatoes and simmer until thick.
+
+TIPS FOR SUCCESS:
+- Season at the end once the sauce has reduced."""
+
+STRUCTURED_RESPONSE = json.dumps({
+    "ingredients": ["2 tomatoes", "1 onion", "1 bell pepper", "2 tbsp olive oil"],
+    "prep_minutes": 10,
+    "cook_minutes": 25,
+    "equipment": ["Skillet", "Chef's knife"],
+    "serving_size": 2,
+    "calories_per_serving": 320,
+    "instructions": ["Chop the vegetables.", "Soften the onion and pepper in oil.", "Add the tomatoes and simmer until thick."],
+    "tips": ["Season at the end once the sauce has reduced."],
+})
+
+class FakeAPIError(Exception):
+    # Mirrors google.api_core exceptions, which carry the HTTP status in .code
+    def __init__(self, code, message=None):
+        super().__init__(message or f"{code} fake Gemini error")
+        self.code = code
+
+class FakeResponse:
+    def __init__(self, text):
+        self.text = text
+
+class FakeAsyncStream:
+    def __init__(self, chunks, delay):
+        self._chunks = chunks
+        self._delay = delay
+
+    async def __aiter__(self):
+        for chunk in self._chunks:
+            await asyncio.sleep(self._delay)
+            yield FakeResponse(chunk)
+
+CANNED_RESPONSES = {
+    "detect": DETECTION_RESPONSE,
+    "suggest": SUGGESTION_RESPONSE,
+    "detail": DETAIL_RESPONSE,
+    "detail-json": STRUCTURED_RESPONSE,
+}
+
+def response_kind(contents, generation_config=None):
+    if isinstance(contents, list):
+        return "detect"
+    if generation_config and generation_config.get("response_mime_type") == "application/json":
+        return "detail-json"
+    if contents.lstrip().startswith("Suggest"):
+        return "suggest"
+    return "detail"
+
+def default_response(contents, generation_config=None):
+    return CANNED_RESPONSES[response_kind(contents, generation_config)]
+
+class ReplayResponder:
+    """
+    Serves recorded responses (JSON lines with "kind" and "text") round-robin
+    per kind, falling back to the canned response for kinds never recorded.
+    """
+    def __init__(self, path):
+        self.responses = {}
+        with open(path, 'r', encoding='utf-8') as f:
+            for line in f:
+                if line.strip():
+                    record = json.loads(line)
+                    self.responses.setdefault(record["kind"], []).append(record["text"])
+        self._next = {kind: 0 for kind in self.responses}
+        self._lock = threading.Lock()
+
+    def __call__(self, contents, generation_config=None):
+        kind = response_kind(contents, generation_config)
+        recorded = self.responses.get(kind)
+        if not recorded:
+            return CANNED_RESPONSES[kind]
+        with self._lock:
+            index = self._next[kind]
+            self._next[kind] = (index + 1) % len(recorded)
+        return recorded[index]
+
+def latency_distribution(spec, seed=None):
+    """
+    Parses "fixed:1.5", "uniform:0.5,2", "normal:1.5,0.3" or
+    "lognormal:1.5,0.4" (median and sigma) into a callable returning seconds.
+    """
+    rng = random.Random(seed)
+    kind, _, params = spec.partition(":")
+    values = [float(v) for v in params.split(",") if v]
+    if kind == "fixed":
+        return lambda: values[0]
+    if kind == "uniform":
+        return lambda: rng.uniform(values[0], values[1])
+    if kind == "normal":
+        return lambda: max(0.0, rng.gauss(values[0], values[1]))
+    if kind == "lognormal":
+        return lambda: values[0] * math.exp(rng.gauss(0, values[1]))
+    raise ValueError(f"Unknown latency distribution: {spec}")
+
+class FakeGenerativeModel:
+    """
+    Answers with canned detection/suggestion/recipe text after a simulated
+    delay. latency may be a number of seconds or a callable returning one,
+    failure_rate injects random FakeAPIErrors, and failures scripts the
+    status codes of the next calls (None meaning success).
+    """
+    def __init__(self, model_name, latency=0.0, jitter=0.0, failure_rate=0.0, failure_codes=(429, 503), failures=None, responder=None, seed=None, stream_chunks=8):
+        self.model_name = model_name
+        self.latency = latency
+        self.jitter = jitter
+        self.failure_rate = failure_rate
+        self.failure_codes = failure_codes
+        self.failures = list(failures or [])
+        self.responder = responder or default_response
+        self.stream_chunks = stream_chunks
+        self.calls = 0
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+
+    def _plan(self):
+        with self._lock:
+            self.calls += 1
+            delay = self.latency() if callable(self.latency) else self.latency
+            delay = max(0.0, delay + self._random.uniform(-self.jitter, self.jitter))
+            code = self.failures.pop(0) if self.failures else None
+            if code is None and self._random.random() < self.failure_rate:
+                code = self._random.choice(self.failure_codes)
+        return delay, code
+
+    def _chunks(self, text):
+        size = max(1, len(text) // self.stream_chunks)
+        return [text[i:i + size] for i in range(0, len(text), size)]
+
+    def generate_content(self, contents, generation_config=None, stream=False, request_options=None):
+        delay, code = self._plan()
+        timeout = (request_options or {}).get("timeout")
+        if timeout is not None and delay > timeout:
+            time.sleep(timeout)
+            raise FakeAPIError(504, "504 Deadline Exceeded")
+        time.sleep(delay)
+        if code is not None:
+            raise FakeAPIError(code)
+        text = self.responder(contents, generation_config)
+        if stream:
+            return [FakeResponse(chunk) for chunk in self._chunks(text)]
+        return FakeResponse(text)
+
+    async def generate_content_async(self, contents, generation_config=None, stream=False, request_options=None):
+        delay, code = self._plan()
+        await asyncio.sleep(delay)
+        if code is not None:
+            raise FakeAPIError(code)
+        text = self.responder(contents, generation_config)
+        if stream:
+            return FakeAsyncStream(self._chunks(text), 0.01)
+        return FakeResponse(text)
+
+def create_fake_model(model_name):
+    # Pro is slower than flash, as with the real models
+    scale = 3 if "pro" in model_name else 1
+    return FakeGenerativeModel(model_name, GEMINI_FAKE_LATENCY * scale, GEMINI_FAKE_JITTER, GEMINI_FAKE_FAILURE_RATE)
+
+class RecordingGenerativeModel:
+    # Wraps a real model and appends every complete response to GEMINI_RECORD
+    def __init__(self, model, path):
+        self.model = model
+        self.path = path
+        self._lock = threading.Lock()
+
+    def _record(self, contents, generation_config, text):
+        line = json.dumps({"kind": response_kind(contents, generation_config), "text": text})
+        with self._lock, open(self.path, 'a', encoding='utf-8') as f:
+            f.write(line + "\n")
+
+    def _record_stream(self, contents, generation_config, chunks):
+        parts = []
+        for chunk in chunks:
+            parts.append(chunk.text)
+            yield chunk
+        self._record(contents, generation_config, "".join(parts))
+
+    async def _record_stream_async(self, contents, generation_config, chunks):
+        parts = []
+        async for chunk in chunks:
+            parts.append(chunk.text)
+            yield chunk
+        self._record(contents, generation_config, "".join(parts))
+
+    def generate_content(self, contents, generation_config=None, stream=False, **kwargs):
+        response = self.model.generate_content(contents, generation_config=generation_config, stream=stream, **kwargs)
+        if stream:
+            return self._record_stream(contents, generation_config, response)
+        self._record(contents, generation_config, response.text)
+        return response
+
+    async def generate_content_async(self, contents, generation_config=None, stream=False, **kwargs):
+        response = await self.model.generate_content_async(contents, generation_config=generation_config, stream=stream, **kwargs)
+        if stream:
+            return self._record_stream_async(contents, generation_config, response)
+        self._record(contents, generation_config, response.text)
+        return response
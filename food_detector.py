@@ -1,65 +1,196 @@
 import json
 import os
-import re
 import traceback
-from google.generativeai import GenerativeModel, configure
+from scheduler import gemini_scheduler
+from router import model_router
+from prompts import detection_prompt, record_usage
+from metrics import MODEL_REQUEST_BYTES, MODEL_RESPONSE_BYTES, instrument, timed
 
-# Retrieve Gemini API key from environment variable
-GEMINI_API_KEY = os.environ.get("GEMINI_API_KEY")
-if not GEMINI_API_KEY:
-    print("❌ GEMINI_API_KEY environment variable not set")
-    exit(1)
+DETECTION_MODEL = 'gemini-2.5-pro'
 
-try:
-    configure(api_key=GEMINI_API_KEY)
-except Exception as e:
-    print(f"❌ Failed to configure Gemini API: {e}")
-    exit(1)
+DETECTION_STREAMING = os.environ.get("DETECTION_STREAMING", "true").lower() in ("1", "true", "yes")
 
-def detect_food_items(image_path):
+class AnnotationStreamParser:
+    """
+    Incremental parser for the JSON array of annotations Gemini returns.
+    Text can be fed in arbitrary chunks; each feed returns the objects
+    completed by that chunk. Anything before the array (prose, a ```json
+    fence) is skipped, and an object that fails to parse is dropped without
+    losing the ones after it.
+    """
+    def __init__(self):
+        self.buffer = []
+        self.state = "seek"
+        self.depth = 0
+        self.in_string = False
+        self.escaped = False
+        self.found_array = False
+    
+    def feed(self, chunk):
+        completed = []
+        for char in chunk:
+            if self.state == "seek":
+                if char == "[":
+                    self.state = "open"
+            elif self.state == "open":
+                # Only "[" followed by "{" or "]" starts the array, not a stray bracket in prose
+                if char == "{":
+                    self.found_array = True
+                    self.state = "array"
+                    self._start_object(char)
+                elif char == "]":
+                    self.found_array = True
+                    self.state = "done"
+                elif not char.isspace():
+                    self.state = "open" if char == "[" else "seek"
+            elif self.state == "array":
+                if self.depth == 0:
+                    if char == "{":
+                        self._start_object(char)
+                    elif char == "]":
+                        self.state = "done"
+                    continue
+                self.buffer.append(char)
+                if self.in_string:
+                    if self.escaped:
+                        self.escaped = False
+                    elif char == "\\":
+                        self.escaped = True
+                    elif char == '"':
+                        self.in_string = False
+                elif char == '"':
+                    self.in_string = True
+                elif char == "{":
+                    self.depth += 1
+                elif char == "}":
+                    self.depth -= 1
+                    if self.depth == 0:
+                        annotation = self._finish_object()
+                        if annotation is not None:
+                            completed.append(annotation)
+        return completed
+    
+    def _start_object(self, char):
+        self.buffer = [char]
+        self.depth = 1
+    
+    def _finish_object(self):
+        text = "".join(self.buffer)
+        self.buffer = []
+        try:
+            annotation = json.loads(text)
+        except json.JSONDecodeError as e:
+            print(f"⚠ Skipping malformed annotation ({e}): {text[:100]}")
+            return None
+        return annotation if isinstance(annotation, dict) else None
+
+@instrument("parse_detection")
+def parse_detection_response(text):
+    print("✅ Gemini response received")
+    print(f"Raw response: {text[:200]}...")
+    
+    parser = AnnotationStreamParser()
+    annotations = parser.feed(text)
+    if not parser.found_array:
+        print("❌ No JSON array found in response")
+        print(f"Full response: {text}")
+        return []
+    print(f"✅ Parsed {len(annotations)} annotations")
+    return annotations
+
+def detect_food_items(img_data, mime_type="image/jpeg", quick=False, model=None, on_model=None):
     try:
-        print(f"🔍 Detecting food items in: {image_path}")
+        if isinstance(img_data, str):
+            if not os.path.exists(img_data):
+                print(f"❌ Image file not found: {img_data}")
+                return []
+            with open(img_data, 'rb') as img_file:
+                img_data = img_file.read()
         
-        if not os.path.exists(image_path):
-            print(f"❌ Image file not found: {image_path}")
-            return []
+        print(f"🔍 Detecting food items in {len(img_data)} byte {mime_type} image")
         
-        with open(image_path, 'rb') as img_file:
-            img_data = img_file.read()
+        prompt = detection_prompt()
+        MODEL_REQUEST_BYTES.inc("detect", amount=len(img_data) + len(prompt.text))
+        with model_router.route("detect", DETECTION_MODEL, quick, model) as route, timed("detect_model"):
+            response = gemini_scheduler.call(route.model, [prompt.text, {"mime_type": mime_type, "data": img_data}], on_model=route.answered_by)
+        MODEL_RESPONSE_BYTES.inc("detect", amount=len(response.text))
+        record_usage(prompt, route.model, response.text, getattr(response, "usage_metadata", None), images=1)
+        if on_model is not None:
+            on_model(route.model)
+        return parse_detection_response(response.text)
         
-        model = GenerativeModel('gemini-2.5-pro')
+    except Exception as e:
+        print(f"❌ Detection error: {e}")
+        traceback.print_exc()
+        return []
+
+async def detect_food_items_async(img_data, mime_type="image/jpeg", quick=False, model=None, on_model=None):
+    try:
+        print(f"🔍 Detecting food items in {len(img_data)} byte {mime_type} image")
         
-        prompt = """
-        Detect all prominent food ingredients in the image. For each item, provide:
-        - label: Name of the fruit/vegetable
-        - box_2d: Bounding box coordinates [ymin, xmin, ymax, xmax] normalized to 0-1000
-        Return the response as a JSON array of objects, e.g.:
-        [
-            {"label": "apple", "box_2d": [100, 200, 300, 400]},
-            {"label": "banana", "box_2d": [150, 250, 350, 450]}
-        ]
-        """
-        response = model.generate_content([prompt, {"mime_type": "image/jpeg", "data": img_data}])
+        prompt = detection_prompt()
+        MODEL_REQUEST_BYTES.inc("detect", amount=len(img_data) + len(prompt.text))
+        with model_router.route("detect", DETECTION_MODEL, quick, model) as route, timed("detect_model"):
+            response = await gemini_scheduler.call_async(route.model, [prompt.text, {"mime_type": mime_type, "data": img_data}], on_model=route.answered_by)
+        MODEL_RESPONSE_BYTES.inc("detect", amount=len(response.text))
+        record_usage(prompt, route.model, response.text, getattr(response, "usage_metadata", None), images=1)
+        if on_model is not None:
+            on_model(route.model)
+        return parse_detection_response(response.text)
         
-        print("✅ Gemini response received")
-        print(f"Raw response: {response.text[:200]}...")
+    except Exception as e:
+        print(f"❌ Detection error: {e}")
+        traceback.print_exc()
+        return []
+
+def stream_food_items(img_data, mime_type="image/jpeg", quick=False, model=None, on_model=None):
+    try:
+        print(f"🔍 Streaming detection of {len(img_data)} byte {mime_type} image")
         
-        try:
-            json_str = re.search(r'\[\s*{.*?}\s*\]', response.text, re.DOTALL)
-            if json_str:
-                annotations = json.loads(json_str.group(0))
-                print(f"✅ Parsed {len(annotations)} annotations")
-                return annotations
-            else:
-                print("❌ No JSON array found in response")
-                print(f"Full response: {response.text}")
-                return []
-        except json.JSONDecodeError as e:
-            print(f"❌ JSON decode error: {e}")
-            print(f"Raw response: {response.text}")
-            return []
+        prompt = detection_prompt()
+        MODEL_REQUEST_BYTES.inc("detect", amount=len(img_data) + len(prompt.text))
+        parser = AnnotationStreamParser()
+        received, usage, found = [], None, 0
+        with model_router.route("detect", DETECTION_MODEL, quick, model) as route, timed("detect_stream") as stage:
+            for chunk in gemini_scheduler.call(route.model, [prompt.text, {"mime_type": mime_type, "data": img_data}], stream=True, on_model=route.answered_by):
+                MODEL_RESPONSE_BYTES.inc("detect", amount=len(chunk.text))
+                usage = getattr(chunk, "usage_metadata", None) or usage
+                received.append(chunk.text)
+                for annotation in parser.feed(chunk.text):
+                    found += 1
+                    yield annotation
+            stage.failed = route.failed = not found
+        record_usage(prompt, route.model, "".join(received), usage, images=1)
+        if on_model is not None:
+            on_model(route.model)
+        print(f"✅ Streamed {found} annotations")
+        
+    except Exception as e:
+        print(f"❌ Detection error: {e}")
+        traceback.print_exc()
+
+async def stream_food_items_async(img_data, mime_type="image/jpeg", quick=False, model=None, on_model=None):
+    try:
+        print(f"🔍 Streaming detection of {len(img_data)} byte {mime_type} image")
+        
+        prompt = detection_prompt()
+        MODEL_REQUEST_BYTES.inc("detect", amount=len(img_data) + len(prompt.text))
+        parser = AnnotationStreamParser()
+        received, usage, found = [], None, 0
+        with model_router.route("detect", DETECTION_MODEL, quick, model) as route, timed("detect_stream") as stage:
+            async for chunk in await gemini_scheduler.call_async(route.model, [prompt.text, {"mime_type": mime_type, "data": img_data}], stream=True, on_model=route.answered_by):
+                MODEL_RESPONSE_BYTES.inc("detect", amount=len(chunk.text))
+                usage = getattr(chunk, "usage_metadata", None) or usage
+                received.append(chunk.text)
+                for annotation in parser.feed(chunk.text):
+                    found += 1
+                    yield annotation
+            stage.failed = route.failed = not found
+        record_usage(prompt, route.model, "".join(received), usage, images=1)
+        if on_model is not None:
+            on_model(route.model)
+        print(f"✅ Streamed {found} annotations")
         
     except Exception as e:
         print(f"❌ Detection error: {e}")
         traceback.print_exc()
-        return []
\ No newline at end of file
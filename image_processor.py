@@ -1,19 +1,124 @@
-import cv2
+import asyncio
+import html
 import os
-import shutil
+import time
+import numpy as np
 from collections import Counter
 import traceback
+from functools import partial
 import gradio as gr
+from urllib.parse import quote
+from cache import detection_cache
+from detectors import tiered_detector
+from food_detector import DETECTION_MODEL
+from router import model_router
+from singleflight import detection_calls
+from metrics import timed
+from lazy import lazy_module
+from ingredients import vocabulary
+from utils import count_food_items
 
-def capture_image(output_path="data/captured.jpg", width=1640, height=1232):
-    print("⚠ Camera capture not supported on Windows. Please upload an image.")
-    return False
+# OpenCV is imported on first use to keep startup fast
+cv2 = lazy_module("cv2")
 
-def create_annotated_image(image_path, annotations):
+DETECTION_MAX_EDGE = int(os.environ.get("DETECTION_MAX_EDGE", "1536"))
+DETECTION_JPEG_QUALITY = int(os.environ.get("DETECTION_JPEG_QUALITY", "85"))
+# "overlay" draws boxes in the browser over the original upload; "server" renders them with OpenCV
+ANNOTATION_MODE = os.environ.get("ANNOTATION_MODE", "overlay").lower()
+# Minimum seconds between progressive updates while detection streams in
+DETECTION_STREAM_INTERVAL = float(os.environ.get("DETECTION_STREAM_INTERVAL", "0.1"))
+
+preprocess_stats = {"images": 0, "bytes_before": 0, "bytes_after": 0}
+
+def open_camera(device, width=None, height=None):
+    # device is a camera index ("0") or a stream URL (e.g. rtsp://...)
+    camera = cv2.VideoCapture(int(device) if str(device).isdigit() else device)
+    if not camera.isOpened():
+        print(f"⚠ Could not open camera {device}. Please upload an image.")
+        camera.release()
+        return None
+    if width and height:
+        camera.set(cv2.CAP_PROP_FRAME_WIDTH, width)
+        camera.set(cv2.CAP_PROP_FRAME_HEIGHT, height)
+    return camera
+
+def capture_image(output_path="data/captured.jpg", width=1640, height=1232, device="0"):
+    camera = open_camera(device, width, height)
+    if camera is None:
+        return False
+    try:
+        ok, frame = camera.read()
+    finally:
+        camera.release()
+    if not ok:
+        print(f"⚠ Camera {device} returned no frame")
+        return False
+    os.makedirs(os.path.dirname(output_path) or ".", exist_ok=True)
+    return bool(cv2.imwrite(output_path, frame))
+
+def decode_image(image_bytes):
+    buffer = np.frombuffer(image_bytes, dtype=np.uint8)
+    image = cv2.imdecode(buffer, cv2.IMREAD_COLOR)
+    if image is None:
+        print("❌ Could not decode uploaded image")
+    return image
+
+# Formats OpenCV cannot decode that Gemini still accepts; they are sent untouched
+PASSTHROUGH_MIME_TYPES = ("image/heic", "image/heif")
+
+def sniff_mime_type(image_bytes):
+    if image_bytes.startswith(b'\xff\xd8\xff'):
+        return "image/jpeg"
+    if image_bytes.startswith(b'\x89PNG\r\n\x1a\n'):
+        return "image/png"
+    if image_bytes[:4] == b'RIFF' and image_bytes[8:12] == b'WEBP':
+        return "image/webp"
+    if image_bytes[4:8] == b'ftyp':
+        brand = image_bytes[8:12]
+        if brand in (b'heic', b'heix', b'hevc', b'hevx'):
+            return "image/heic"
+        if brand in (b'mif1', b'msf1', b'heif'):
+            return "image/heif"
+    if image_bytes[:6] in (b'GIF87a', b'GIF89a'):
+        return "image/gif"
+    return "image/jpeg"
+
+def prepare_for_detection(image_bytes, image, max_edge=None, quality=None):
+    max_edge = max_edge or DETECTION_MAX_EDGE
+    quality = quality or DETECTION_JPEG_QUALITY
+    mime_type = sniff_mime_type(image_bytes)
+    payload = image_bytes
+
+    # Formats OpenCV cannot decode (e.g. HEIC) are sent untouched with their real MIME type
+    if image is not None:
+        height, width = image.shape[:2]
+        scale = max_edge / max(height, width)
+        resized = image
+        if scale < 1:
+            resized = cv2.resize(image, (round(width * scale), round(height * scale)), interpolation=cv2.INTER_AREA)
+        ok, encoded = cv2.imencode(".jpg", resized, [cv2.IMWRITE_JPEG_QUALITY, quality])
+        # box_2d is normalized to 0-1000, so boxes from the smaller image still map onto the original
+        if ok and (scale < 1 or len(encoded) < len(image_bytes)):
+            payload = encoded.tobytes()
+            mime_type = "image/jpeg"
+
+    stats = {"bytes_before": len(image_bytes), "bytes_after": len(payload), "mime_type": mime_type}
+    preprocess_stats["images"] += 1
+    preprocess_stats["bytes_before"] += stats["bytes_before"]
+    preprocess_stats["bytes_after"] += stats["bytes_after"]
+    print(f"🗜 Prepared {mime_type} for detection: {stats['bytes_before']} → {stats['bytes_after']} bytes")
+    return payload, mime_type, stats
+
+def to_display_image(image):
+    # gr.Image expects RGB arrays, OpenCV works in BGR
+    if image is None:
+        return None
+    return cv2.cvtColor(image, cv2.COLOR_BGR2RGB)
+
+def create_annotated_image(image, annotations):
     try:
-        image = cv2.imread(image_path)
         if image is None:
-            print(f"❌ Could not load image: {image_path}")
+            print("❌ No image to annotate")
             return None
             
         height, width, _ = image.shape
@@ -27,7 +132,7 @@ def create_annotated_image(image_path, annotations):
                 continue
                 
             ymin, xmin, ymax, xmax = ann["box_2d"]
-            label = ann["label"].strip().lower()
+            label = vocabulary.label(ann["label"])
             food_counts[label] += 1
             count = food_counts[label]
             
@@ -50,59 +155,278 @@ def create_annotated_image(image_path, annotations):
             cv2.putText(image, display_label, (x1, y1 - 5), 
                        cv2.FONT_HERSHEY_SIMPLEX, 0.7, (0, 0, 0), 2)
         
-        # Save annotated image
-        annotated_path = "data/annotated.jpg"
-        cv2.imwrite(annotated_path, image)
-        print(f"✅ Annotated image saved to: {annotated_path}")
-        return annotated_path
+        print("✅ Annotated image created in memory")
+        return image
         
     except Exception as e:
         print(f"❌ Error creating annotated image: {e}")
         traceback.print_exc()
         return None
 
-def process_image(image_path, detect_food_items):
+def file_url(path):
+    # Uploads already sit in Gradio's cache directory, which it serves to the browser as-is
+    return f"/gradio_api/file={quote(path)}"
+
+def create_overlay_html(image_url, annotations):
+    if image_url is None:
+        return None
+    food_counts = Counter()
+    boxes = []
+    for ann in annotations:
+        if "box_2d" not in ann or "label" not in ann:
+            print(f"⚠ Skipping annotation missing box_2d or label: {ann}")
+            continue
+        try:
+            ymin, xmin, ymax, xmax = (min(max(float(v), 0), 1000) / 10 for v in ann["box_2d"])
+        except (TypeError, ValueError):
+            print(f"⚠ Skipping annotation with invalid box_2d: {ann}")
+            continue
+        label = vocabulary.label(ann["label"])
+        food_counts[label] += 1
+        display_label = f"{label} ({food_counts[label]})" if food_counts[label] > 1 else label
+        # box_2d is normalized to 0-1000, i.e. tenths of a percent of the displayed image
+        boxes.append(
+            f"<div class='detection-box' style='left:{xmin:.1f}%;top:{ymin:.1f}%;"
+            f"width:{xmax - xmin:.1f}%;height:{ymax - ymin:.1f}%'>"
+            f"<span class='detection-label'>{html.escape(display_label)}</span></div>"
+        )
+    return f"<div class='detection-overlay'><img src='{html.escape(image_url, quote=True)}' alt='Uploaded ingredients'>{''.join(boxes)}</div>"
+
+def render_detection(image, annotations, image_url=None):
+    if ANNOTATION_MODE == "overlay":
+        return create_overlay_html(image_url, annotations)
+    if not annotations:
+        return to_display_image(image)
+    # Annotation draws in place on this request's decoded buffer
+    annotated_image = create_annotated_image(image, annotations)
+    if annotated_image is None:
+        annotated_image = image
+    return to_display_image(annotated_image)
+
+def begin_detection(image_bytes, decode=True, quick=False):
+    # The model is picked up front and the detection pinned to it, so the cache and coalescing key match the answer
+    model = model_router.choose("detect", DETECTION_MODEL, quick)
+    cache_key = detection_cache.key(image_bytes, model)
+    annotations = detection_cache.get(cache_key)
+    if annotations is not None:
+        print(f"⚡ Detection cache hit: {cache_key[:12]}")
+        # Browser overlays never touch the pixels, so a cache hit can skip decoding entirely
+        return decode_image(image_bytes) if decode else None, cache_key, annotations, None, model
+    image = decode_image(image_bytes)
+    if image is None and sniff_mime_type(image_bytes) not in PASSTHROUGH_MIME_TYPES:
+        # Not worth a model call
+        raise ValueError("image could not be decoded")
+    return image, cache_key, None, prepare_for_detection(image_bytes, image), model
+
+def unreadable_image(error):
+    print(f"❌ {error}")
+    return None, gr.CheckboxGroup(choices=[], value=[]), "⚠ Could not read this image. Try another one."
+
+def cache_detection(cache_key, model, answered, annotations):
+    # answered holds the models Gemini answered with; a fallback model's detections aren't cached under this model's key
+    if answered - {model}:
+        print(f"⚠ Not caching detection from {', '.join(sorted(answered))} under {model}")
+        return
+    detection_cache.set(cache_key, annotations)
+
+def detect_and_cache(cache_key, model, image, payload, mime_type, detect_food_items, quick=False):
+    # The leader of a coalesced call caches for everyone, since only it knows which model answered
+    answered = set()
+    annotations = tiered_detector.detect(image, payload, mime_type, partial(detect_food_items, quick=quick, model=model, on_model=answered.add))
+    cache_detection(cache_key, model, answered, annotations)
+    return annotations
+
+async def detect_and_cache_async(cache_key, model, image, payload, mime_type, detect_food_items_async, quick=False):
+    answered = set()
+    annotations = await tiered_detector.detect_async(image, payload, mime_type, partial(detect_food_items_async, quick=quick, model=model, on_model=answered.add))
+    cache_detection(cache_key, model, answered, annotations)
+    return annotations
+
+def detect_annotations(image_bytes, detect_food_items, decode=True, quick=False):
+    # Returns (image, cache_key, annotations, cached); shared by the UI handlers and the JSON API
+    with timed("prepare_image"):
+        image, cache_key, annotations, prepared, model = begin_detection(image_bytes, decode, quick)
+    if annotations is not None:
+        return image, cache_key, annotations, True
+    payload, mime_type, _ = prepared
+    with timed("detect") as stage:
+        annotations = detection_calls.do(cache_key, detect_and_cache, cache_key, model, image, payload, mime_type, detect_food_items, quick)
+        stage.failed = not annotations
+    return image, cache_key, annotations, False
+
+async def detect_annotations_async(image_bytes, detect_food_items_async, decode=True, quick=False):
+    # Decoding and resizing are CPU-bound, so keep them off the event loop
+    with timed("prepare_image"):
+        image, cache_key, annotations, prepared, model = await asyncio.to_thread(begin_detection, image_bytes, decode, quick)
+    if annotations is not None:
+        return image, cache_key, annotations, True
+    payload, mime_type, _ = prepared
+    with timed("detect") as stage:
+        annotations = await detection_calls.do_async(cache_key, detect_and_cache_async, cache_key, model, image, payload, mime_type, detect_food_items_async, quick)
+        stage.failed = not annotations
+    return image, cache_key, annotations, False
+
+def process_image(image_bytes, detect_food_items, image_url=None, quick=False):
+    print("🔍 Starting food detection...")
+    
+    try:
+        image, _, annotations, _ = detect_annotations(image_bytes, detect_food_items, ANNOTATION_MODE == "server", quick)
+    except ValueError as e:
+        return unreadable_image(e)
+    return finish_detection(image, annotations, image_url)
+
+async def process_image_async(image_bytes, detect_food_items_async, image_url=None, quick=False):
     print("🔍 Starting food detection...")
     
-    annotations = detect_food_items(image_path)
+    try:
+        image, _, annotations, _ = await detect_annotations_async(image_bytes, detect_food_items_async, ANNOTATION_MODE == "server", quick)
+    except ValueError as e:
+        return unreadable_image(e)
+    return await asyncio.to_thread(finish_detection, image, annotations, image_url)
+
+def finish_detection(image, annotations, image_url=None, keep_selection=False):
     print(f"📊 Received {len(annotations)} annotations")
+    print(f"📊 Detection cache stats: {detection_cache.stats()}")
+    print(f"📊 Detector tier stats: {tiered_detector.stats()}")
     
     if not annotations:
         error_msg = "⚠ No ingredients detected. Try another image."
         print(error_msg)
-        return image_path, gr.CheckboxGroup(choices=[], value=[]), error_msg
+        return render_detection(image, [], image_url), gr.CheckboxGroup(choices=[], value=[]), error_msg
     
-    food_counts = Counter()
-    for ann in annotations:
-        if "label" in ann:
-            label = ann["label"].strip().lower()
-            food_counts[label] += 1
+    food_counts = count_food_items(annotations)
     print(f"📊 Food counts: {food_counts}")
     
     if not food_counts:
         error_msg = "⚠ No valid ingredients found."
         print(error_msg)
-        return image_path, gr.CheckboxGroup(choices=[], value=[]), error_msg
+        return render_detection(image, [], image_url), gr.CheckboxGroup(choices=[], value=[]), error_msg
     
-    choices = [f"{item.title()} ({count})" for item, count in food_counts.items()]
+    # Checkbox values are the canonical names, so selections need no parsing downstream
+    choices = [(f"{item.title()} ({count})", item) for item, count in food_counts.items()]
     print(f"✅ Created {len(choices)} ingredient choices: {choices}")
     
-    annotated_path = create_annotated_image(image_path, annotations)
-    if not annotated_path:
-        annotated_path = image_path
+    with timed("annotate"):
+        display = render_detection(image, annotations, image_url)
     
     success_msg = f"✅ Found {len(choices)} different items. Select below."
     print(success_msg)
     
-    return annotated_path, gr.CheckboxGroup(choices=choices, value=[], label="Select Ingredients", interactive=True), success_msg
+    # A streamed detection keeps whatever was ticked while boxes were still arriving
+    selection = {} if keep_selection else {"value": []}
+    return display, gr.CheckboxGroup(choices=choices, label="Select Ingredients", interactive=True, **selection), success_msg
 
-def upload_and_detect(file, detect_food_items):
+def upload_and_detect(file, detect_food_items, quick=False):
     if file is None:
         return None, gr.CheckboxGroup(choices=[], value=[]), "⚠ Please upload an image."
     
-    # Ensure the data directory exists
-    os.makedirs("data", exist_ok=True)
+    with timed("read_upload"), open(file.name, 'rb') as img_file:
+        image_bytes = img_file.read()
+    return process_image(image_bytes, detect_food_items, file_url(file.name), quick)
+
+async def upload_and_detect_async(file, detect_food_items_async, quick=False):
+    if file is None:
+        return None, gr.CheckboxGroup(choices=[], value=[]), "⚠ Please upload an image."
+    
+    with timed("read_upload"), open(file.name, 'rb') as img_file:
+        image_bytes = img_file.read()
+    return await process_image_async(image_bytes, detect_food_items_async, file_url(file.name), quick)
+
+class DetectionStream:
+    def __init__(self, image, image_url):
+        self.image = image
+        self.image_url = image_url
+        self.annotations = []
+        self.last_update = 0.0
+    
+    def start(self):
+        # The upload is shown (and the previous result cleared) before the model answers
+        return render_detection(self._canvas(), [], self.image_url), gr.CheckboxGroup(choices=[], value=[]), "🔍 Detecting ingredients..."
+    
+    def add(self, annotation):
+        # Returns whether an update is due; crowded photos can produce boxes faster than the UI needs them
+        self.annotations.append(annotation)
+        now = time.monotonic()
+        if now - self.last_update < DETECTION_STREAM_INTERVAL:
+            return False
+        self.last_update = now
+        return True
+    
+    def update(self):
+        food_counts = count_food_items(self.annotations)
+        choices = [(f"{item.title()} ({count})", item) for item, count in food_counts.items()]
+        display = render_detection(self._canvas(), self.annotations, self.image_url)
+        return display, gr.CheckboxGroup(choices=choices, label="Select Ingredients", interactive=True), f"🔍 Found {len(choices)} items so far..."
+    
+    def finish(self):
+        return finish_detection(self.image, self.annotations, self.image_url, keep_selection=True)
+    
+    def _canvas(self):
+        # Server-side annotation draws in place, so progressive frames draw on a copy
+        if ANNOTATION_MODE == "server" and self.image is not None:
+            return self.image.copy()
+        return self.image
+
+def upload_and_detect_stream(file, stream_food_items, quick=False):
+    if file is None:
+        yield None, gr.CheckboxGroup(choices=[], value=[]), "⚠ Please upload an image."
+        return
+    
+    with timed("read_upload"), open(file.name, 'rb') as img_file:
+        image_bytes = img_file.read()
+    image_url = file_url(file.name)
+    print("🔍 Starting streaming food detection...")
+    
+    try:
+        with timed("prepare_image"):
+            image, cache_key, annotations, prepared, model = begin_detection(image_bytes, ANNOTATION_MODE == "server", quick)
+    except ValueError as e:
+        yield unreadable_image(e)
+        return
+    if annotations is not None:
+        yield finish_detection(image, annotations, image_url)
+        return
+    
+    stream = DetectionStream(image, image_url)
+    yield stream.start()
+    payload, mime_type, _ = prepared
+    answered = set()
+    with timed("detect") as stage:
+        for annotation in tiered_detector.stream(image, payload, mime_type, partial(stream_food_items, quick=quick, model=model, on_model=answered.add)):
+            if stream.add(annotation):
+                yield stream.update()
+        stage.failed = not stream.annotations
+    cache_detection(cache_key, model, answered, stream.annotations)
+    yield stream.finish()
+
+async def upload_and_detect_stream_async(file, stream_food_items_async, quick=False):
+    if file is None:
+        yield None, gr.CheckboxGroup(choices=[], value=[]), "⚠ Please upload an image."
+        return
+    
+    with timed("read_upload"), open(file.name, 'rb') as img_file:
+        image_bytes = img_file.read()
+    image_url = file_url(file.name)
+    print("🔍 Starting streaming food detection...")
+    
+    try:
+        with timed("prepare_image"):
+            image, cache_key, annotations, prepared, model = await asyncio.to_thread(begin_detection, image_bytes, ANNOTATION_MODE == "server", quick)
+    except ValueError as e:
+        yield unreadable_image(e)
+        return
+    if annotations is not None:
+        yield await asyncio.to_thread(finish_detection, image, annotations, image_url)
+        return
     
-    image_path = "data/uploaded.jpg"
-    shutil.copy(file.name, image_path)
-    return process_image(image_path, detect_food_items)
\ No newline at end of file
+    stream = DetectionStream(image, image_url)
+    yield await asyncio.to_thread(stream.start)
+    payload, mime_type, _ = prepared
+    answered = set()
+    with timed("detect") as stage:
+        async for annotation in tiered_detector.stream_async(image, payload, mime_type, partial(stream_food_items_async, quick=quick, model=model, on_model=answered.add)):
+            if stream.add(annotation):
+                yield await asyncio.to_thread(stream.update)
+        stage.failed = not stream.annotations
+    cache_detection(cache_key, model, answered, stream.annotations)
+    yield await asyncio.to_thread(stream.finish)
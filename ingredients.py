@@ -0,0 +1,191 @@
+import re
+import threading
+
+# Variants and regional names that should share one ingredient with their common name
+SYNONYMS = {
+    "roma tomato": "tomato",
+    "cherry tomato": "tomato",
+    "plum tomato": "tomato",
+    "grape tomato": "tomato",
+    "beefsteak tomato": "tomato",
+    "vine tomato": "tomato",
+    "red onion": "onion",
+    "white onion": "onion",
+    "yellow onion": "onion",
+    "brown onion": "onion",
+    "green onion": "scallion",
+    "spring onion": "scallion",
+    "capsicum": "bell pepper",
+    "red pepper": "bell pepper",
+    "green pepper": "bell pepper",
+    "yellow pepper": "bell pepper",
+    "sweet pepper": "bell pepper",
+    "red bell pepper": "bell pepper",
+    "green bell pepper": "bell pepper",
+    "yellow bell pepper": "bell pepper",
+    "orange bell pepper": "bell pepper",
+    "aubergine": "eggplant",
+    "brinjal": "eggplant",
+    "courgette": "zucchini",
+    "coriander": "cilantro",
+    "coriander leaf": "cilantro",
+    "cilantro leaf": "cilantro",
+    "basil leaf": "basil",
+    "mint leaf": "mint",
+    "garbanzo bean": "chickpea",
+    "chana": "chickpea",
+    "maize": "corn",
+    "sweetcorn": "corn",
+    "corn on the cob": "corn",
+    "ladyfinger": "okra",
+    "bhindi": "okra",
+    "hen egg": "egg",
+    "chicken egg": "egg",
+    "rocket": "arugula",
+    "prawn": "shrimp",
+    "curd": "yogurt",
+    "yoghurt": "yogurt",
+    "paneer cheese": "paneer",
+    "romaine lettuce": "lettuce",
+    "iceberg lettuce": "lettuce",
+    "russet potato": "potato",
+    "yukon gold potato": "potato",
+}
+
+# Descriptive words dropped from the front of a label ("fresh basil", "baby spinach")
+VARIANTS = frozenset({"fresh", "ripe", "raw", "whole", "organic", "baby", "large", "small", "medium", "big", "sliced", "chopped", "diced", "halved", "peeled", "packaged", "loose"})
+
+# Words that end in "s" without being plurals
+UNCOUNTABLE = frozenset({"hummus", "asparagus", "couscous", "molasses", "swiss", "citrus", "lemongrass", "grass", "brussels", "watercress", "cress", "anise", "hibiscus", "octopus", "bass", "chives", "species", "pastis"})
+
+IRREGULAR_PLURALS = {"leaves": "leaf", "loaves": "loaf", "halves": "half", "knives": "knife", "geese": "goose", "mice": "mouse",
+                     # Words ending in "ie", which the "ies" -> "y" rule would mangle
+                     "cookies": "cookie", "brownies": "brownie", "smoothies": "smoothie", "veggies": "veggie", "chilies": "chili", "movies": "movie"}
+
+# Checkbox labels from older sessions and API clients look like "Tomato (2)"
+DISPLAY_COUNT = re.compile(r"\s*\(\d+\)$")
+WORD = re.compile(r"[a-z0-9]+")
+
+def singular(word):
+    if word in IRREGULAR_PLURALS:
+        return IRREGULAR_PLURALS[word]
+    if word in UNCOUNTABLE or len(word) <= 3 or word.isdigit():
+        return word
+    if word.endswith("ies") and len(word) > 4:
+        return word[:-3] + "y"
+    if word.endswith("oes"):
+        return word[:-2]
+    if word.endswith(("ches", "shes", "sses", "xes", "zes")):
+        return word[:-2]
+    if word.endswith("s") and not word.endswith(("ss", "us")):
+        return word[:-1]
+    return word
+
+def canonical(label):
+    words = WORD.findall(DISPLAY_COUNT.sub("", str(label).lower()))
+    if not words:
+        return ""
+    words[-1] = singular(words[-1])
+    name = " ".join(words)
+    while True:
+        name = SYNONYMS.get(name, name)
+        first, _, rest = name.partition(" ")
+        if first not in VARIANTS or not rest:
+            return name
+        name = rest
+
+class IngredientCounts:
+    """
+    A selection or detection as a compact count vector: interned ingredient
+    IDs with their counts, ordered by canonical name so prompts and cache keys
+    come out the same whatever order the ingredients were picked in. Iterates
+    and exposes items() like the {name: count} dicts it replaces.
+    """
+    __slots__ = ("vocabulary", "ids", "counts")
+
+    def __init__(self, vocabulary, ids, counts):
+        self.vocabulary = vocabulary
+        self.ids = ids
+        self.counts = counts
+
+    def names(self):
+        return [self.vocabulary.name(ingredient_id) for ingredient_id in self.ids]
+
+    def items(self):
+        return zip(self.names(), self.counts)
+
+    def key(self):
+        # Interned IDs differ between processes, so anything persisted or shared uses names
+        return [[name, count] for name, count in self.items()]
+
+    def __iter__(self):
+        return iter(self.names())
+
+    def __len__(self):
+        return len(self.ids)
+
+    def __eq__(self, other):
+        return isinstance(other, IngredientCounts) and self.ids == other.ids and self.counts == other.counts
+
+    def __hash__(self):
+        return hash((self.ids, self.counts))
+
+    def __repr__(self):
+        return f"IngredientCounts({dict(self.items())})"
+
+class Vocabulary:
+    """
+    Canonical ingredient names interned to small integer IDs. Every raw
+    label (detection output, checkbox value, dataset entry) is canonicalized
+    once, folding case, plurals, synonyms and variants, and remembered, so
+    repeated labels cost a dict lookup.
+    """
+    def __init__(self, max_labels=50000):
+        self.max_labels = max_labels
+        self._ids = {}
+        self._names = []
+        self._labels = {}
+        self._lock = threading.Lock()
+
+    def id(self, label):
+        ingredient_id = self._labels.get(label)
+        if ingredient_id is not None:
+            return ingredient_id
+        name = canonical(label)
+        with self._lock:
+            ingredient_id = self._ids.get(name)
+            if ingredient_id is None:
+                ingredient_id = self._ids[name] = len(self._names)
+                self._names.append(name)
+            # Model output is free text, so the raw-label memo is bounded; the vocabulary itself stays small
+            if len(self._labels) >= self.max_labels:
+                self._labels.clear()
+            self._labels[label] = ingredient_id
+        return ingredient_id
+
+    def name(self, ingredient_id):
+        return self._names[ingredient_id]
+
+    def label(self, label):
+        return self._names[self.id(label)]
+
+    def counts(self, labels):
+        # labels is an iterable of raw labels (one per item) or a {label: count} mapping
+        totals = {}
+        pairs = labels.items() if hasattr(labels, "items") else ((label, 1) for label in labels)
+        for label, count in pairs:
+            ingredient_id = self.id(label)
+            if self._names[ingredient_id]:
+                totals[ingredient_id] = totals.get(ingredient_id, 0) + int(count)
+        ordered = sorted(totals, key=self._names.__getitem__)
+        return IngredientCounts(self, tuple(ordered), tuple(totals[i] for i in ordered))
+
+    def __len__(self):
+        return len(self._names)
+
+vocabulary = Vocabulary()
+
+def ingredient_counts(selected_ingredients):
+    if isinstance(selected_ingredients, IngredientCounts):
+        return selected_ingredients
+    return vocabulary.counts(selected_ingredients)
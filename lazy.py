@@ -0,0 +1,24 @@
+import importlib
+import threading
+
+class LazyModule:
+    """
+    Stands in for a heavy module and imports it on first attribute access,
+    so importing the app doesn't pay for OpenCV until an image is handled.
+    """
+    def __init__(self, name):
+        self._name = name
+        self._module = None
+        self._lock = threading.Lock()
+
+    def _load(self):
+        with self._lock:
+            if self._module is None:
+                self._module = importlib.import_module(self._name)
+        return self._module
+
+    def __getattr__(self, attr):
+        return getattr(self._module or self._load(), attr)
+
+def lazy_module(name):
+    return LazyModule(name)
@@ -1,13 +1,14 @@
-import gradio as gr
-from ui_components import FoodieTheme, create_gradio_interface
-from image_processor import process_image, upload_and_detect
-from recipe_generator import get_recipes, show_recipe_details
-from utils import parse_recipe_sections
+import uvicorn
+from models import api_key_configured
+from server import create_app
 
 if __name__ == "__main__":
+    if not api_key_configured():
+        print("❌ GEMINI_API_KEY environment variable not set")
+        exit(1)
     try:
-        demo = create_gradio_interface()
-        demo.launch(server_name="0.0.0.0", server_port=7860, share=False)
+        # Gradio is mounted on a FastAPI app so /metrics can be served next to the UI
+        uvicorn.run(create_app(), host="0.0.0.0", port=7860)
     except Exception as e:
         print(f"❌ Failed to launch Gradio: {e}")
-        print("Try running on localhost with: demo.launch()")
\ No newline at end of file
+        print("Try running on localhost with: uvicorn.run(create_app(), host=\"127.0.0.1\", port=7860)")
@@ -0,0 +1,155 @@
+import functools
+import threading
+import time
+from bisect import bisect_left
+from collections import defaultdict
+
+# Gemini calls take seconds, image work milliseconds, so the buckets span both
+LATENCY_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 20, 30, 60, 120)
+
+_lock = threading.Lock()
+_metrics = []
+_collectors = []
+
+def escape_label(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+def format_labels(labels):
+    if not labels:
+        return ""
+    pairs = ",".join(f'{name}="{escape_label(value)}"' for name, value in labels.items())
+    return "{" + pairs + "}"
+
+class Counter:
+    kind = "counter"
+
+    def __init__(self, name, description, labels=()):
+        self.name = name
+        self.description = description
+        self.labels = labels
+        self.values = defaultdict(float)
+        _metrics.append(self)
+
+    def inc(self, *label_values, amount=1):
+        with _lock:
+            self.values[label_values] += amount
+
+    def samples(self):
+        with _lock:
+            values = list(self.values.items())
+        for label_values, value in values:
+            yield self.name, dict(zip(self.labels, label_values)), value
+
+class Gauge(Counter):
+    kind = "gauge"
+
+    def dec(self, *label_values, amount=1):
+        with _lock:
+            self.values[label_values] -= amount
+
+class Histogram:
+    kind = "histogram"
+
+    def __init__(self, name, description, labels=(), buckets=LATENCY_BUCKETS):
+        self.name = name
+        self.description = description
+        self.labels = labels
+        self.buckets = buckets
+        # label values -> per-bucket counts (last slot is +Inf), then sum
+        self.values = {}
+        _metrics.append(self)
+
+    def observe(self, value, *label_values):
+        index = bisect_left(self.buckets, value)
+        with _lock:
+            entry = self.values.get(label_values)
+            if entry is None:
+                entry = self.values[label_values] = [0] * (len(self.buckets) + 1) + [0.0]
+            entry[index] += 1
+            entry[-1] += value
+
+    def samples(self):
+        with _lock:
+            values = [(label_values, list(entry)) for label_values, entry in self.values.items()]
+        for label_values, entry in values:
+            labels = dict(zip(self.labels, label_values))
+            cumulative = 0
+            for bound, count in zip(self.buckets + ("+Inf",), entry):
+                cumulative += count
+                yield f"{self.name}_bucket", dict(labels, le=str(bound)), cumulative
+            yield f"{self.name}_sum", labels, entry[-1]
+            yield f"{self.name}_count", labels, cumulative
+
+STAGE_SECONDS = Histogram("smart_fridge_stage_seconds", "Time spent in each pipeline stage", ("stage",))
+STAGE_CALLS = Counter("smart_fridge_stage_calls_total", "Pipeline stage executions", ("stage",))
+STAGE_FAILURES = Counter("smart_fridge_stage_failures_total", "Pipeline stage executions that failed", ("stage",))
+STAGE_IN_FLIGHT = Gauge("smart_fridge_stage_in_flight", "Pipeline stage executions currently running", ("stage",))
+MODEL_REQUEST_BYTES = Counter("smart_fridge_model_request_bytes_total", "Bytes of images and prompts sent to Gemini", ("stage",))
+MODEL_RESPONSE_BYTES = Counter("smart_fridge_model_response_bytes_total", "Bytes of text received from Gemini", ("stage",))
+
+class timed:
+    """
+    Times a block as one execution of a pipeline stage. Exceptions count as
+    failures; code that reports failure through its return value can set
+    .failed instead.
+    """
+    __slots__ = ("stage", "start", "failed")
+
+    def __init__(self, stage):
+        self.stage = stage
+        self.failed = False
+
+    def __enter__(self):
+        STAGE_IN_FLIGHT.inc(self.stage)
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        elapsed = time.perf_counter() - self.start
+        key = (self.stage,)
+        index = bisect_left(STAGE_SECONDS.buckets, elapsed)
+        # One lock round-trip for all four metrics keeps the per-stage cost to a few microseconds
+        with _lock:
+            entry = STAGE_SECONDS.values.get(key)
+            if entry is None:
+                entry = STAGE_SECONDS.values[key] = [0] * (len(STAGE_SECONDS.buckets) + 1) + [0.0]
+            entry[index] += 1
+            entry[-1] += elapsed
+            STAGE_IN_FLIGHT.values[key] -= 1
+            STAGE_CALLS.values[key] += 1
+            if exc_type is not None or self.failed:
+                STAGE_FAILURES.values[key] += 1
+        return False
+
+def instrument(stage):
+    def decorate(fn):
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            with timed(stage):
+                return fn(*args, **kwargs)
+        return wrapper
+    return decorate
+
+def register_collector(collect):
+    # collect() returns (name, kind, description, [(labels, value), ...]) tuples, evaluated at scrape time
+    _collectors.append(collect)
+
+def render():
+    lines = []
+    for metric in _metrics:
+        lines.append(f"# HELP {metric.name} {metric.description}")
+        lines.append(f"# TYPE {metric.name} {metric.kind}")
+        for name, labels, value in metric.samples():
+            lines.append(f"{name}{format_labels(labels)} {value}")
+    for collect in _collectors:
+        try:
+            families = list(collect())
+        except Exception as e:
+            print(f"⚠ Metrics collector failed: {e}")
+            continue
+        for name, kind, description, samples in families:
+            lines.append(f"# HELP {name} {description}")
+            lines.append(f"# TYPE {name} {kind}")
+            for labels, value in samples:
+                lines.append(f"{name}{format_labels(labels)} {value}")
+    return "\n".join(lines) + "\n"
@@ -0,0 +1,40 @@
+import os
+import threading
+from fake_gemini import GEMINI_FAKE, GEMINI_RECORD, RecordingGenerativeModel, create_fake_model
+
+# GenerativeModel clients are reused across requests instead of being rebuilt per call
+_models = {}
+_lock = threading.Lock()
+
+# google.generativeai takes about a second to import, so it is loaded and configured
+# when the first real client is built (or by the warm-up thread) rather than at startup
+GenerativeModel = None
+
+def api_key_configured():
+    return GEMINI_FAKE or bool(os.environ.get("GEMINI_API_KEY"))
+
+def configure_gemini():
+    global GenerativeModel
+    api_key = os.environ.get("GEMINI_API_KEY")
+    if not api_key:
+        raise RuntimeError("GEMINI_API_KEY environment variable not set")
+    from google.generativeai import GenerativeModel as client_class, configure
+    configure(api_key=api_key)
+    GenerativeModel = client_class
+
+def get_model(name):
+    model = _models.get(name)
+    if model is None:
+        with _lock:
+            model = _models.get(name)
+            if model is None:
+                if GEMINI_FAKE:
+                    model = create_fake_model(name)
+                else:
+                    if GenerativeModel is None:
+                        configure_gemini()
+                    model = GenerativeModel(name)
+                if GEMINI_RECORD and not GEMINI_FAKE:
+                    model = RecordingGenerativeModel(model, GEMINI_RECORD)
+                _models[name] = model
+    return model
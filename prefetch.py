@@ -0,0 +1,90 @@
+import os
+import threading
+import time
+from collections import OrderedDict, deque
+from concurrent.futures import ThreadPoolExecutor
+
+RECIPE_PREFETCH = os.environ.get("RECIPE_PREFETCH", "false").lower() in ("1", "true", "yes")
+PREFETCH_WORKERS = int(os.environ.get("PREFETCH_WORKERS", "2"))
+PREFETCH_TOP_N = int(os.environ.get("PREFETCH_TOP_N", "3"))
+PREFETCH_MAX_PER_MINUTE = int(os.environ.get("PREFETCH_MAX_PER_MINUTE", "20"))
+PREFETCH_MAX_SESSIONS = int(os.environ.get("PREFETCH_MAX_SESSIONS", "500"))
+
+class RecipePrefetcher:
+    def __init__(self, generate, max_workers=2, top_n=3, max_per_minute=20, max_sessions=500):
+        self._generate = generate
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="recipe-prefetch")
+        self.top_n = top_n
+        self.max_per_minute = max_per_minute
+        self.max_sessions = max_sessions
+        # session_id -> (inputs, {recipe_name: future})
+        self._sessions = OrderedDict()
+        self._started = deque()
+        self._lock = threading.Lock()
+        self.scheduled = 0
+        self.hits = 0
+        self.skipped = 0
+
+    def _take_quota(self):
+        now = time.monotonic()
+        while self._started and self._started[0] < now - 60:
+            self._started.popleft()
+        if len(self._started) >= self.max_per_minute:
+            return False
+        self._started.append(now)
+        return True
+
+    def schedule(self, session_id, recipe_names, inputs):
+        with self._lock:
+            self._cancel_locked(session_id)
+            futures = {}
+            # The executor queue is FIFO, so the top suggestions start first
+            for name in recipe_names[:self.top_n]:
+                if not self._take_quota():
+                    self.skipped += 1
+                    continue
+                futures[name] = self._executor.submit(self._generate, name, *inputs)
+                self.scheduled += 1
+            self._sessions[session_id] = (inputs, futures)
+            while len(self._sessions) > self.max_sessions:
+                oldest = next(iter(self._sessions))
+                self._cancel_locked(oldest)
+        if futures:
+            print(f"🔮 Prefetching {len(futures)} recipes for session {session_id[:8]}")
+
+    def cancel(self, session_id):
+        with self._lock:
+            self._cancel_locked(session_id)
+
+    def _cancel_locked(self, session_id):
+        entry = self._sessions.pop(session_id, None)
+        if entry:
+            # Running calls cannot be interrupted; their results are simply dropped
+            for future in entry[1].values():
+                future.cancel()
+
+    def take(self, session_id, recipe_name, inputs):
+        with self._lock:
+            entry = self._sessions.get(session_id)
+            if not entry:
+                return None
+            if entry[0] != inputs:
+                self._cancel_locked(session_id)
+                return None
+            future = entry[1].pop(recipe_name, None)
+        if future is None:
+            return None
+        # A call that has not started yet is cheaper to run live than to wait behind the queue
+        if not future.running() and not future.done():
+            future.cancel()
+            return None
+        try:
+            result = future.result()
+        except Exception as e:
+            print(f"⚠ Prefetch for '{recipe_name}' failed: {e}")
+            return None
+        self.hits += 1
+        return result
+
+    def stats(self):
+        return {"scheduled": self.scheduled, "hits": self.hits, "skipped": self.skipped, "sessions": len(self._sessions)}
@@ -0,0 +1,155 @@
+import math
+from collections import defaultdict
+
+import metrics
+
+CUISINES = ("Italian", "Japanese", "Chinese", "Middle Eastern", "Greek", "Mexican", "French", "Thai", "North Indian", "South Indian", "East Indian", "West Indian")
+
+# Gemini bills an image as 258 tokens per 768px tile; estimates count one tile per image
+IMAGE_TOKENS = 258
+# Rough characters per token for English prompts, used only when a response carries no usage metadata
+CHARS_PER_TOKEN = 4
+
+MODEL_TOKENS = metrics.Counter("smart_fridge_model_tokens_total", "Gemini tokens by stage, model, cuisine and direction (input, output, cached)", ("stage", "model", "cuisine", "direction"))
+TOKEN_ESTIMATES = metrics.Counter("smart_fridge_model_token_estimates_total", "Gemini calls whose token counts were estimated because the response had no usage metadata", ("stage", "model"))
+
+# Every prompt starts with a fixed instruction block and ends with the per-request details, so
+# calls of one kind share a byte-identical prefix that Gemini's implicit context cache can reuse
+DETECTION_PROMPT = (
+    'Detect all prominent food ingredients in the image. Return a JSON array of objects with "label" '
+    '(ingredient name) and "box_2d" ([ymin, xmin, ymax, xmax] normalized to 0-1000), e.g. '
+    '[{"label": "apple", "box_2d": [100, 200, 300, 400]}, {"label": "banana", "box_2d": [150, 250, 350, 450]}]'
+)
+
+RECIPE_RULES = """Rules:
+- Follow the diet strictly and the authentic flavors and techniques of the cuisine
+- Common pantry staples are available"""
+
+SUGGESTION_PREFIX = f"""Suggest exactly 5 recipe names for the request below.
+{RECIPE_RULES}
+- Use 2-3 of the listed ingredients as the main ones
+- Practical for home cooking
+- Names only, no descriptions or explanations
+Format: a numbered list with one name per line, e.g.
+1. Recipe Name
+2. Recipe Name"""
+
+DETAIL_PREFIX = f"""Write a detailed recipe for the request below in plain text, with no asterisks or markdown, using exactly these section headers:
+INGREDIENTS:
+Every ingredient with its quantity, marking which are from the listed ingredients and which are additional
+PREP TIME:
+Only the number of minutes of preparation
+COOK TIME:
+Only the number of minutes of cooking, adjusted as the request's timing says
+EQUIPMENT NEEDED:
+Kitchen tools and equipment needed
+SERVING SIZE:
+The number of servings
+CALORIES:
+Approximate calories per single serving (not total)
+INSTRUCTIONS:
+Numbered step-by-step instructions using the cuisine's techniques
+TIPS FOR SUCCESS:
+Tips and variations specific to the cuisine
+{RECIPE_RULES}
+- Scale all ingredients and timing to the servings
+- Nutrition is per single serving only"""
+
+DETAIL_JSON_PREFIX = f"""Write a detailed recipe for the request below as a JSON object following the response schema:
+- ingredients: every ingredient with its quantity
+- prep_minutes: whole minutes of preparation
+- cook_minutes: whole minutes of cooking, adjusted as the request's timing says
+- equipment: kitchen tools and equipment needed
+- serving_size: the number of servings
+- calories_per_serving: approximate calories per single serving (not total)
+- instructions: one step per entry, without step numbers, using the cuisine's techniques
+- tips: tips and variations specific to the cuisine
+{RECIPE_RULES}
+- Scale all ingredients and timing to the servings
+- Nutrition is per single serving only"""
+
+DIETS = {
+    "Vegetarian": "strictly vegetarian (no meat, fish, or poultry)",
+    "Non-Vegetarian": "may include meat, fish, or poultry",
+}
+# Preselected in the UI and assumed by the API when a request names no diet
+DEFAULT_DIET = "Vegetarian"
+
+class Prompt:
+    """
+    Prompt text together with the stage and cuisine its token usage is
+    reported under.
+    """
+    __slots__ = ("stage", "cuisine", "text")
+
+    def __init__(self, stage, cuisine, text):
+        self.stage = stage
+        self.cuisine = cuisine
+        self.text = text
+
+def ingredient_list(selected_ingredients):
+    return ", ".join(f"{count} {item}{'s' if count > 1 else ''}" for item, count in selected_ingredients.items())
+
+def time_adjustment(serving_size):
+    if serving_size > 6:
+        return "increase cooking time by 15-25% for the larger quantity"
+    if serving_size < 3:
+        return "reduce cooking time by 10-15% for the smaller quantity"
+    return "standard cooking times"
+
+def request_details(selected_ingredients, diet_type, cuisine_type, serving_size, additional_instructions):
+    lines = [
+        f"Ingredients: {ingredient_list(selected_ingredients)}",
+        f"Diet: {DIETS.get(diet_type, diet_type or 'any')}",
+        f"Cuisine: {cuisine_type}",
+        f"Servings: {serving_size}",
+    ]
+    if additional_instructions.strip():
+        lines.append(f"Additional requirements: {additional_instructions.strip()}")
+    return lines
+
+def cuisine_label(cuisine_type):
+    # Free-text cuisines would make the metric labels unbounded
+    return cuisine_type if cuisine_type in CUISINES else "other"
+
+def detection_prompt():
+    return Prompt("detect", "none", DETECTION_PROMPT)
+
+def suggestion_prompt(selected_ingredients, diet_type, cuisine_type, serving_size, additional_instructions=""):
+    details = request_details(selected_ingredients, diet_type, cuisine_type, serving_size, additional_instructions)
+    return Prompt("suggest", cuisine_label(cuisine_type), "\n".join([SUGGESTION_PREFIX, "Request:"] + details))
+
+def detail_prompt(recipe_name, selected_ingredients, diet_type, cuisine_type, serving_size, additional_instructions="", structured=False):
+    details = request_details(selected_ingredients, diet_type, cuisine_type, serving_size, additional_instructions)
+    lines = [DETAIL_JSON_PREFIX if structured else DETAIL_PREFIX, "Request:", f"Recipe: {recipe_name}"] + details
+    lines.append(f"Timing: {time_adjustment(serving_size)}")
+    return Prompt("detail", cuisine_label(cuisine_type), "\n".join(lines))
+
+def estimate_tokens(text):
+    return math.ceil(len(text) / CHARS_PER_TOKEN)
+
+def record_usage(prompt, model, response_text, usage=None, images=0):
+    # usage is the response's usage_metadata; the fake backend and some stream chunks have none
+    if usage is not None and getattr(usage, "prompt_token_count", 0):
+        input_tokens = usage.prompt_token_count
+        output_tokens = getattr(usage, "candidates_token_count", 0) or 0
+        cached_tokens = getattr(usage, "cached_content_token_count", 0) or 0
+    else:
+        input_tokens = estimate_tokens(prompt.text) + images * IMAGE_TOKENS
+        output_tokens = estimate_tokens(response_text)
+        cached_tokens = 0
+        TOKEN_ESTIMATES.inc(prompt.stage, model)
+    MODEL_TOKENS.inc(prompt.stage, model, prompt.cuisine, "input", amount=input_tokens)
+    MODEL_TOKENS.inc(prompt.stage, model, prompt.cuisine, "output", amount=output_tokens)
+    if cached_tokens:
+        MODEL_TOKENS.inc(prompt.stage, model, prompt.cuisine, "cached", amount=cached_tokens)
+
+def token_report():
+    # {"stage": {"detail": {"input": ..., "output": ..., "cached": ...}}, "model": {...}, "cuisine": {...}}
+    report = {group: defaultdict(lambda: {"input": 0, "output": 0, "cached": 0}) for group in ("stage", "model", "cuisine")}
+    with metrics._lock:
+        values = list(MODEL_TOKENS.values.items())
+    for (stage, model, cuisine, direction), count in values:
+        for group, name in (("stage", stage), ("model", model), ("cuisine", cuisine)):
+            report[group][name][direction] += int(count)
+    return {group: dict(totals) for group, totals in report.items()}
@@ -1,251 +1,533 @@
-from google.generativeai import GenerativeModel
+import asyncio
+import os
 import re
+from functools import partial
 import gradio as gr
+from scheduler import gemini_scheduler
+from router import model_router
+from prompts import detail_prompt, record_usage, suggestion_prompt
+from utils import STRUCTURED_RECIPE_SCHEMA, RecipeSectionParser, empty_recipe_sections, parse_recipe_sections, parse_structured_recipe
+from cache import canonical_recipe_params, recipe_cache
+from corpus import CORPUS_LOOKUPS, ingredients_in, recipe_corpus
+from ingredients import vocabulary
+from singleflight import detail_calls, suggestion_calls
+from metrics import MODEL_REQUEST_BYTES, MODEL_RESPONSE_BYTES, instrument, timed
+from recipe_html import RECIPE_COMBINED, combine, render_cards, render_error
+from prefetch import RECIPE_PREFETCH, PREFETCH_WORKERS, PREFETCH_TOP_N, PREFETCH_MAX_PER_MINUTE, PREFETCH_MAX_SESSIONS, RecipePrefetcher
 
-def generate_recipe_suggestions(selected_ingredients, diet_type, cuisine_type, serving_size, additional_instructions=""):
+SUGGESTION_MODEL = 'gemini-2.5-flash'
+DETAIL_MODEL = 'gemini-2.5-pro'
+
+RECIPE_STREAMING = os.environ.get("RECIPE_STREAMING", "true").lower() in ("1", "true", "yes")
+
+# "json" asks Gemini for schema-constrained JSON instead of free text with section headers
+RECIPE_OUTPUT_FORMAT = os.environ.get("RECIPE_OUTPUT_FORMAT", "text").lower()
+RECIPE_JSON_OUTPUT = RECIPE_OUTPUT_FORMAT == "json"
+STRUCTURED_RECIPE_CONFIG = {"response_mime_type": "application/json", "response_schema": STRUCTURED_RECIPE_SCHEMA}
+
+# Recipe cards after the header, in output order, with the parsed sections each one needs
+RECIPE_CARD_SECTIONS = [
+    ('ingredients',),
+    ('prep_time', 'cook_time'),
+    ('equipment',),
+    ('calories',),
+    ('instructions',),
+    ('tips',),
+]
+EMPTY_RECIPE = ("",) * (len(RECIPE_CARD_SECTIONS) + 1)
+
+def parse_recipe_names(text):
+    recipe_names = []
+    for line in text.strip().split('\n'):
+        line = line.strip()
+        if line and re.match(r'^\d+\.\s', line):
+            name = re.sub(r'^\d+\.\s*', '', line).strip()
+            recipe_names.append(name)
+    return recipe_names[:5]
+
+def answered_as_keyed(route, model):
+    # A fallback answer from the scheduler isn't cached under the key of the model that was asked
+    if route.model != model:
+        print(f"⚠ Not caching {route.stage} answer from {route.model} under {model}")
+        return False
+    return True
+
+def suggestions_cache_key(selected_ingredients, diet_type, cuisine_type, serving_size, additional_instructions="", model=SUGGESTION_MODEL):
+    params = canonical_recipe_params(selected_ingredients, diet_type, cuisine_type, serving_size, additional_instructions)
+    return recipe_cache.key("suggestions", model, params)
+
+def request_recipe_suggestions(cache_key, prompt, model, quick=False):
+    MODEL_REQUEST_BYTES.inc("suggest", amount=len(prompt.text))
+    with model_router.route("suggest", SUGGESTION_MODEL, quick, model) as route, timed("suggest"):
+        response = gemini_scheduler.call(route.model, prompt.text, on_model=route.answered_by)
+    MODEL_RESPONSE_BYTES.inc("suggest", amount=len(response.text))
+    record_usage(prompt, route.model, response.text, getattr(response, "usage_metadata", None))
+    
+    recipe_names = parse_recipe_names(response.text)
+    if recipe_names and answered_as_keyed(route, model):
+        recipe_cache.set(cache_key, recipe_names)
+    return recipe_names
+
+async def request_recipe_suggestions_async(cache_key, prompt, model, quick=False):
+    MODEL_REQUEST_BYTES.inc("suggest", amount=len(prompt.text))
+    with model_router.route("suggest", SUGGESTION_MODEL, quick, model) as route, timed("suggest"):
+        response = await gemini_scheduler.call_async(route.model, prompt.text, on_model=route.answered_by)
+    MODEL_RESPONSE_BYTES.inc("suggest", amount=len(response.text))
+    record_usage(prompt, route.model, response.text, getattr(response, "usage_metadata", None))
+    
+    recipe_names = parse_recipe_names(response.text)
+    if recipe_names and answered_as_keyed(route, model):
+        recipe_cache.set(cache_key, recipe_names)
+    return recipe_names
+
+def local_recipe_suggestions(selected_ingredients, diet_type, cuisine_type, additional_instructions=""):
+    if recipe_corpus is None:
+        return None
+    if additional_instructions.strip():
+        # Free-text requirements can't be checked against the index, so those requests go to Gemini
+        CORPUS_LOOKUPS.inc("skipped")
+        return None
+    with timed("corpus_suggest"):
+        recipe_names = recipe_corpus.suggest(selected_ingredients, diet_type, cuisine_type)
+    CORPUS_LOOKUPS.inc("hit" if recipe_names else "miss")
+    if recipe_names:
+        print(f"📚 Recipe suggestions answered from the local corpus: {recipe_names}")
+    return recipe_names
+
+def generate_recipe_suggestions(selected_ingredients, diet_type, cuisine_type, serving_size, additional_instructions="", quick=False):
     if not selected_ingredients:
         return []
     
-    ingredients_list = [f"{count} {item}{'s' if count > 1 else ''}" 
-                       for item, count in selected_ingredients.items()]
-    ingredients_text = ", ".join(ingredients_list)
+    # Keyed by the model the call will be routed to, so quick or degraded answers stay apart
+    model = model_router.choose("suggest", SUGGESTION_MODEL, quick)
+    cache_key = suggestions_cache_key(selected_ingredients, diet_type, cuisine_type, serving_size, additional_instructions, model)
+    cached = recipe_cache.get(cache_key)
+    if cached:
+        print("⚡ Recipe suggestions cache hit")
+        return cached
     
-    diet_specification = ""
-    if diet_type == "Vegetarian":
-        diet_specification = "strictly vegetarian (no meat, fish, or poultry)"
-    elif diet_type == "Non-Vegetarian":
-        diet_specification = "can include meat, fish, or poultry"
+    local = local_recipe_suggestions(selected_ingredients, diet_type, cuisine_type, additional_instructions)
+    if local:
+        return local
     
-    # Add additional instructions to the prompt if provided
-    additional_requirements = ""
-    if additional_instructions.strip():
-        additional_requirements = f"\n    - Additional requirements: {additional_instructions.strip()}"
-    
-    prompt = f"""
-    Suggest exactly 5 {diet_specification} {cuisine_type} recipe names using these ingredients: {ingredients_text}.
-    The recipes should serve {serving_size} people.
-    
-    Requirements:
-    - Recipes must be {diet_specification}
-    - Must follow {cuisine_type} cuisine style and flavors
-    - Should use 2-3 main detected ingredients
-    - Assume common pantry staples are available
-    - Be practical for home cooking
-    - Suitable for serving {serving_size} people{additional_requirements}
-    - ONLY provide recipe names, no descriptions or explanations
-    
-    Format as a simple numbered list with only recipe names:
-    1. Recipe Name 1
-    2. Recipe Name 2
-    3. Recipe Name 3
-    4. Recipe Name 4
-    5. Recipe Name 5
-    """
+    prompt = suggestion_prompt(selected_ingredients, diet_type, cuisine_type, serving_size, additional_instructions)
     try:
-        model = GenerativeModel('gemini-2.5-flash')
-        response = model.generate_content(prompt)
-        
-        recipe_names = []
-        for line in response.text.strip().split('\n'):
-            line = line.strip()
-            if line and re.match(r'^\d+\.\s', line):
-                name = re.sub(r'^\d+\.\s*', '', line).strip()
-                recipe_names.append(name)
-        return recipe_names[:5]
+        return suggestion_calls.do(cache_key, request_recipe_suggestions, cache_key, prompt, model, quick)
     except Exception as e:
         print(f"❌ Recipe suggestion error: {e}")
         return []
 
-def generate_detailed_recipe(recipe_name, selected_ingredients, diet_type, cuisine_type, serving_size, additional_instructions=""):
-    ingredients_list = [f"{count} {item}{'s' if count > 1 else ''}" 
-                       for item, count in selected_ingredients.items()]
-    ingredients_text = ", ".join(ingredients_list)
-    
-    diet_specification = ""
-    if diet_type == "Vegetarian":
-        diet_specification = "strictly vegetarian (no meat, fish, or poultry)"
-    elif diet_type == "Non-Vegetarian":
-        diet_specification = "can include meat, fish, or poultry"
-    
-    time_adjustment = ""
-    if serving_size > 6:
-        time_adjustment = "Increase cooking time by 15-25% for larger quantities."
-    elif serving_size < 3:
-        time_adjustment = "Reduce cooking time by 10-15% for smaller quantities."
-    else:
-        time_adjustment = "Standard cooking times apply."
-    
-    # Add additional instructions to the prompt if provided
-    additional_requirements = ""
-    if additional_instructions.strip():
-        additional_requirements = f"\n    - Additional requirements: {additional_instructions.strip()}"
-    
-    prompt = f"""
-    Create a detailed {diet_specification} {cuisine_type} recipe for "{recipe_name}" using: {ingredients_text}.
-    The recipe should serve {serving_size} people.
-    
-    Structure the response with these exact sections using simple text formatting (NO asterisks, NO markdown symbols):
-    
-    INGREDIENTS:
-    List all ingredients with quantities scaled for {serving_size} servings, marking which are from detected ingredients and which are additional. Follow {cuisine_type} cuisine traditions.
-    
-    PREP TIME:
-    Just the number of minutes for preparation (adjust for serving {serving_size} people)
-    
-    COOK TIME:
-    Just the number of minutes for cooking (adjust for serving {serving_size} people - {time_adjustment})
-    
-    EQUIPMENT NEEDED:
-    List all kitchen tools and equipment needed for {cuisine_type} cooking
-    
-    SERVING SIZE:
-    Confirm this recipe serves {serving_size} people
-    
-    CALORIES:
-    Approximate calories per single serving (not total)
+async def generate_recipe_suggestions_async(selected_ingredients, diet_type, cuisine_type, serving_size, additional_instructions="", quick=False):
+    if not selected_ingredients:
+        return []
     
-    INSTRUCTIONS:
-    Numbered step-by-step cooking instructions following {cuisine_type} cooking techniques and methods (timing adjusted for {serving_size} servings)
+    # Keyed by the model the call will be routed to, so quick or degraded answers stay apart
+    model = model_router.choose("suggest", SUGGESTION_MODEL, quick)
+    cache_key = suggestions_cache_key(selected_ingredients, diet_type, cuisine_type, serving_size, additional_instructions, model)
+    cached = recipe_cache.get(cache_key)
+    if cached:
+        print("⚡ Recipe suggestions cache hit")
+        return cached
     
-    TIPS FOR SUCCESS:
-    Helpful tips and variations specific to {cuisine_type} cuisine
+    local = local_recipe_suggestions(selected_ingredients, diet_type, cuisine_type, additional_instructions)
+    if local:
+        return local
     
-    Requirements:
-    - Recipe must be {diet_specification}
-    - Follow authentic {cuisine_type} flavors and techniques
-    - Scale all ingredients and timing for {serving_size} servings
-    - Provide nutrition information per single serving only{additional_requirements}
-    - Do not use any asterisks, bold formatting, or markdown symbols
-    - Use plain text formatting only
-    """
+    prompt = suggestion_prompt(selected_ingredients, diet_type, cuisine_type, serving_size, additional_instructions)
+    try:
+        return await suggestion_calls.do_async(cache_key, request_recipe_suggestions_async, cache_key, prompt, model, quick)
+    except Exception as e:
+        print(f"❌ Recipe suggestion error: {e}")
+        return []
+
+def detailed_recipe_cache_key(recipe_name, selected_ingredients, diet_type, cuisine_type, serving_size, additional_instructions="", model=DETAIL_MODEL):
+    params = canonical_recipe_params(selected_ingredients, diet_type, cuisine_type, serving_size, additional_instructions, recipe_name)
+    return recipe_cache.key("detail-json" if RECIPE_JSON_OUTPUT else "detail", model, params)
+
+def request_detailed_recipe(cache_key, prompt, model, quick=False, background=False):
+    MODEL_REQUEST_BYTES.inc("detail", amount=len(prompt.text))
+    with model_router.route("detail", DETAIL_MODEL, quick, model, background) as route, timed("detail"):
+        response = gemini_scheduler.call(route.model, prompt.text, generation_config=STRUCTURED_RECIPE_CONFIG if RECIPE_JSON_OUTPUT else None, on_model=route.answered_by, background=background)
+    MODEL_RESPONSE_BYTES.inc("detail", amount=len(response.text))
+    record_usage(prompt, route.model, response.text, getattr(response, "usage_metadata", None))
+    if answered_as_keyed(route, model):
+        recipe_cache.set(cache_key, {"text": response.text, "sections": None})
+    return response.text
+
+async def request_detailed_recipe_async(cache_key, prompt, model, quick=False):
+    MODEL_REQUEST_BYTES.inc("detail", amount=len(prompt.text))
+    with model_router.route("detail", DETAIL_MODEL, quick, model) as route, timed("detail"):
+        response = await gemini_scheduler.call_async(route.model, prompt.text, generation_config=STRUCTURED_RECIPE_CONFIG if RECIPE_JSON_OUTPUT else None, on_model=route.answered_by)
+    MODEL_RESPONSE_BYTES.inc("detail", amount=len(response.text))
+    record_usage(prompt, route.model, response.text, getattr(response, "usage_metadata", None))
+    if answered_as_keyed(route, model):
+        recipe_cache.set(cache_key, {"text": response.text, "sections": None})
+    return response.text
+
+def generate_detailed_recipe(recipe_name, selected_ingredients, diet_type, cuisine_type, serving_size, additional_instructions="", quick=False, model=None, background=False):
+    model = model or model_router.choose("detail", DETAIL_MODEL, quick)
+    cache_key = detailed_recipe_cache_key(recipe_name, selected_ingredients, diet_type, cuisine_type, serving_size, additional_instructions, model)
+    cached = recipe_cache.get(cache_key)
+    if cached:
+        print(f"⚡ Detailed recipe cache hit: {recipe_name}")
+        return cached["text"]
+    
+    prompt = detail_prompt(recipe_name, selected_ingredients, diet_type, cuisine_type, serving_size, additional_instructions, RECIPE_JSON_OUTPUT)
+    try:
+        if background:
+            # Speculative calls stay out of singleflight, so a live request never waits on or shares the failure of one
+            return request_detailed_recipe(cache_key, prompt, model, quick, background=True)
+        return detail_calls.do(cache_key, request_detailed_recipe, cache_key, prompt, model, quick)
+    except Exception as e:
+        return f"❌ Error generating recipe: {e}"
+
+async def generate_detailed_recipe_async(recipe_name, selected_ingredients, diet_type, cuisine_type, serving_size, additional_instructions="", quick=False, model=None):
+    model = model or model_router.choose("detail", DETAIL_MODEL, quick)
+    cache_key = detailed_recipe_cache_key(recipe_name, selected_ingredients, diet_type, cuisine_type, serving_size, additional_instructions, model)
+    cached = recipe_cache.get(cache_key)
+    if cached:
+        print(f"⚡ Detailed recipe cache hit: {recipe_name}")
+        return cached["text"]
+    
+    prompt = detail_prompt(recipe_name, selected_ingredients, diet_type, cuisine_type, serving_size, additional_instructions, RECIPE_JSON_OUTPUT)
     try:
-        model = GenerativeModel('gemini-2.5-pro')
-        response = model.generate_content(prompt)
-        return response.text
+        return await detail_calls.do_async(cache_key, request_detailed_recipe_async, cache_key, prompt, model, quick)
     except Exception as e:
         return f"❌ Error generating recipe: {e}"
 
+def parse_detailed_recipe(detailed_recipe, parse_recipe_sections):
+    # The text parser stays as the fallback when JSON is malformed or the model ignored the schema
+    sections = parse_structured_recipe(detailed_recipe) if RECIPE_JSON_OUTPUT else None
+    if sections is None:
+        sections = parse_recipe_sections(detailed_recipe)
+    return sections
+
+def cache_recipe_sections(cache_key, detailed_recipe, sections):
+    # Store the parsed form next to the text so later hits skip parse_recipe_sections
+    # A failed stream can end with the error message after partial text
+    if cache_key and detailed_recipe and "❌ Error generating recipe" not in detailed_recipe:
+        recipe_cache.set(cache_key, {"text": detailed_recipe, "sections": sections})
+
+def generated_cache_key(cache_key):
+    # Sections only go next to text the generation cached; an answer from a fallback model wasn't
+    return cache_key if recipe_cache.get(cache_key) is not None else None
+
+def remember_recipe(recipe_name, counts, diet_type, cuisine_type, additional_instructions, detailed_recipe, sections):
+    # Generated recipes feed the corpus, indexed by the selected ingredients they actually use
+    if recipe_corpus is None or additional_instructions.strip() or not detailed_recipe or "❌ Error generating recipe" in detailed_recipe:
+        return
+    used = ingredients_in(sections.get('ingredients') or "", counts)
+    if used:
+        recipe_corpus.add(recipe_name, used, cuisine_type, diet_type)
+
+recipe_prefetcher = None
+if RECIPE_PREFETCH:
+    # Prefetches run as background calls: they don't count as live routing load and only use spare rate limit
+    recipe_prefetcher = RecipePrefetcher(partial(generate_detailed_recipe, background=True), PREFETCH_WORKERS, PREFETCH_TOP_N, PREFETCH_MAX_PER_MINUTE, PREFETCH_MAX_SESSIONS)
+
+def take_prefetched_recipe(session_id, recipe_name, inputs):
+    if recipe_prefetcher is None or not session_id:
+        return None
+    detailed_recipe = recipe_prefetcher.take(session_id, recipe_name, inputs)
+    if not detailed_recipe or detailed_recipe.startswith("❌"):
+        return None
+    print(f"⚡ Serving prefetched recipe: {recipe_name}")
+    return detailed_recipe
+
+def stream_detailed_recipe(recipe_name, selected_ingredients, diet_type, cuisine_type, serving_size, additional_instructions="", quick=False, model=None, on_model=None):
+    prompt = detail_prompt(recipe_name, selected_ingredients, diet_type, cuisine_type, serving_size, additional_instructions)
+    MODEL_REQUEST_BYTES.inc("detail", amount=len(prompt.text))
+    try:
+        received, usage = [], None
+        with model_router.route("detail", DETAIL_MODEL, quick, model) as route, timed("detail_stream"):
+            for chunk in gemini_scheduler.call(route.model, prompt.text, stream=True, on_model=route.answered_by):
+                MODEL_RESPONSE_BYTES.inc("detail", amount=len(chunk.text))
+                # The last chunk carries the usage totals for the whole response
+                usage = getattr(chunk, "usage_metadata", None) or usage
+                received.append(chunk.text)
+                yield chunk.text
+        record_usage(prompt, route.model, "".join(received), usage)
+        if on_model is not None:
+            on_model(route.model)
+    except Exception as e:
+        yield f"❌ Error generating recipe: {e}"
+
+async def stream_detailed_recipe_async(recipe_name, selected_ingredients, diet_type, cuisine_type, serving_size, additional_instructions="", quick=False, model=None, on_model=None):
+    prompt = detail_prompt(recipe_name, selected_ingredients, diet_type, cuisine_type, serving_size, additional_instructions)
+    MODEL_REQUEST_BYTES.inc("detail", amount=len(prompt.text))
+    try:
+        received, usage = [], None
+        with model_router.route("detail", DETAIL_MODEL, quick, model) as route, timed("detail_stream"):
+            async for chunk in await gemini_scheduler.call_async(route.model, prompt.text, stream=True, on_model=route.answered_by):
+                MODEL_RESPONSE_BYTES.inc("detail", amount=len(chunk.text))
+                usage = getattr(chunk, "usage_metadata", None) or usage
+                received.append(chunk.text)
+                yield chunk.text
+        record_usage(prompt, route.model, "".join(received), usage)
+        if on_model is not None:
+            on_model(route.model)
+    except Exception as e:
+        yield f"❌ Error generating recipe: {e}"
+
 def mark_additional_ingredients(ingredients_text, selected_ingredients):
     """
     Return ingredients text without any additional marking
     """
     return ingredients_text
 
-def get_recipes(selected_ingredients, diet_type, cuisine_type, serving_size, additional_instructions=""):
+def selection_counts(selected_ingredients):
+    return vocabulary.counts(selected_ingredients)
+
+def get_recipes(selected_ingredients, diet_type, cuisine_type, serving_size, additional_instructions="", session_id=None, quick=False):
     if not selected_ingredients:
         return gr.Radio(choices=[], value=None, label="⚠ Please select ingredients first")
     
     if not serving_size or serving_size <= 0:
         return gr.Radio(choices=[], value=None, label="⚠ Please enter a valid serving size")
     
-    counts = {}
-    for item in selected_ingredients:
-        name = re.sub(r'\s*\(\d+\)$', '', item).lower()
-        counts[name] = counts.get(name, 0) + 1
-    
-    recipes = generate_recipe_suggestions(counts, diet_type, cuisine_type, serving_size, additional_instructions)
-    if not recipes:
-        return gr.Radio(choices=[], value=None, label="⚠ No recipes generated")
+    counts = selection_counts(selected_ingredients)
     
-    return gr.Radio(choices=recipes, value=None, label="Choose Recipe", interactive=True)
+    recipes = generate_recipe_suggestions(counts, diet_type, cuisine_type, serving_size, additional_instructions, quick)
+    return recipe_choices(recipes, session_id, (counts, diet_type, cuisine_type, serving_size, additional_instructions, quick))
 
-def show_recipe_details(recipe_name, selected_ingredients, diet_type, cuisine_type, serving_size, additional_instructions, parse_recipe_sections):
-    if not recipe_name:
-        return (
-            gr.HTML(""), gr.HTML(""), gr.HTML(""), 
-            gr.HTML(""), gr.HTML(""), gr.HTML(""), gr.HTML("")
-        )
+async def get_recipes_async(selected_ingredients, diet_type, cuisine_type, serving_size, additional_instructions="", session_id=None, quick=False):
+    if not selected_ingredients:
+        return gr.Radio(choices=[], value=None, label="⚠ Please select ingredients first")
     
     if not serving_size or serving_size <= 0:
-        return (
-            gr.HTML("<div style='color: red;'>⚠ Please enter a valid serving size.</div>"), 
-            gr.HTML(""), gr.HTML(""), gr.HTML(""), gr.HTML(""), gr.HTML(""), gr.HTML("")
-        )
+        return gr.Radio(choices=[], value=None, label="⚠ Please enter a valid serving size")
     
-    counts = {}
-    for item in selected_ingredients:
-        name = re.sub(r'\s*\(\d+\)$', '', item).lower()
-        counts[name] = counts.get(name, 0) + 1
+    counts = selection_counts(selected_ingredients)
     
-    detailed_recipe = generate_detailed_recipe(recipe_name, counts, diet_type, cuisine_type, serving_size, additional_instructions)
-    sections = parse_recipe_sections(detailed_recipe)
+    recipes = await generate_recipe_suggestions_async(counts, diet_type, cuisine_type, serving_size, additional_instructions, quick)
+    return recipe_choices(recipes, session_id, (counts, diet_type, cuisine_type, serving_size, additional_instructions, quick))
+
+def recipe_choices(recipes, session_id, inputs):
+    if not recipes:
+        if recipe_prefetcher and session_id:
+            recipe_prefetcher.cancel(session_id)
+        return gr.Radio(choices=[], value=None, label="⚠ No recipes generated")
     
-    # Mark additional ingredients that weren't in the original selection
-    sections['ingredients'] = mark_additional_ingredients(sections['ingredients'], counts)
+    if recipe_prefetcher and session_id:
+        recipe_prefetcher.schedule(session_id, recipes, inputs)
     
-    # Add additional instructions indicator to the header if provided
-    instructions_indicator = ""
-    if additional_instructions.strip():
-        instructions_indicator = f" • Custom Instructions Applied"
-    
-    recipe_header_html = f"""
-    <div style='background: linear-gradient(135deg, #1a3c34 0%, #2e6b4e 100%); color: white; padding: 30px; border-radius: 20px; box-shadow: 0 6px 20px rgba(0,0,0,0.15); margin-bottom: 25px; text-align: center;'>
-        <h2 style='margin: 0; font-size: 32px; font-family: "Playfair Display", serif; display: flex; align-items: center; justify-content: center; color: white;'>
-            <span style='margin-right: 15px; font-size: 40px;'>🍴</span>{recipe_name}
-        </h2>
-        <p style='margin: 10px 0 0 0; font-size: 18px; font-family: "Roboto", sans-serif; color: #e0e0e0;'>
-            {diet_type} • {cuisine_type} • Serves {serving_size}{instructions_indicator}
-        </p>
-    </div>
-    """
+    return gr.Radio(choices=recipes, value=None, label="Choose Recipe", interactive=True)
+
+def recipe_sections(recipe_name, counts, diet_type, cuisine_type, serving_size, additional_instructions, parse_recipe_sections, session_id=None, quick=False):
+    # The parsed recipe behind the cards; the JSON API returns it as is
+    model = model_router.choose("detail", DETAIL_MODEL, quick)
+    cache_key = detailed_recipe_cache_key(recipe_name, counts, diet_type, cuisine_type, serving_size, additional_instructions, model)
+    cached = recipe_cache.get(cache_key)
+    if cached and cached.get("sections"):
+        sections = cached["sections"]
+    else:
+        detailed_recipe = cached["text"] if cached else None
+        if detailed_recipe is None:
+            detailed_recipe = take_prefetched_recipe(session_id, recipe_name, (counts, diet_type, cuisine_type, serving_size, additional_instructions, quick))
+            if detailed_recipe is not None:
+                # The prefetch was routed on its own and already cached its text under that model's key
+                cache_key = None
+        if detailed_recipe is None:
+            detailed_recipe = generate_detailed_recipe(recipe_name, counts, diet_type, cuisine_type, serving_size, additional_instructions, quick, model)
+            cache_key = generated_cache_key(cache_key)
+        sections = parse_detailed_recipe(detailed_recipe, parse_recipe_sections)
+        cache_recipe_sections(cache_key, detailed_recipe, sections)
+        remember_recipe(recipe_name, counts, diet_type, cuisine_type, additional_instructions, detailed_recipe, sections)
     
-    ingredients_html = f"""
-    <div style='background: linear-gradient(135deg, #1a3c34 0%, #2e6b4e 100%); color: white; padding: 25px; border-radius: 20px; box-shadow: 0 6px 20px rgba(0,0,0,0.15); margin-bottom: 20px;'>
-        <h3 style='margin: 0 0 15px 0; font-size: 24px; font-family: "Playfair Display", serif; display: flex; align-items: center; color: white;'>
-            <span style='margin-right: 10px; font-size: 28px;'>🥗</span>Ingredients
-        </h3>
-        <div style='line-height: 1.8; font-size: 16px; font-family: "Roboto", sans-serif; color: #e0e0e0;'>{sections['ingredients'].replace('\n', '<br>')}</div>
-    </div>
-    """
+    # Mark additional ingredients that weren't in the original selection
+    sections['ingredients'] = mark_additional_ingredients(sections['ingredients'], counts)
+    return sections
+
+async def recipe_sections_async(recipe_name, counts, diet_type, cuisine_type, serving_size, additional_instructions, parse_recipe_sections, session_id=None, quick=False):
+    model = model_router.choose("detail", DETAIL_MODEL, quick)
+    cache_key = detailed_recipe_cache_key(recipe_name, counts, diet_type, cuisine_type, serving_size, additional_instructions, model)
+    cached = recipe_cache.get(cache_key)
+    if cached and cached.get("sections"):
+        sections = cached["sections"]
+    else:
+        detailed_recipe = cached["text"] if cached else None
+        if detailed_recipe is None and recipe_prefetcher is not None:
+            detailed_recipe = await asyncio.to_thread(take_prefetched_recipe, session_id, recipe_name, (counts, diet_type, cuisine_type, serving_size, additional_instructions, quick))
+            if detailed_recipe is not None:
+                cache_key = None
+        if detailed_recipe is None:
+            detailed_recipe = await generate_detailed_recipe_async(recipe_name, counts, diet_type, cuisine_type, serving_size, additional_instructions, quick, model)
+            cache_key = generated_cache_key(cache_key)
+        sections = parse_detailed_recipe(detailed_recipe, parse_recipe_sections)
+        cache_recipe_sections(cache_key, detailed_recipe, sections)
+        remember_recipe(recipe_name, counts, diet_type, cuisine_type, additional_instructions, detailed_recipe, sections)
     
-    time_html = f"""
-    <div style='background: linear-gradient(135deg, #1a3c34 0%, #2e6b4e 100%); color: white; padding: 25px; border-radius: 20px; box-shadow: 0 6px 20px rgba(0,0,0,0.15); margin-bottom: 20px;'>
-        <h3 style='margin: 0 0 15px 0; font-size: 24px; font-family: "Playfair Display", serif; display: flex; align-items: center; color: white;'>
-            <span style='margin-right: 10px; font-size: 28px; color: #e0e0e0;'>⏱</span>Time
-        </h3>
-        <div style='line-height: 1.8; font-size: 16px; font-family: "Roboto", sans-serif; color: #e0e0e0;'>
-            <strong style='color: #e0e0e0;'>Prep:</strong> {sections['prep_time']} minutes<br>
-            <strong style='color: #e0e0e0;'>Cook:</strong> {sections['cook_time']} minutes
-        </div>
-    </div>
-    """
+    sections['ingredients'] = mark_additional_ingredients(sections['ingredients'], counts)
+    return sections
+
+def show_recipe_details(recipe_name, selected_ingredients, diet_type, cuisine_type, serving_size, additional_instructions, parse_recipe_sections, session_id=None, quick=False):
+    if not recipe_name:
+        return recipe_output(EMPTY_RECIPE)
     
-    equipment_html = f"""
-    <div style='background: linear-gradient(135deg, #1a3c34 0%, #2e6b4e 100%); color: white; padding: 25px; border-radius: 20px; box-shadow: 0 6px 20px rgba(0,0,0,0.15); margin-bottom: 20px;'>
-        <h3 style='margin: 0 0 15px 0; font-size: 24px; font-family: "Playfair Display", serif; display: flex; align-items: center; color: white;'>
-            <span style='margin-right: 10px; font-size: 28px;'>🔧</span>Equipment
-        </h3>
-        <div style='line-height: 1.8; font-size: 16px; font-family: "Roboto", sans-serif; color: #e0e0e0;'>{sections['equipment'].replace('\n', '<br>')}</div>
-    </div>
-    """
+    if not serving_size or serving_size <= 0:
+        return recipe_output((render_error("Please enter a valid serving size."),) + EMPTY_RECIPE[1:])
     
-    serving_html = f"""
-    <div style='background: linear-gradient(135deg, #1a3c34 0%, #2e6b4e 100%); color: white; padding: 25px; border-radius: 20px; box-shadow: 0 6px 20px rgba(0,0,0,0.15); margin-bottom: 20px;'>
-        <h3 style='margin: 0 0 15px 0; font-size: 24px; font-family: "Playfair Display", serif; display: flex; align-items: center; color: white;'>
-            <span style='margin-right: 10px; font-size: 28px; color: #e0e0e0;'>🍽</span>Nutrition (Per Serving)
-        </h3>
-        <div style='line-height: 1.8; font-size: 16px; font-family: "Roboto", sans-serif; color: #e0e0e0;'>
-            <strong style='color: #e0e0e0;'>Calories per serving:</strong> {sections['calories']}
-        </div>
-    </div>
-    """
+    counts = selection_counts(selected_ingredients)
+    sections = recipe_sections(recipe_name, counts, diet_type, cuisine_type, serving_size, additional_instructions, parse_recipe_sections, session_id, quick)
     
-    instructions_html = f"""
-    <div style='background: linear-gradient(135deg, #1a3c34 0%, #2e6b4e 100%); color: white; padding: 30px; border-radius: 20px; box-shadow: 0 6px 20px rgba(0,0,0,0.15); margin-bottom: 20px;'>
-        <h3 style='margin: 0 0 20px 0; font-size: 24px; font-family: "Playfair Display", serif; display: flex; align-items: center; color: white;'>
-            <span style='margin-right: 10px; font-size: 28px;'>📝</span>Instructions
-        </h3>
-        <div style='line-height: 1.9; font-size: 16px; font-family: "Roboto", sans-serif; color: #e0e0e0;'>{sections['instructions'].replace('\n', '<br>')}</div>
-    </div>
-    """
+    return recipe_output(render_recipe_html(recipe_name, diet_type, cuisine_type, serving_size, additional_instructions, sections))
+
+async def show_recipe_details_async(recipe_name, selected_ingredients, diet_type, cuisine_type, serving_size, additional_instructions, parse_recipe_sections, session_id=None, quick=False):
+    if not recipe_name or not serving_size or serving_size <= 0:
+        return show_recipe_details(recipe_name, selected_ingredients, diet_type, cuisine_type, serving_size, additional_instructions, parse_recipe_sections)
     
-    tips_html = f"""
-    <div style='background: linear-gradient(135deg, #1a3c34 0%, #2e6b4e 100%); color: white; padding: 25px; border-radius: 20px; box-shadow: 0 6px 20px rgba(0,0,0,0.15);'>
-        <h3 style='margin: 0 0 15px 0; font-size: 24px; font-family: "Playfair Display", serif; display: flex; align-items: center; color: white;'>
-            <span style='margin-right: 10px; font-size: 28px;'>💡</span>Tips for Success
-        </h3>
-        <div style='line-height: 1.8; font-size: 16px; font-family: "Roboto", sans-serif; color: #e0e0e0;'>{sections['tips'].replace('\n', '<br>')}</div>
-    </div>
-    """
+    counts = selection_counts(selected_ingredients)
+    sections = await recipe_sections_async(recipe_name, counts, diet_type, cuisine_type, serving_size, additional_instructions, parse_recipe_sections, session_id, quick)
     
-    return recipe_header_html, ingredients_html, time_html, equipment_html, serving_html, instructions_html, tips_html
\ No newline at end of file
+    return recipe_output(render_recipe_html(recipe_name, diet_type, cuisine_type, serving_size, additional_instructions, sections))
+
+class RecipeCardStream:
+    def __init__(self, recipe_name, diet_type, cuisine_type, serving_size, additional_instructions, counts):
+        self.recipe = (recipe_name, diet_type, cuisine_type, serving_size, additional_instructions)
+        self.counts = counts
+        self.parser = RecipeSectionParser()
+        self.shown = set()
+        self.received = []
+        self.cards = list(EMPTY_RECIPE)
+    
+    def header(self):
+        # The header needs no model output, so it (and clearing the previous recipe) can go out right away
+        rendered = render_recipe_html(*self.recipe, empty_recipe_sections())
+        return self._emit((rendered[0],) + EMPTY_RECIPE[1:])
+    
+    def cached(self, sections):
+        sections['ingredients'] = mark_additional_ingredients(sections['ingredients'], self.counts)
+        return self._emit((gr.skip(),) + render_recipe_html(*self.recipe, sections)[1:])
+    
+    def complete(self, detailed_recipe, cache_key):
+        sections = parse_detailed_recipe(detailed_recipe, parse_recipe_sections)
+        cache_recipe_sections(cache_key, detailed_recipe, sections)
+        self.remember(detailed_recipe, sections)
+        return self.cached(sections)
+    
+    def feed(self, chunk):
+        self.received.append(chunk)
+        if self.parser.feed(chunk):
+            return self._updates()
+        return None
+    
+    def close(self, cache_key):
+        self.parser.close()
+        updates = self._updates()
+        detailed_recipe = "".join(self.received)
+        cache_recipe_sections(cache_key, detailed_recipe, self.parser.sections)
+        self.remember(detailed_recipe, self.parser.sections)
+        return updates
+    
+    def remember(self, detailed_recipe, sections):
+        recipe_name, diet_type, cuisine_type, _, additional_instructions = self.recipe
+        remember_recipe(recipe_name, self.counts, diet_type, cuisine_type, additional_instructions, detailed_recipe, sections)
+    
+    def _updates(self):
+        sections = self.parser.sections
+        ready = [i for i, needed in enumerate(RECIPE_CARD_SECTIONS) if i not in self.shown and self.parser.completed.issuperset(needed)]
+        if not ready:
+            return None
+        if 0 in ready:
+            sections['ingredients'] = mark_additional_ingredients(sections['ingredients'], self.counts)
+        rendered = render_recipe_html(*self.recipe, sections)
+        self.shown.update(ready)
+        return self._emit((gr.skip(),) + tuple(rendered[i + 1] if i in ready else gr.skip() for i in range(len(RECIPE_CARD_SECTIONS))))
+    
+    def _emit(self, updates):
+        if not RECIPE_COMBINED:
+            return updates
+        # A single component can't skip parts, so the cards shown so far are re-sent together
+        for i, update in enumerate(updates):
+            if isinstance(update, str):
+                self.cards[i] = update
+        return combine(self.cards)
+
+def show_recipe_details_stream(recipe_name, selected_ingredients, diet_type, cuisine_type, serving_size, additional_instructions, session_id=None, quick=False):
+    if not recipe_name or not serving_size or serving_size <= 0:
+        yield show_recipe_details(recipe_name, selected_ingredients, diet_type, cuisine_type, serving_size, additional_instructions, None)
+        return
+    
+    counts = selection_counts(selected_ingredients)
+    stream = RecipeCardStream(recipe_name, diet_type, cuisine_type, serving_size, additional_instructions, counts)
+    yield stream.header()
+    
+    model = model_router.choose("detail", DETAIL_MODEL, quick)
+    cache_key = detailed_recipe_cache_key(recipe_name, counts, diet_type, cuisine_type, serving_size, additional_instructions, model)
+    cached = recipe_cache.get(cache_key)
+    if cached and cached.get("sections"):
+        yield stream.cached(cached["sections"])
+        return
+    
+    detailed_recipe = cached["text"] if cached else None
+    if detailed_recipe is None:
+        detailed_recipe = take_prefetched_recipe(session_id, recipe_name, (counts, diet_type, cuisine_type, serving_size, additional_instructions, quick))
+        if detailed_recipe is not None:
+            cache_key = None
+    if detailed_recipe is None and RECIPE_JSON_OUTPUT:
+        # Partial JSON can't be rendered section by section, so JSON mode only streams the header
+        detailed_recipe = generate_detailed_recipe(recipe_name, counts, diet_type, cuisine_type, serving_size, additional_instructions, quick, model)
+        cache_key = generated_cache_key(cache_key)
+    if detailed_recipe is not None:
+        yield stream.complete(detailed_recipe, cache_key)
+        return
+    
+    answered = set()
+    chunks = stream_detailed_recipe(recipe_name, counts, diet_type, cuisine_type, serving_size, additional_instructions, quick, model, answered.add)
+    for chunk in chunks:
+        updates = stream.feed(chunk)
+        if updates:
+            yield updates
+    # Text from the scheduler's fallback model isn't cached under this model's key
+    updates = stream.close(cache_key if answered <= {model} else None)
+    if updates:
+        yield updates
+
+async def show_recipe_details_stream_async(recipe_name, selected_ingredients, diet_type, cuisine_type, serving_size, additional_instructions, session_id=None, quick=False):
+    if not recipe_name or not serving_size or serving_size <= 0:
+        yield show_recipe_details(recipe_name, selected_ingredients, diet_type, cuisine_type, serving_size, additional_instructions, None)
+        return
+    
+    counts = selection_counts(selected_ingredients)
+    stream = RecipeCardStream(recipe_name, diet_type, cuisine_type, serving_size, additional_instructions, counts)
+    yield stream.header()
+    
+    model = model_router.choose("detail", DETAIL_MODEL, quick)
+    cache_key = detailed_recipe_cache_key(recipe_name, counts, diet_type, cuisine_type, serving_size, additional_instructions, model)
+    cached = recipe_cache.get(cache_key)
+    if cached and cached.get("sections"):
+        yield stream.cached(cached["sections"])
+        return
+    
+    detailed_recipe = cached["text"] if cached else None
+    if detailed_recipe is None and recipe_prefetcher is not None:
+        # Waiting on a running prefetch blocks, so do it off the event loop
+        detailed_recipe = await asyncio.to_thread(take_prefetched_recipe, session_id, recipe_name, (counts, diet_type, cuisine_type, serving_size, additional_instructions, quick))
+        if detailed_recipe is not None:
+            cache_key = None
+    if detailed_recipe is None and RECIPE_JSON_OUTPUT:
+        detailed_recipe = await generate_detailed_recipe_async(recipe_name, counts, diet_type, cuisine_type, serving_size, additional_instructions, quick, model)
+        cache_key = generated_cache_key(cache_key)
+    if detailed_recipe is not None:
+        yield stream.complete(detailed_recipe, cache_key)
+        return
+    
+    answered = set()
+    async for chunk in stream_detailed_recipe_async(recipe_name, counts, diet_type, cuisine_type, serving_size, additional_instructions, quick, model, answered.add):
+        updates = stream.feed(chunk)
+        if updates:
+            yield updates
+    # Text from the scheduler's fallback model isn't cached under this model's key
+    updates = stream.close(cache_key if answered <= {model} else None)
+    if updates:
+        yield updates
+
+@instrument("render_html")
+def render_recipe_html(recipe_name, diet_type, cuisine_type, serving_size, additional_instructions, sections):
+    return render_cards(recipe_name, diet_type, cuisine_type, serving_size, additional_instructions, sections)
+
+def recipe_output(cards):
+    # The combined layout has one output component, so the cards go out joined as a single update
+    if not RECIPE_COMBINED:
+        return cards
+    return combine(cards) if any(cards) else ""
@@ -0,0 +1,72 @@
+import html
+import os
+from string import Formatter
+
+# "cards" updates the header and six recipe cards as separate components; "combined" sends one component
+RECIPE_LAYOUT = os.environ.get("RECIPE_LAYOUT", "cards").lower()
+RECIPE_COMBINED = RECIPE_LAYOUT == "combined"
+
+def compile_template(source):
+    # Indentation and line breaks between tags are dropped and the placeholders located once,
+    # so rendering is a single join. Styling lives in the .recipe-* classes in ui_components.
+    source = "".join(line.strip() for line in source.strip().splitlines())
+    parts = [(literal, field) for literal, field, _, _ in Formatter().parse(source)]
+
+    def render(**values):
+        out = []
+        for literal, field in parts:
+            out.append(literal)
+            if field is not None:
+                out.append(values[field])
+        return "".join(out)
+    return render
+
+HEADER_TEMPLATE = compile_template("""
+    <div class='recipe-card recipe-header'>
+        <h2><span>🍴</span>{name}</h2>
+        <p>{details}</p>
+    </div>
+""")
+
+CARD_TEMPLATE = compile_template("""
+    <div class='recipe-card{variant}'>
+        <h3><span>{icon}</span>{title}</h3>
+        <div class='recipe-body'>{body}</div>
+    </div>
+""")
+
+ERROR_TEMPLATE = compile_template("<div class='recipe-error'>⚠ {message}</div>")
+
+COMBINED_TEMPLATE = compile_template("<div class='recipe-page'>{cards}</div>")
+
+def text(value):
+    return html.escape(str(value))
+
+def multiline(value):
+    return html.escape(str(value)).replace("\n", "<br>")
+
+def render_header(recipe_name, diet_type, cuisine_type, serving_size, additional_instructions):
+    details = f"{text(diet_type)} • {text(cuisine_type)} • Serves {text(serving_size)}"
+    if additional_instructions.strip():
+        details += " • Custom Instructions Applied"
+    return HEADER_TEMPLATE(name=text(recipe_name), details=details)
+
+def render_card(icon, title, body, variant=""):
+    return CARD_TEMPLATE(variant=variant, icon=icon, title=title, body=body)
+
+def render_cards(recipe_name, diet_type, cuisine_type, serving_size, additional_instructions, sections):
+    return (
+        render_header(recipe_name, diet_type, cuisine_type, serving_size, additional_instructions),
+        render_card("🥗", "Ingredients", multiline(sections['ingredients'])),
+        render_card("⏱", "Time", f"<strong>Prep:</strong> {text(sections['prep_time'])} minutes<br><strong>Cook:</strong> {text(sections['cook_time'])} minutes"),
+        render_card("🔧", "Equipment", multiline(sections['equipment'])),
+        render_card("🍽", "Nutrition (Per Serving)", f"<strong>Calories per serving:</strong> {text(sections['calories'])}"),
+        render_card("📝", "Instructions", multiline(sections['instructions']), " recipe-instructions"),
+        render_card("💡", "Tips for Success", multiline(sections['tips']), " recipe-tips"),
+    )
+
+def render_error(message):
+    return ERROR_TEMPLATE(message=text(message))
+
+def combine(cards):
+    return COMBINED_TEMPLATE(cards="".join(cards))
@@ -0,0 +1,191 @@
+import json
+import os
+import threading
+import time
+from collections import defaultdict
+
+import metrics
+from scheduler import GEMINI_FALLBACK_MODELS, TokenBucket, parse_model_map
+
+ROUTER_ENABLED = os.environ.get("ROUTER_ENABLED", "true").lower() in ("1", "true", "yes")
+# Seconds each stage should take end to end; a model whose recent latency exceeds it is swapped for its cheaper alternative
+ROUTER_LATENCY_BUDGETS = {stage: float(seconds) for stage, seconds in parse_model_map(
+    os.environ.get("ROUTER_LATENCY_BUDGETS", "detect=30,suggest=15,detail=45")
+).items()}
+# Calls a model may have in flight before new ones go to its cheaper alternative
+ROUTER_MAX_IN_FLIGHT = {name: int(limit) for name, limit in parse_model_map(
+    os.environ.get("ROUTER_MAX_IN_FLIGHT", "gemini-2.5-pro=32")
+).items()}
+# Calls per minute the router may send to a model before routing the rest to its cheaper alternative
+ROUTER_COST_BUDGETS = {name: float(rpm) for name, rpm in parse_model_map(
+    os.environ.get("ROUTER_COST_BUDGETS", "")
+).items()}
+# Cheaper model to route to, per model; defaults to the scheduler's fallbacks
+ROUTER_ALTERNATIVES = parse_model_map(os.environ["ROUTER_ALTERNATIVES"]) if "ROUTER_ALTERNATIVES" in os.environ else GEMINI_FALLBACK_MODELS
+ROUTER_LOG = os.environ.get("ROUTER_LOG", "")
+
+ROUTE_DECISIONS = metrics.Counter("smart_fridge_route_decisions_total", "Model routing decisions by stage, chosen model and reason", ("stage", "model", "reason"))
+ROUTE_SECONDS = metrics.Histogram("smart_fridge_route_seconds", "End-to-end time of routed calls by stage, model and reason", ("stage", "model", "reason"))
+ROUTE_FAILURES = metrics.Counter("smart_fridge_route_failures_total", "Routed calls that failed", ("stage", "model", "reason"))
+
+class Route:
+    """
+    One routing decision. Used as a context manager around the model call, it
+    counts the call against the model's queue depth, times it and records the
+    outcome. Callers that report failure through a return value set .failed.
+    Background routes are counted apart, so they never add to live load.
+    """
+    __slots__ = ("router", "stage", "model", "requested", "reason", "queue_depth", "expected", "quick", "background", "start", "failed")
+
+    def __init__(self, router, stage, model, requested, reason, queue_depth, expected, quick, background=False):
+        self.router = router
+        self.stage = stage
+        self.model = model
+        self.requested = requested
+        self.reason = reason
+        self.queue_depth = queue_depth
+        self.expected = expected
+        self.quick = quick
+        self.background = background
+        self.failed = False
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.router._finish(self, time.perf_counter() - self.start, exc_type is None and not self.failed)
+        return False
+
+    def answered_by(self, model):
+        # Passed to the scheduler as on_model: after a fallback the call is reported under the model that answered
+        if model != self.model:
+            self.router._reassign(self, model)
+
+class ModelRouter:
+    """
+    Picks the model for each Gemini call. The stage's usual model is kept
+    unless the session asked for quick mode, the model already has too many
+    calls in flight, its recent latency for the stage is over budget, or its
+    per-minute cost budget is spent; then the cheaper alternative is used.
+    Every decision is counted with its reason and outcome so routes can be
+    compared, and optionally appended to a JSONL log.
+    """
+    def __init__(self, alternatives, latency_budgets=None, max_in_flight=None, cost_budgets=None, enabled=True, log_path="", latency_window=60.0):
+        self.alternatives = alternatives
+        self.latency_budgets = latency_budgets or {}
+        self.max_in_flight = max_in_flight or {}
+        self.cost_buckets = {name: TokenBucket(rpm) for name, rpm in (cost_budgets or {}).items()}
+        self.enabled = enabled
+        self.log_path = log_path
+        self.in_flight = defaultdict(int)
+        # Background calls (recipe prefetch) in flight; kept out of in_flight so they can't push live calls to the cheaper model
+        self.background_in_flight = defaultdict(int)
+        # Smoothed end-to-end latency per (stage, model), with when it was last updated. Once a slow
+        # model stops getting traffic its estimate can't improve, so it is forgotten after latency_window
+        self.latency = {}
+        self.latency_window = latency_window
+        self._lock = threading.Lock()
+        self._log_lock = threading.Lock()
+
+    def choose(self, stage, model, quick=False):
+        # The model a call would be routed to now, without taking a slot or cost budget. Caches and
+        # coalescing key on it, so a quick or degraded answer never stands in for the usual model's
+        with self._lock:
+            reason = self._reason(stage, model, quick, self.in_flight[model], self._expected(stage, model), consume=False)
+        return self.alternatives[model] if reason != "default" else model
+
+    def route(self, stage, model, quick=False, chosen=None, background=False):
+        # chosen pins the call to a model picked earlier by choose(), whose answer the caller caches under it
+        with self._lock:
+            depth = self.in_flight[model]
+            expected = self._expected(stage, model)
+            reason = self._reason(stage, model, quick, depth, expected, consume=chosen in (None, model))
+            routed = self.alternatives[model] if reason != "default" else model
+            if chosen is not None and chosen != routed:
+                reason = "pinned" if chosen != model else "default"
+                routed = chosen
+            self._counts(background)[routed] += 1
+        return Route(self, stage, routed, model, reason, depth, expected, quick, background)
+
+    def _reason(self, stage, model, quick, depth, expected, consume=True):
+        cheaper = self.alternatives.get(model)
+        if not self.enabled or not cheaper:
+            return "default"
+        if quick:
+            return "quick"
+        if depth >= self.max_in_flight.get(model, float("inf")):
+            return "load"
+        budget = self.latency_budgets.get(stage)
+        if budget and expected > budget and self._expected(stage, cheaper) < expected:
+            return "latency"
+        bucket = self.cost_buckets.get(model)
+        if bucket is not None and not (bucket.try_take() if consume else bucket.available()):
+            return "cost"
+        return "default"
+
+    def _expected(self, stage, model):
+        seconds, updated = self.latency.get((stage, model), (0.0, 0.0))
+        return seconds if time.monotonic() - updated < self.latency_window else 0.0
+
+    def _counts(self, background):
+        return self.background_in_flight if background else self.in_flight
+
+    def _reassign(self, route, model):
+        with self._lock:
+            counts = self._counts(route.background)
+            counts[route.model] -= 1
+            counts[model] += 1
+        route.model = model
+        route.reason = "fallback"
+
+    def _finish(self, route, seconds, ok):
+        key = (route.stage, route.model)
+        with self._lock:
+            self._counts(route.background)[route.model] -= 1
+            if ok:
+                previous = self._expected(*key)
+                self.latency[key] = (0.8 * previous + 0.2 * seconds if previous else seconds, time.monotonic())
+        # Decisions are counted once the call ends, under the model that actually answered
+        ROUTE_DECISIONS.inc(route.stage, route.model, route.reason)
+        ROUTE_SECONDS.observe(seconds, route.stage, route.model, route.reason)
+        if not ok:
+            ROUTE_FAILURES.inc(route.stage, route.model, route.reason)
+        if self.log_path:
+            self._log({
+                "time": round(time.time(), 3),
+                "stage": route.stage,
+                "model": route.model,
+                "requested": route.requested,
+                "reason": route.reason,
+                "quick": route.quick,
+                "background": route.background,
+                "queue_depth": route.queue_depth,
+                "expected_s": round(route.expected, 3),
+                "seconds": round(seconds, 3),
+                "ok": ok,
+            })
+
+    def _log(self, record):
+        try:
+            with self._log_lock, open(self.log_path, "a", encoding="utf-8") as f:
+                f.write(json.dumps(record) + "\n")
+        except OSError as e:
+            print(f"⚠ Could not write routing log: {e}")
+
+    def stats(self):
+        with self._lock:
+            return {
+                "in_flight": {name: count for name, count in self.in_flight.items() if count},
+                "background_in_flight": {name: count for name, count in self.background_in_flight.items() if count},
+                "latency_ms": {f"{stage}/{model}": round(seconds * 1000, 1) for (stage, model), (seconds, _) in self.latency.items()},
+            }
+
+model_router = ModelRouter(
+    ROUTER_ALTERNATIVES,
+    latency_budgets=ROUTER_LATENCY_BUDGETS,
+    max_in_flight=ROUTER_MAX_IN_FLIGHT,
+    cost_budgets=ROUTER_COST_BUDGETS,
+    enabled=ROUTER_ENABLED,
+    log_path=ROUTER_LOG,
+)
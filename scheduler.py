@@ -0,0 +1,311 @@
+import asyncio
+import itertools
+import os
+import random
+import threading
+import time
+from collections import Counter, defaultdict
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+from models import get_model
+
+def parse_model_map(value):
+    # "gemini-2.5-pro=150,gemini-2.5-flash=1000" -> {"gemini-2.5-pro": "150", ...}
+    pairs = (item.split("=", 1) for item in value.split(",") if "=" in item)
+    return {name.strip(): setting.strip() for name, setting in pairs}
+
+GEMINI_RATE_LIMITS = {name: float(rpm) for name, rpm in parse_model_map(
+    os.environ.get("GEMINI_RATE_LIMITS", "gemini-2.5-pro=150,gemini-2.5-flash=1000")
+).items()}
+GEMINI_FALLBACK_MODELS = parse_model_map(os.environ.get("GEMINI_FALLBACK_MODELS", "gemini-2.5-pro=gemini-2.5-flash"))
+GEMINI_MAX_ATTEMPTS = int(os.environ.get("GEMINI_MAX_ATTEMPTS", "4"))
+GEMINI_BACKOFF_BASE = float(os.environ.get("GEMINI_BACKOFF_BASE", "0.5"))
+GEMINI_BACKOFF_MAX = float(os.environ.get("GEMINI_BACKOFF_MAX", "8"))
+GEMINI_CALL_DEADLINE = float(os.environ.get("GEMINI_CALL_DEADLINE", "90"))
+GEMINI_HEDGE_AFTER = float(os.environ.get("GEMINI_HEDGE_AFTER", "0"))
+# Share of each model's rate-limit bucket that background calls (recipe prefetch) leave for live requests
+GEMINI_BACKGROUND_RESERVE = float(os.environ.get("GEMINI_BACKGROUND_RESERVE", "0.5"))
+
+RETRYABLE_STATUS_CODES = (408, 429, 500, 502, 503, 504)
+
+def is_retryable(error):
+    if isinstance(error, (TimeoutError, ConnectionError)):
+        return True
+    # google.api_core exceptions expose the HTTP status as .code
+    return getattr(error, "code", None) in RETRYABLE_STATUS_CODES
+
+class TokenBucket:
+    def __init__(self, rate_per_minute, burst=None):
+        self.rate = rate_per_minute / 60
+        self.capacity = burst or max(1.0, self.rate * 10)
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def reserve(self):
+        # Takes a token now, possibly going into debt, and returns how long to wait before using it
+        with self._lock:
+            self._refill()
+            self.tokens -= 1
+            return max(0.0, -self.tokens / self.rate)
+
+    def refund(self):
+        with self._lock:
+            self.tokens += 1
+
+    def available(self):
+        with self._lock:
+            self._refill()
+            return self.tokens >= 1
+
+    def try_take(self, reserve=0.0):
+        # Takes a token only if one is available beyond reserve, never going into debt
+        with self._lock:
+            self._refill()
+            if self.tokens < 1 + reserve:
+                return False
+            self.tokens -= 1
+            return True
+
+class GeminiScheduler:
+    """
+    Front door for every Gemini call: rate limits each model with a token
+    bucket, retries transient failures (429/5xx/timeouts) with jittered
+    exponential backoff inside an overall deadline, optionally hedges slow
+    calls with a duplicate request, and degrades to a fallback model when
+    the primary cannot answer within the time that is left. Background calls
+    yield to live ones: they only run on tokens spare beyond a reserve, and
+    are never hedged or degraded.
+    """
+    def __init__(self, models=get_model, rate_limits=None, fallbacks=None, max_attempts=4, backoff_base=0.5, backoff_max=8.0, deadline=90.0, hedge_after=0.0, background_reserve=0.5):
+        self.models = models
+        self.buckets = {name: TokenBucket(rpm) for name, rpm in (rate_limits or {}).items()}
+        self.fallbacks = fallbacks or {}
+        self.max_attempts = max_attempts
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.deadline = deadline
+        self.hedge_after = hedge_after
+        self.background_reserve = background_reserve
+        # Share of the remaining budget a model with a fallback may spend, keeping the rest for the fallback
+        self.primary_share = 0.7
+        # Smoothed latency of successful calls per model, used to predict whether one fits the deadline
+        self.latency = {}
+        self.counters = defaultdict(Counter)
+        self._executor = ThreadPoolExecutor(max_workers=16, thread_name_prefix="gemini-hedge") if hedge_after else None
+        self._lock = threading.Lock()
+
+    def _backoff(self, attempt):
+        return random.uniform(0, min(self.backoff_max, self.backoff_base * 2 ** attempt))
+
+    def _observe(self, model_name, seconds):
+        with self._lock:
+            previous = self.latency.get(model_name)
+            self.latency[model_name] = seconds if previous is None else 0.8 * previous + 0.2 * seconds
+
+    def _plan(self, model_name, remaining, slow=False, tried=(), background=False):
+        if background:
+            return self._plan_background(model_name)
+        fallback = self.fallbacks.get(model_name)
+        # A cyclic fallback map stops at the first model already planned
+        if fallback == model_name or fallback in tried:
+            fallback = None
+        expected = self.latency.get(model_name, 0.0)
+        if fallback and (slow or expected > remaining):
+            return self._degrade(model_name, fallback, remaining, tried)
+        bucket = self.buckets.get(model_name)
+        delay = bucket.reserve() if bucket else 0.0
+        if delay + expected > remaining:
+            if bucket:
+                bucket.refund()
+            if fallback:
+                return self._degrade(model_name, fallback, remaining, tried)
+            raise TimeoutError(f"{model_name} rate limit leaves no time before the deadline")
+        if delay:
+            self.counters[model_name]["throttled"] += 1
+        return model_name, delay
+
+    def _plan_background(self, model_name):
+        bucket = self.buckets.get(model_name)
+        if bucket is not None and not bucket.try_take(self.background_reserve * bucket.capacity):
+            self.counters[model_name]["deferred"] += 1
+            raise RuntimeError(f"{model_name} has no rate limit to spare for background calls")
+        return model_name, 0.0
+
+    def _degrade(self, model_name, fallback, remaining, tried=()):
+        self.counters[model_name]["fallbacks"] += 1
+        print(f"⚠ Degrading {model_name} → {fallback} ({remaining:.1f}s left in budget)")
+        return self._plan(fallback, remaining, tried=tried + (model_name,))
+
+    def _attempt_timeout(self, model_name, remaining, background=False):
+        # Background calls never degrade, so they keep the whole deadline for the primary
+        if model_name in self.fallbacks and not background:
+            return remaining * self.primary_share
+        return remaining
+
+    def _retry_delay(self, model_name, attempt, error, deadline_at):
+        if not is_retryable(error) or attempt + 1 >= self.max_attempts:
+            return None
+        delay = self._backoff(attempt)
+        if time.monotonic() + delay >= deadline_at:
+            return None
+        self.counters[model_name]["retries"] += 1
+        print(f"⚠ {model_name} call failed ({error}); retrying in {delay:.1f}s")
+        return delay
+
+    def call(self, model_name, *args, deadline=None, on_model=None, background=False, **kwargs):
+        # on_model is called with the model that answered, which differs from model_name after a fallback
+        deadline_at = time.monotonic() + (deadline or self.deadline)
+        slow = False
+        for attempt in range(self.max_attempts):
+            model_name, delay = self._plan(model_name, deadline_at - time.monotonic(), slow, background=background)
+            time.sleep(delay)
+            self.counters[model_name]["calls"] += 1
+            start = time.monotonic()
+            try:
+                response = self._attempt(model_name, args, kwargs, self._attempt_timeout(model_name, deadline_at - start, background), background)
+            except Exception as e:
+                self.counters[model_name]["errors"] += 1
+                retry_in = self._retry_delay(model_name, attempt, e, deadline_at)
+                if retry_in is None:
+                    raise
+                slow = isinstance(e, TimeoutError) or getattr(e, "code", None) == 504
+                time.sleep(retry_in)
+                continue
+            if not kwargs.get("stream"):
+                # A stream only measures time to first chunk, which says little about a full answer
+                self._observe(model_name, time.monotonic() - start)
+            if on_model is not None:
+                on_model(model_name)
+            return response
+
+    def _attempt(self, model_name, args, kwargs, timeout, background=False):
+        if timeout <= 0:
+            raise TimeoutError(f"{model_name} call deadline exceeded")
+        model = self.models(model_name)
+        if kwargs.get("stream"):
+            # Pull the first chunk here so failures while opening the stream are retried too
+            chunks = iter(model.generate_content(*args, request_options={"timeout": timeout}, **kwargs))
+            first = next(chunks, None)
+            return chunks if first is None else itertools.chain([first], chunks)
+
+        def invoke():
+            return model.generate_content(*args, request_options={"timeout": timeout}, **kwargs)
+
+        if not self.hedge_after or background or self.hedge_after >= timeout:
+            return invoke()
+        primary = self._executor.submit(invoke)
+        done, _ = wait([primary], timeout=self.hedge_after)
+        if done or not self._take_hedge_token(model_name):
+            return primary.result(timeout - self.hedge_after)
+        pending = {primary, self._executor.submit(invoke)}
+        end = time.monotonic() + timeout - self.hedge_after
+        error = None
+        while pending:
+            done, pending = wait(pending, timeout=max(0.0, end - time.monotonic()), return_when=FIRST_COMPLETED)
+            if not done:
+                raise TimeoutError(f"{model_name} call deadline exceeded")
+            for future in done:
+                if future.exception() is None:
+                    return future.result()
+                error = future.exception()
+        raise error
+
+    def _take_hedge_token(self, model_name):
+        bucket = self.buckets.get(model_name)
+        if bucket is not None and not bucket.try_take():
+            return False
+        self.counters[model_name]["hedges"] += 1
+        return True
+
+    async def call_async(self, model_name, *args, deadline=None, on_model=None, background=False, **kwargs):
+        deadline_at = time.monotonic() + (deadline or self.deadline)
+        slow = False
+        for attempt in range(self.max_attempts):
+            model_name, delay = self._plan(model_name, deadline_at - time.monotonic(), slow, background=background)
+            await asyncio.sleep(delay)
+            self.counters[model_name]["calls"] += 1
+            start = time.monotonic()
+            try:
+                response = await self._attempt_async(model_name, args, kwargs, self._attempt_timeout(model_name, deadline_at - start, background), background)
+            except Exception as e:
+                self.counters[model_name]["errors"] += 1
+                retry_in = self._retry_delay(model_name, attempt, e, deadline_at)
+                if retry_in is None:
+                    raise
+                slow = isinstance(e, TimeoutError) or getattr(e, "code", None) == 504
+                await asyncio.sleep(retry_in)
+                continue
+            if not kwargs.get("stream"):
+                self._observe(model_name, time.monotonic() - start)
+            if on_model is not None:
+                on_model(model_name)
+            return response
+
+    async def _attempt_async(self, model_name, args, kwargs, timeout, background=False):
+        if timeout <= 0:
+            raise TimeoutError(f"{model_name} call deadline exceeded")
+        model = self.models(model_name)
+        if kwargs.get("stream"):
+            return await asyncio.wait_for(self._open_stream_async(model, args, kwargs), timeout)
+        if not self.hedge_after or background or self.hedge_after >= timeout:
+            return await asyncio.wait_for(model.generate_content_async(*args, **kwargs), timeout)
+
+        primary = asyncio.ensure_future(model.generate_content_async(*args, **kwargs))
+        tasks = [primary]
+        try:
+            done, _ = await asyncio.wait(tasks, timeout=self.hedge_after)
+            if done or not self._take_hedge_token(model_name):
+                return await asyncio.wait_for(asyncio.shield(primary), timeout - self.hedge_after)
+            tasks.append(asyncio.ensure_future(model.generate_content_async(*args, **kwargs)))
+            pending = set(tasks)
+            end = time.monotonic() + timeout - self.hedge_after
+            error = None
+            while pending:
+                done, pending = await asyncio.wait(pending, timeout=max(0.0, end - time.monotonic()), return_when=asyncio.FIRST_COMPLETED)
+                if not done:
+                    raise TimeoutError(f"{model_name} call deadline exceeded")
+                for task in done:
+                    if task.exception() is None:
+                        return task.result()
+                    error = task.exception()
+            raise error
+        finally:
+            # Whichever request lost the race is abandoned
+            for task in tasks:
+                task.cancel()
+
+    async def _open_stream_async(self, model, args, kwargs):
+        chunks = (await model.generate_content_async(*args, **kwargs)).__aiter__()
+        try:
+            first = await chunks.__anext__()
+        except StopAsyncIteration:
+            return chunks
+        return chain_async(first, chunks)
+
+    def stats(self):
+        return {
+            name: dict(counts, avg_latency_ms=round(self.latency.get(name, 0.0) * 1000, 1))
+            for name, counts in self.counters.items()
+        }
+
+async def chain_async(first, rest):
+    yield first
+    async for chunk in rest:
+        yield chunk
+
+gemini_scheduler = GeminiScheduler(
+    rate_limits=GEMINI_RATE_LIMITS,
+    fallbacks=GEMINI_FALLBACK_MODELS,
+    max_attempts=GEMINI_MAX_ATTEMPTS,
+    backoff_base=GEMINI_BACKOFF_BASE,
+    backoff_max=GEMINI_BACKOFF_MAX,
+    deadline=GEMINI_CALL_DEADLINE,
+    hedge_after=GEMINI_HEDGE_AFTER,
+    background_reserve=GEMINI_BACKGROUND_RESERVE,
+)
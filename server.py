@@ -0,0 +1,121 @@
+import os
+import threading
+import time
+from contextlib import asynccontextmanager
+
+import gradio as gr
+from fastapi import FastAPI
+from fastapi.responses import JSONResponse, PlainTextResponse
+
+import metrics
+from api import router as api_router
+from cache import detection_cache, recipe_cache
+from corpus import recipe_corpus
+from detectors import tiered_detector
+from food_detector import DETECTION_MODEL
+from image_processor import cv2, preprocess_stats
+from models import get_model
+from recipe_generator import DETAIL_MODEL, SUGGESTION_MODEL, recipe_prefetcher
+from router import model_router
+from scheduler import gemini_scheduler
+from singleflight import detail_calls, detection_calls, suggestion_calls
+from storage import shared_store
+from ui_components import create_gradio_interface
+
+def collect_component_stats():
+    # Components keep their own counters; they are only read when /metrics is scraped
+    caches = {"detection": detection_cache, "recipe": recipe_cache}
+    yield "smart_fridge_cache_hits_total", "counter", "Cache lookups that found an entry", [({"cache": name}, cache.hits) for name, cache in caches.items()]
+    yield "smart_fridge_cache_misses_total", "counter", "Cache lookups that found nothing", [({"cache": name}, cache.misses) for name, cache in caches.items()]
+    yield "smart_fridge_cache_entries", "gauge", "Entries held in the in-memory detection cache", [({"cache": "detection"}, len(detection_cache.memory))]
+    if shared_store is not None:
+        stats = shared_store.stats()
+        yield "smart_fridge_store_reads_total", "counter", "Shared store reads answered locally, by the backend, or not at all", [
+            ({"outcome": outcome}, stats[outcome]) for outcome in ("local_hits", "remote_hits", "misses")
+        ]
+        yield "smart_fridge_store_errors_total", "counter", "Shared store reads and writes that failed", [({}, stats["errors"])]
+        yield "smart_fridge_store_bytes_written_total", "counter", "Bytes written to the shared store after compression", [({}, stats["bytes_written"])]
+        yield "smart_fridge_store_local_bytes", "gauge", "Bytes held in the local read-through cache", [({}, stats["local_bytes"])]
+
+    yield "smart_fridge_detection_image_bytes_total", "counter", "Image bytes before and after preprocessing for detection", [
+        ({"phase": "uploaded"}, preprocess_stats["bytes_before"]),
+        ({"phase": "sent"}, preprocess_stats["bytes_after"]),
+    ]
+
+    tiers = tiered_detector.stats()
+    yield "smart_fridge_detector_tier_calls_total", "counter", "Detections attempted by each detector tier", [({"tier": name}, s["calls"]) for name, s in tiers.items()]
+    yield "smart_fridge_detector_tier_accepted_total", "counter", "Detections answered by each detector tier", [({"tier": name}, s["accepted"]) for name, s in tiers.items()]
+
+    flights = (detection_calls, suggestion_calls, detail_calls)
+    yield "smart_fridge_coalesced_calls_total", "counter", "Calls that joined an identical in-flight call", [({"call": f.name}, f.coalesced) for f in flights]
+    yield "smart_fridge_coalesced_in_flight", "gauge", "Distinct calls currently in flight", [({"call": f.name}, f.stats()["in_flight"]) for f in flights]
+
+    yield "smart_fridge_gemini_events_total", "counter", "Gemini scheduler calls, errors, retries, hedges, throttles and fallbacks", [
+        ({"model": model, "event": event}, value)
+        for model, counts in list(gemini_scheduler.counters.items())
+        for event, value in list(counts.items())
+    ]
+    yield "smart_fridge_gemini_latency_seconds", "gauge", "Smoothed latency of successful Gemini calls", [
+        ({"model": model}, seconds) for model, seconds in list(gemini_scheduler.latency.items())
+    ]
+
+    yield "smart_fridge_route_in_flight", "gauge", "Routed Gemini calls currently in flight per model", [
+        ({"model": model}, count) for model, count in model_router.stats()["in_flight"].items()
+    ]
+
+    if recipe_prefetcher is not None:
+        stats = recipe_prefetcher.stats()
+        yield "smart_fridge_prefetch_total", "counter", "Recipe prefetches by outcome", [
+            ({"outcome": outcome}, stats[outcome]) for outcome in ("scheduled", "hits", "skipped")
+        ]
+
+    if recipe_corpus is not None and recipe_corpus.loaded:
+        yield "smart_fridge_corpus_recipes", "gauge", "Recipes in the local suggestion corpus", [({}, recipe_corpus.stats()["recipes"])]
+
+metrics.register_collector(collect_component_stats)
+
+WARMUP_MODELS = os.environ.get("WARMUP_MODELS", "true").lower() in ("1", "true", "yes")
+
+warmup_state = {"ready": not WARMUP_MODELS, "error": None, "seconds": None}
+
+def warm_up():
+    # Runs beside the server so the port opens at once; the first user no longer pays for
+    # importing google.generativeai and OpenCV or for building the model clients
+    start = time.perf_counter()
+    try:
+        cv2.getVersionString()
+        names = [DETECTION_MODEL, SUGGESTION_MODEL, DETAIL_MODEL]
+        names += [gemini_scheduler.fallbacks[name] for name in names if name in gemini_scheduler.fallbacks]
+        for name in dict.fromkeys(names):
+            get_model(name)
+        if recipe_corpus is not None:
+            recipe_corpus.load()
+    except Exception as e:
+        warmup_state["error"] = str(e)
+        print(f"❌ Warm-up failed: {e}")
+    else:
+        warmup_state["ready"] = True
+    warmup_state["seconds"] = round(time.perf_counter() - start, 3)
+    print(f"🔥 Warm-up finished in {warmup_state['seconds']}s")
+
+@asynccontextmanager
+async def lifespan(app):
+    if WARMUP_MODELS:
+        threading.Thread(target=warm_up, name="warm-up", daemon=True).start()
+    yield
+
+def create_app():
+    app = FastAPI(lifespan=lifespan)
+
+    @app.get("/ready")
+    def readiness():
+        return JSONResponse(warmup_state, status_code=200 if warmup_state["ready"] else 503)
+
+    @app.get("/metrics", response_class=PlainTextResponse)
+    def prometheus_metrics():
+        return PlainTextResponse(metrics.render(), media_type="text/plain; version=0.0.4")
+
+    # JSON endpoints for clients that don't speak Gradio's queue protocol
+    app.include_router(api_router)
+
+    return gr.mount_gradio_app(app, create_gradio_interface(), path="/")
@@ -0,0 +1,86 @@
+import asyncio
+import copy
+import os
+import threading
+from concurrent.futures import Future
+
+COALESCE_REQUESTS = os.environ.get("COALESCE_REQUESTS", "true").lower() in ("1", "true", "yes")
+COALESCE_WAIT_TIMEOUT = float(os.environ.get("COALESCE_WAIT_TIMEOUT", "180"))
+
+class SingleFlight:
+    """
+    Collapses identical in-flight calls: the first caller for a key runs the
+    call, later callers wait for its result (or exception) instead of
+    issuing their own. Thread and asyncio callers share the same slots.
+    """
+    def __init__(self, name, timeout=None, enabled=True):
+        self.name = name
+        self.timeout = timeout
+        self.enabled = enabled
+        self._calls = {}
+        self._lock = threading.Lock()
+        self.leaders = 0
+        self.coalesced = 0
+
+    def _join(self, key):
+        with self._lock:
+            future = self._calls.get(key)
+            if future is not None:
+                self.coalesced += 1
+                print(f"🔗 Joined in-flight {self.name} call {key[:12]}")
+                return future, False
+            future = Future()
+            self._calls[key] = future
+            self.leaders += 1
+            return future, True
+
+    def _finish(self, key, future, result=None, error=None):
+        # Release the slot first so callers arriving afterwards go to the cache or start a fresh call
+        with self._lock:
+            self._calls.pop(key, None)
+        if error is not None:
+            future.set_exception(error)
+        else:
+            future.set_result(result)
+
+    def do(self, key, fn, *args, timeout=None):
+        if not self.enabled:
+            return fn(*args)
+        future, leader = self._join(key)
+        if not leader:
+            # A follower giving up only stops its own wait
+            return copy.deepcopy(future.result(timeout or self.timeout))
+        try:
+            result = fn(*args)
+        except BaseException as e:
+            self._finish(key, future, error=e)
+            raise
+        self._finish(key, future, result)
+        return result
+
+    async def do_async(self, key, fn, *args, timeout=None):
+        if not self.enabled:
+            return await fn(*args)
+        future, leader = self._join(key)
+        if leader:
+            # The call runs as its own task, so a leader that times out or is cancelled doesn't fail its followers
+            task = asyncio.ensure_future(fn(*args))
+            task.add_done_callback(lambda done: self._finish_task(key, future, done))
+            return await asyncio.wait_for(asyncio.shield(task), timeout or self.timeout)
+        result = await asyncio.wait_for(asyncio.shield(asyncio.wrap_future(future)), timeout or self.timeout)
+        return copy.deepcopy(result)
+
+    def _finish_task(self, key, future, task):
+        if task.cancelled():
+            self._finish(key, future, error=asyncio.CancelledError())
+        elif task.exception() is not None:
+            self._finish(key, future, error=task.exception())
+        else:
+            self._finish(key, future, task.result())
+
+    def stats(self):
+        return {"leaders": self.leaders, "coalesced": self.coalesced, "in_flight": len(self._calls)}
+
+detection_calls = SingleFlight("detection", COALESCE_WAIT_TIMEOUT, COALESCE_REQUESTS)
+suggestion_calls = SingleFlight("suggestion", COALESCE_WAIT_TIMEOUT, COALESCE_REQUESTS)
+detail_calls = SingleFlight("detailed recipe", COALESCE_WAIT_TIMEOUT, COALESCE_REQUESTS)
@@ -0,0 +1,240 @@
+import json
+import os
+import sqlite3
+import struct
+import threading
+import time
+import zlib
+from collections import OrderedDict
+
+# Where state shared between instances lives: "file", "sqlite", "redis", "memory" (in-process stand-in) or "none"
+STORAGE_BACKEND = os.environ.get("STORAGE_BACKEND", "none").lower()
+STORAGE_PATH = os.environ.get("STORAGE_PATH", "")
+STORAGE_URL = os.environ.get("STORAGE_URL", "redis://localhost:6379/0")
+STORAGE_LOCAL_ENTRIES = int(os.environ.get("STORAGE_LOCAL_ENTRIES", "512"))
+STORAGE_LOCAL_BYTES = int(os.environ.get("STORAGE_LOCAL_BYTES", str(64 * 1024 * 1024)))
+STORAGE_COMPRESS_MIN_BYTES = int(os.environ.get("STORAGE_COMPRESS_MIN_BYTES", "1024"))
+
+# Stored values start with one byte saying whether the rest is zlib-compressed
+RAW = b"r"
+COMPRESSED = b"z"
+
+class FileStore:
+    # One file per key under directory/<namespace>/<first two hex digits>/, so any shared volume works
+    def __init__(self, directory):
+        self.directory = directory
+        os.makedirs(directory, exist_ok=True)
+
+    def _path(self, key):
+        namespace, _, name = key.rpartition(":")
+        return os.path.join(self.directory, namespace or "default", name[:2], name)
+
+    def get(self, key):
+        path = self._path(key)
+        try:
+            with open(path, "rb") as f:
+                data = f.read()
+        except OSError:
+            return None
+        expires_at, = struct.unpack("<d", data[:8])
+        if expires_at and expires_at < time.time():
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+            return None
+        return data[8:]
+
+    def set(self, key, data, ttl=None):
+        path = self._path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp_path, "wb") as f:
+            f.write(struct.pack("<d", time.time() + ttl if ttl else 0.0) + data)
+        os.replace(tmp_path, path)
+
+class SQLiteStore:
+    def __init__(self, path):
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._lock = threading.Lock()
+        with self._lock, self._conn:
+            self._conn.execute("CREATE TABLE IF NOT EXISTS blobs (key TEXT PRIMARY KEY, value BLOB NOT NULL, expires_at REAL)")
+
+    def get(self, key):
+        with self._lock, self._conn:
+            row = self._conn.execute("SELECT value, expires_at FROM blobs WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                return None
+            if row[1] is not None and row[1] < time.time():
+                self._conn.execute("DELETE FROM blobs WHERE key = ?", (key,))
+                return None
+        return bytes(row[0])
+
+    def set(self, key, data, ttl=None):
+        with self._lock, self._conn:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO blobs (key, value, expires_at) VALUES (?, ?, ?)",
+                (key, data, time.time() + ttl if ttl else None),
+            )
+
+class KVStore:
+    """
+    Networked key-value store shared by every instance. Any client exposing
+    get(key) and set(key, value, ex=seconds) works, e.g. redis.Redis.
+    """
+    def __init__(self, client, prefix="smart-fridge-chef:"):
+        self.client = client
+        self.prefix = prefix
+
+    def get(self, key):
+        return self.client.get(self.prefix + key)
+
+    def set(self, key, data, ttl=None):
+        self.client.set(self.prefix + key, data, ex=int(ttl) if ttl else None)
+
+class MemoryKVClient:
+    # In-process stand-in for redis.Redis with the same get/set(ex=) calls, for tests and local runs
+    def __init__(self):
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._values.get(key)
+            if entry is None:
+                return None
+            expires_at, value = entry
+            if expires_at is not None and expires_at < time.time():
+                del self._values[key]
+                return None
+            return value
+
+    def set(self, key, value, ex=None):
+        with self._lock:
+            self._values[key] = (time.time() + ex if ex else None, value)
+
+class ArtifactStore:
+    """
+    Front for a shared backend. Values are bytes under namespaced content-hash
+    keys; anything over compress_min_bytes is zlib-compressed when that saves
+    space. Recently used values are kept decoded in a local LRU bounded by
+    entries and bytes, so hot keys don't cross the network. Backend errors are
+    logged and treated as misses: the shared store only ever saves work.
+    """
+    def __init__(self, backend, local_entries=512, local_bytes=64 * 1024 * 1024, compress_min_bytes=1024):
+        self.backend = backend
+        self.local_entries = local_entries
+        self.local_bytes = local_bytes
+        self.compress_min_bytes = compress_min_bytes
+        self._local = OrderedDict()
+        self._local_size = 0
+        self._lock = threading.Lock()
+        self.counts = {"local_hits": 0, "remote_hits": 0, "misses": 0, "writes": 0, "errors": 0, "bytes_written": 0, "bytes_saved": 0}
+
+    def _remember(self, key, data):
+        with self._lock:
+            previous = self._local.pop(key, None)
+            if previous is not None:
+                self._local_size -= len(previous)
+            if len(data) > self.local_bytes:
+                return
+            self._local[key] = data
+            self._local_size += len(data)
+            while len(self._local) > self.local_entries or self._local_size > self.local_bytes:
+                _, evicted = self._local.popitem(last=False)
+                self._local_size -= len(evicted)
+
+    def encode(self, data, compress=True):
+        if compress and len(data) >= self.compress_min_bytes:
+            packed = zlib.compress(data, 6)
+            if len(packed) < len(data):
+                return COMPRESSED + packed
+        return RAW + data
+
+    def decode(self, stored):
+        return zlib.decompress(stored[1:]) if stored[:1] == COMPRESSED else stored[1:]
+
+    def get(self, namespace, key):
+        full_key = f"{namespace}:{key}"
+        with self._lock:
+            data = self._local.get(full_key)
+            if data is not None:
+                self._local.move_to_end(full_key)
+                self.counts["local_hits"] += 1
+                return data
+        try:
+            stored = self.backend.get(full_key)
+            data = self.decode(stored) if stored is not None else None
+        except Exception as e:
+            print(f"⚠ Shared store read failed: {e}")
+            self.counts["errors"] += 1
+            return None
+        if data is None:
+            self.counts["misses"] += 1
+            return None
+        self.counts["remote_hits"] += 1
+        self._remember(full_key, data)
+        return data
+
+    def set(self, namespace, key, data, ttl=None, compress=True):
+        full_key = f"{namespace}:{key}"
+        stored = self.encode(data, compress)
+        try:
+            self.backend.set(full_key, stored, ttl)
+        except Exception as e:
+            print(f"⚠ Shared store write failed: {e}")
+            self.counts["errors"] += 1
+        else:
+            self.counts["writes"] += 1
+            self.counts["bytes_written"] += len(stored)
+            self.counts["bytes_saved"] += len(data) + 1 - len(stored)
+        self._remember(full_key, data)
+
+    def json(self, namespace, ttl=None):
+        return JSONView(self, namespace, ttl)
+
+    def stats(self):
+        with self._lock:
+            return dict(self.counts, local_entries=len(self._local), local_bytes=self._local_size)
+
+class JSONView:
+    # get/set of JSON values in one namespace, the interface the caches expect of a backend
+    def __init__(self, store, namespace, ttl=None):
+        self.store = store
+        self.namespace = namespace
+        self.ttl = ttl
+
+    def get(self, key):
+        data = self.store.get(self.namespace, key)
+        return json.loads(data) if data is not None else None
+
+    def set(self, key, value):
+        self.store.set(self.namespace, key, json.dumps(value, separators=(",", ":")).encode("utf-8"), self.ttl)
+
+def create_store_backend(kind, path=None, url=None):
+    kind = (kind or "none").lower()
+    if kind == "file":
+        return FileStore(path or "data/store")
+    if kind == "sqlite":
+        return SQLiteStore(path or "data/store.sqlite3")
+    if kind == "redis":
+        try:
+            import redis
+        except ImportError:
+            print("❌ The redis storage backend needs the 'redis' package; shared storage disabled")
+            return None
+        return KVStore(redis.Redis.from_url(url))
+    if kind == "memory":
+        return KVStore(MemoryKVClient())
+    if kind == "none":
+        return None
+    raise ValueError(f"Unknown storage backend: {kind}")
+
+def create_store(kind, path=None, url=None, local_entries=512, local_bytes=64 * 1024 * 1024, compress_min_bytes=1024):
+    backend = create_store_backend(kind, path, url)
+    return ArtifactStore(backend, local_entries, local_bytes, compress_min_bytes) if backend is not None else None
+
+shared_store = create_store(STORAGE_BACKEND, STORAGE_PATH, STORAGE_URL, STORAGE_LOCAL_ENTRIES, STORAGE_LOCAL_BYTES, STORAGE_COMPRESS_MIN_BYTES)
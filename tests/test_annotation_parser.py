@@ -0,0 +1,96 @@
+"""
+AnnotationStreamParser on Gemini detection output split at arbitrary
+chunk boundaries.
+
+    python -m pytest tests
+"""
+import json
+import os
+import random
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from fake_gemini import DETECTION_RESPONSE, FakeGenerativeModel
+from food_detector import AnnotationStreamParser, parse_detection_response, stream_food_items
+from scheduler import gemini_scheduler
+
+EXPECTED = json.loads(DETECTION_RESPONSE)
+
+def feed_all(chunks):
+    parser = AnnotationStreamParser()
+    annotations = []
+    for chunk in chunks:
+        annotations.extend(parser.feed(chunk))
+    return parser, annotations
+
+def split(text, rng):
+    cuts = sorted(rng.sample(range(1, len(text)), rng.randint(1, min(20, len(text) - 1))))
+    return [text[i:j] for i, j in zip([0] + cuts, cuts + [len(text)])]
+
+@pytest.mark.parametrize("seed", range(20))
+def test_random_chunking(seed):
+    rng = random.Random(seed)
+    _, annotations = feed_all(split(DETECTION_RESPONSE, rng))
+    assert annotations == EXPECTED
+
+def test_one_character_at_a_time():
+    _, annotations = feed_all(DETECTION_RESPONSE)
+    assert annotations == EXPECTED
+
+def test_objects_are_returned_as_soon_as_they_close():
+    parser = AnnotationStreamParser()
+    first_end = DETECTION_RESPONSE.index("}") + 1
+    assert parser.feed(DETECTION_RESPONSE[:first_end - 1]) == []
+    assert parser.feed(DETECTION_RESPONSE[first_end - 1:first_end]) == EXPECTED[:1]
+
+def test_skips_prose_and_code_fence_before_the_array():
+    text = f"Here are the items [as requested]:\n```json\n{DETECTION_RESPONSE}\n```\nDone."
+    parser, annotations = feed_all(split(text, random.Random(1)))
+    assert annotations == EXPECTED
+    assert parser.found_array
+
+def test_braces_and_escaped_quotes_inside_strings():
+    items = [{"label": 'jar of "pickles" {large}', "box_2d": [1, 2, 3, 4]}, {"label": "back\\slash ]", "box_2d": [5, 6, 7, 8]}]
+    text = json.dumps(items)
+    _, annotations = feed_all(text)
+    assert annotations == items
+
+def test_malformed_object_is_skipped():
+    text = '[{"label": "tomato", "box_2d": [1, 2, 3, 4]}, {"label": oops}, {"label": "onion", "box_2d": [5, 6, 7, 8]}]'
+    _, annotations = feed_all(split(text, random.Random(2)))
+    assert [a["label"] for a in annotations] == ["tomato", "onion"]
+
+def test_nested_objects_stay_in_their_annotation():
+    text = '[{"label": "egg", "box_2d": [1, 2, 3, 4], "extra": {"count": 6}}]'
+    _, annotations = feed_all(split(text, random.Random(3)))
+    assert annotations == [{"label": "egg", "box_2d": [1, 2, 3, 4], "extra": {"count": 6}}]
+
+def test_nothing_after_the_array_is_parsed():
+    text = DETECTION_RESPONSE + ' and also [{"label": "ghost"}]'
+    _, annotations = feed_all([text])
+    assert annotations == EXPECTED
+
+def test_truncated_stream_keeps_the_complete_objects():
+    cut = DETECTION_RESPONSE.rindex("{") + 5
+    parser, annotations = feed_all([DETECTION_RESPONSE[:cut]])
+    assert annotations == EXPECTED[:-1]
+    # Nothing is flushed at the end: an unfinished object is dropped rather than guessed at
+    assert parser.feed("") == []
+
+def test_empty_array_and_missing_array():
+    parser, annotations = feed_all(["[", "]"])
+    assert annotations == [] and parser.found_array
+    parser, annotations = feed_all(["no items [here] at all"])
+    assert annotations == [] and not parser.found_array
+
+def test_parse_detection_response():
+    assert parse_detection_response(f"```json\n{DETECTION_RESPONSE}\n```") == EXPECTED
+    assert parse_detection_response("I can't see any food.") == []
+
+@pytest.mark.parametrize("stream_chunks", [1, 3, 50])
+def test_stream_food_items_yields_every_annotation_by_the_end(monkeypatch, stream_chunks):
+    monkeypatch.setattr(gemini_scheduler, "models", lambda name: FakeGenerativeModel(name, stream_chunks=stream_chunks))
+    assert list(stream_food_items(b"image", quick=True)) == EXPECTED
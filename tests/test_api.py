@@ -0,0 +1,143 @@
+"""
+The JSON API's request validation and status codes, against fake_gemini
+models in place of Gemini.
+
+    python -m pytest tests
+"""
+import os
+import sys
+
+import numpy as np
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import api
+from fake_gemini import FakeGenerativeModel
+from image_processor import cv2
+from scheduler import gemini_scheduler
+
+PRO = "gemini-2.5-pro"
+FLASH = "gemini-2.5-flash"
+
+SUGGEST = {"ingredients": ["tomato", "onion"], "diet": "Vegetarian", "cuisine": "Italian", "servings": 2}
+
+@pytest.fixture
+def models(monkeypatch):
+    models = {}
+    monkeypatch.setattr(gemini_scheduler, "models", lambda name: models.setdefault(name, FakeGenerativeModel(name)))
+    return models
+
+@pytest.fixture
+def client(models):
+    app = FastAPI()
+    app.include_router(api.router)
+    return TestClient(app)
+
+def jpeg(seed):
+    # A distinct image per test, so the detection cache doesn't carry over between them
+    pixels = np.random.default_rng(seed).integers(0, 256, (32, 32, 3), dtype=np.uint8)
+    return cv2.imencode(".jpg", pixels)[1].tobytes()
+
+def test_detect_returns_counts_and_caches(client, models):
+    image = jpeg(1)
+    first = client.post("/api/detect", content=image)
+    assert first.status_code == 200
+    assert first.json()["counts"] == {"tomato": 2, "onion": 1, "bell pepper": 1}
+    assert len(first.json()["hash"]) == 64
+    second = client.post("/api/detect", content=image)
+    assert second.json()["cached"] and second.json()["hash"] == first.json()["hash"]
+    assert models[PRO].calls == 1
+
+def test_detect_quick_uses_the_cheaper_model(client, models):
+    response = client.post("/api/detect?quick=true", content=jpeg(2))
+    assert response.status_code == 200
+    assert models[FLASH].calls == 1 and PRO not in models
+
+def test_detect_rejects_undecodable_bytes_before_calling_the_model(client, models):
+    response = client.post("/api/detect", content=b"definitely not an image")
+    assert response.status_code == 400
+    assert response.json() == {"error": "image could not be decoded"}
+    assert not models
+
+def test_detect_rejects_empty_body(client):
+    assert client.post("/api/detect", content=b"").status_code == 400
+
+def test_detect_model_failure_is_502(client, models):
+    models[PRO] = FakeGenerativeModel(PRO, failures=[400])
+    response = client.post("/api/detect", content=jpeg(3))
+    assert response.status_code == 502
+    assert "error" in response.json()
+
+def test_suggest(client):
+    response = client.post("/api/suggest", json=SUGGEST)
+    assert response.status_code == 200
+    assert response.json()["ingredients"] == {"tomato": 1, "onion": 1}
+    assert response.json()["recipes"][0] == "Shakshuka"
+
+def test_suggest_rejects_invalid_json(client):
+    response = client.post("/api/suggest", content=b"{not json", headers={"Content-Type": "application/json"})
+    assert response.status_code == 400
+    assert response.json() == {"error": "body must be valid JSON"}
+
+@pytest.mark.parametrize("field, value, message", [
+    ("ingredients", [], "ingredients must be"),
+    ("ingredients", "tomato", "ingredients must be"),
+    ("ingredients", {"tomato": 0}, "ingredients counts must be positive integers"),
+    ("ingredients", {"tomato": 1.5}, "ingredients counts must be positive integers"),
+    ("ingredients", {"tomato": True}, "ingredients counts must be positive integers"),
+    ("diet", "Carnivore", "diet must be one of"),
+    ("cuisine", "Martian", "cuisine must be one of"),
+    ("servings", 0, "servings must be a positive number"),
+    ("servings", "4", "servings must be a positive number"),
+    ("quick", "false", "quick must be true or false"),
+    ("quick", 1, "quick must be true or false"),
+])
+def test_suggest_rejects_bad_fields(client, models, field, value, message):
+    response = client.post("/api/suggest", json=dict(SUGGEST, **{field: value}))
+    assert response.status_code == 400
+    assert response.json()["error"].startswith(message)
+    assert not models
+
+def test_diet_defaults_to_the_ui_default():
+    body = dict(SUGGEST)
+    del body["diet"]
+    assert api.recipe_request(body)[1] == "Vegetarian"
+
+def test_suggest_quick_uses_the_cheaper_model(client, models):
+    response = client.post("/api/suggest", json=dict(SUGGEST, cuisine="Greek", quick=True))
+    assert response.status_code == 200
+    assert models[FLASH].calls == 1
+
+def test_detail_requires_a_recipe_name(client):
+    response = client.post("/api/detail", json=SUGGEST)
+    assert response.status_code == 400
+    assert response.json() == {"error": "recipe must be a recipe name"}
+
+def test_detail_returns_sections(client):
+    response = client.post("/api/detail", json=dict(SUGGEST, recipe="Shakshuka"))
+    assert response.status_code == 200
+    assert response.json()["sections"]["instructions"]
+
+def test_batch_reports_errors_per_item(client):
+    response = client.post("/api/suggest/batch", json={"requests": [dict(SUGGEST, cuisine="French"), dict(SUGGEST, diet="Carnivore")]})
+    assert response.status_code == 200
+    first, second = response.json()["results"]
+    assert first["recipes"] and "error" not in first
+    assert second["error"].startswith("diet must be one of")
+
+def test_batch_limits(client, monkeypatch):
+    monkeypatch.setattr(api, "API_BATCH_MAX_ITEMS", 2)
+    assert client.post("/api/suggest/batch", json={"requests": [SUGGEST] * 3}).json() == {"error": "at most 2 requests per batch"}
+    assert client.post("/api/detail/batch", json={"requests": []}).status_code == 400
+    assert client.post("/api/suggest/batch", json=[SUGGEST]).status_code == 400
+    files = [("files", (f"{i}.jpg", jpeg(10 + i), "image/jpeg")) for i in range(3)]
+    assert client.post("/api/detect/batch", files=files).json() == {"error": "at most 2 files per batch"}
+
+def test_detect_batch_keeps_filenames(client):
+    files = [("files", ("good.jpg", jpeg(20), "image/jpeg")), ("files", ("bad.jpg", b"nope", "image/jpeg"))]
+    good, bad = client.post("/api/detect/batch", files=files).json()["results"]
+    assert good["filename"] == "good.jpg" and good["counts"]
+    assert bad["filename"] == "bad.jpg" and bad["error"] == "image could not be decoded"
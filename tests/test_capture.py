@@ -0,0 +1,101 @@
+"""
+Continuous capture: perceptual hashing of frames and when a frame's
+detection is reused, refreshed or retried.
+
+    python -m pytest tests
+"""
+import os
+import sys
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import capture
+from capture import ContinuousCapture, hamming_distance, perceptual_hash
+
+TOMATO = [{"label": "tomato", "box_2d": [120, 80, 380, 330]}]
+
+def scene(seed, size=(240, 320)):
+    # Smooth random blobs, so the hash sees structure rather than per-pixel noise
+    rng = np.random.default_rng(seed)
+    small = rng.integers(0, 256, (6, 8, 3)).astype(np.float32)
+    rows = np.linspace(0, small.shape[0] - 1, size[0]).astype(int)
+    cols = np.linspace(0, small.shape[1] - 1, size[1]).astype(int)
+    return small[rows][:, cols].astype(np.uint8)
+
+class ScriptedCapture(ContinuousCapture):
+    # Detection answers from a script instead of the caches and Gemini
+    def __init__(self, results, **kwargs):
+        super().__init__(None, **kwargs)
+        self.results = list(results)
+        self.calls = 0
+
+    def detect(self, image_bytes, image):
+        self.calls += 1
+        return self.results.pop(0)
+
+def test_hamming_distance():
+    assert hamming_distance(0, 0) == 0
+    assert hamming_distance(0b1011, 0b0001) == 2
+    assert hamming_distance(2 ** 64 - 1, 0) == 64
+
+def test_hash_is_stable_under_noise_and_differs_between_scenes():
+    frame = scene(1)
+    noisy = np.clip(frame.astype(int) + np.random.default_rng(0).integers(-4, 5, frame.shape), 0, 255).astype(np.uint8)
+    assert perceptual_hash(frame) == perceptual_hash(frame.copy())
+    assert hamming_distance(perceptual_hash(frame), perceptual_hash(noisy)) <= 4
+    assert hamming_distance(perceptual_hash(frame), perceptual_hash(scene(2))) > 10
+    assert 0 <= perceptual_hash(frame) < 2 ** 64
+
+def test_hash_handles_grayscale_and_small_frames():
+    assert perceptual_hash(scene(1)[..., 0]) >= 0
+    assert perceptual_hash(scene(1, size=(16, 20))) >= 0
+
+def test_unchanged_scene_reuses_annotations():
+    capturer = ScriptedCapture([TOMATO], threshold=10, refresh_seconds=0)
+    first = capturer.submit(scene(1))
+    second = capturer.submit(scene(1))
+    assert first["detected"] and first["counts"] == {"tomato": 1}
+    assert not second["detected"] and second["counts"] == {"tomato": 1}
+    assert capturer.calls == 1
+    assert capturer.totals == {"frames": 2, "detected": 1, "reused": 1, "failed": 0}
+
+def test_changed_scene_is_detected_again():
+    capturer = ScriptedCapture([TOMATO, TOMATO * 2], threshold=10, refresh_seconds=0)
+    capturer.submit(scene(1))
+    record = capturer.submit(scene(2))
+    assert record["detected"] and record["distance"] > 10
+    assert record["counts"] == {"tomato": 2}
+
+def test_threshold_controls_what_counts_as_a_change():
+    capturer = ScriptedCapture([TOMATO], threshold=64, refresh_seconds=0)
+    capturer.submit(scene(1))
+    assert not capturer.submit(scene(2))["detected"]
+
+def test_stale_scene_is_refreshed(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(capture.time, "monotonic", lambda: now[0])
+    capturer = ScriptedCapture([TOMATO, TOMATO], threshold=10, refresh_seconds=30)
+    capturer.submit(scene(1))
+    now[0] += 10
+    assert not capturer.submit(scene(1))["detected"]
+    now[0] += 25
+    assert capturer.submit(scene(1))["detected"]
+    assert capturer.calls == 2
+
+def test_empty_detection_is_a_failure_and_retried():
+    capturer = ScriptedCapture([TOMATO, [], TOMATO * 3], threshold=10, refresh_seconds=0)
+    capturer.submit(scene(1))
+    failed = capturer.submit(scene(2))
+    assert failed["error"] == "no ingredients detected"
+    # The last good scene is kept, so the counts don't drop to nothing
+    assert failed["counts"] == {"tomato": 1}
+    retried = capturer.submit(scene(2))
+    assert retried["detected"] and retried["counts"] == {"tomato": 3}
+    assert capturer.totals == {"frames": 3, "detected": 2, "reused": 0, "failed": 1}
+
+def test_undecodable_frame_fails():
+    capturer = ScriptedCapture([], threshold=10, refresh_seconds=0)
+    record = capturer.submit(b"not an image")
+    assert "error" in record and capturer.totals["failed"] == 1
@@ -0,0 +1,32 @@
+"""
+Singularizing detected labels, so plural and singular names count as one ingredient.
+
+    python -m pytest tests
+"""
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from ingredients import canonical, singular
+
+@pytest.mark.parametrize("plural, expected", [
+    ("tomatoes", "tomato"),
+    ("berries", "berry"),
+    ("peaches", "peach"),
+    ("leaves", "leaf"),
+    ("eggs", "egg"),
+    ("cookies", "cookie"),
+    ("pies", "pie"),
+    ("kiwis", "kiwi"),
+    ("species", "species"),
+    ("hummus", "hummus"),
+    ("asparagus", "asparagus"),
+])
+def test_singular(plural, expected):
+    assert singular(plural) == expected
+
+def test_canonical_strips_display_count():
+    assert canonical("Cherry Tomatoes (3)") == canonical("cherry tomato")
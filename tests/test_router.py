@@ -0,0 +1,64 @@
+"""
+ModelRouter decisions and how a call is attributed when the scheduler
+falls back to another model.
+
+    python -m pytest tests
+"""
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from router import ROUTE_DECISIONS, ModelRouter
+
+PRO = "gemini-2.5-pro"
+FLASH = "gemini-2.5-flash"
+
+def decisions(stage, model, reason):
+    return ROUTE_DECISIONS.values.get((stage, model, reason), 0)
+
+def test_quick_routes_to_the_cheaper_model():
+    router = ModelRouter({PRO: FLASH})
+    assert router.choose("detect", PRO, quick=True) == FLASH
+    with router.route("detect", PRO, quick=True) as route:
+        assert route.model == FLASH and route.reason == "quick"
+
+def test_load_routes_to_the_cheaper_model():
+    router = ModelRouter({PRO: FLASH}, max_in_flight={PRO: 1})
+    with router.route("suggest", PRO):
+        assert router.choose("suggest", PRO) == FLASH
+        with router.route("suggest", PRO) as route:
+            assert route.reason == "load"
+    assert router.choose("suggest", PRO) == PRO
+
+def test_background_routes_do_not_count_as_load():
+    router = ModelRouter({PRO: FLASH}, max_in_flight={PRO: 1})
+    with router.route("detail", PRO, background=True) as prefetch:
+        assert prefetch.model == PRO
+        assert router.in_flight[PRO] == 0 and router.background_in_flight[PRO] == 1
+        with router.route("detail", PRO) as route:
+            assert route.model == PRO and route.reason == "default"
+        prefetch.answered_by(FLASH)
+        assert router.background_in_flight == {PRO: 0, FLASH: 1}
+    assert router.background_in_flight[FLASH] == 0 and router.in_flight[PRO] == 0
+
+def test_pinned_route_keeps_the_chosen_model():
+    router = ModelRouter({PRO: FLASH}, max_in_flight={PRO: 1})
+    chosen = router.choose("detail", PRO)
+    with router.route("detail", PRO):
+        # Load moved on since the choice, but the call stays on the model its cache key names
+        with router.route("detail", PRO, chosen=chosen) as route:
+            assert route.model == PRO
+
+def test_fallback_is_recorded_under_the_model_that_answered():
+    router = ModelRouter({PRO: FLASH})
+    before = decisions("detect", FLASH, "fallback"), decisions("detect", PRO, "default")
+    with router.route("detect", PRO) as route:
+        assert router.in_flight[PRO] == 1
+        route.answered_by(FLASH)
+        assert router.in_flight == {PRO: 0, FLASH: 1}
+    assert route.model == FLASH and route.reason == "fallback"
+    assert decisions("detect", FLASH, "fallback") == before[0] + 1
+    assert decisions("detect", PRO, "default") == before[1]
+    assert router.in_flight[FLASH] == 0
+    assert ("detect", FLASH) in router.latency and ("detect", PRO) not in router.latency
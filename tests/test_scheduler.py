@@ -0,0 +1,123 @@
+"""
+GeminiScheduler against scripted fake_gemini models: retries, fallback,
+hedging and per-attempt timeouts, with no network and no API key.
+
+    python -m pytest tests
+"""
+import asyncio
+import os
+import sys
+import time
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from fake_gemini import DETECTION_RESPONSE, SUGGESTION_RESPONSE, FakeAPIError, FakeGenerativeModel
+from scheduler import GeminiScheduler, TokenBucket
+
+PRO = "gemini-2.5-pro"
+FLASH = "gemini-2.5-flash"
+
+def make_scheduler(models, **kwargs):
+    kwargs.setdefault("backoff_base", 0.001)
+    kwargs.setdefault("deadline", 5.0)
+    return GeminiScheduler(models=models.__getitem__, **kwargs)
+
+def test_retries_rate_limit_and_unavailable():
+    model = FakeGenerativeModel(FLASH, failures=[429, 503])
+    scheduler = make_scheduler({FLASH: model})
+    response = scheduler.call(FLASH, "Suggest recipes")
+    assert response.text == SUGGESTION_RESPONSE
+    assert model.calls == 3
+    assert scheduler.counters[FLASH]["retries"] == 2
+
+def test_does_not_retry_bad_request():
+    model = FakeGenerativeModel(FLASH, failures=[400])
+    scheduler = make_scheduler({FLASH: model})
+    with pytest.raises(FakeAPIError) as raised:
+        scheduler.call(FLASH, "Suggest recipes")
+    assert raised.value.code == 400
+    assert model.calls == 1
+    assert scheduler.counters[FLASH]["retries"] == 0
+
+def test_falls_back_to_flash_when_pro_misses_deadline():
+    pro = FakeGenerativeModel(PRO, latency=2.0)
+    flash = FakeGenerativeModel(FLASH)
+    scheduler = make_scheduler({PRO: pro, FLASH: flash}, fallbacks={PRO: FLASH}, deadline=0.3)
+    start = time.monotonic()
+    response = scheduler.call(PRO, "Suggest recipes")
+    assert response.text == SUGGESTION_RESPONSE
+    # Pro gets its share of the budget, times out, and the retry goes to flash
+    assert time.monotonic() - start < 1.0
+    assert pro.calls == 1 and flash.calls == 1
+    assert scheduler.counters[PRO]["fallbacks"] == 1
+
+def test_reports_the_model_that_answered_after_fallback():
+    pro = FakeGenerativeModel(PRO, latency=2.0)
+    flash = FakeGenerativeModel(FLASH)
+    scheduler = make_scheduler({PRO: pro, FLASH: flash}, fallbacks={PRO: FLASH}, deadline=0.3)
+    answered = []
+    scheduler.call(PRO, "Suggest recipes", on_model=answered.append)
+    assert answered == [FLASH]
+    answered.clear()
+    asyncio.run(make_scheduler({FLASH: flash}).call_async(FLASH, "Suggest recipes", on_model=answered.append))
+    assert answered == [FLASH]
+
+def test_background_calls_leave_the_reserve_for_live_calls():
+    flash = FakeGenerativeModel(FLASH)
+    scheduler = make_scheduler({FLASH: flash}, rate_limits={FLASH: 60}, background_reserve=0.5)
+    scheduler.buckets[FLASH] = TokenBucket(0.6, burst=4)
+    scheduler.call(FLASH, "Suggest recipes", background=True)
+    scheduler.call(FLASH, "Suggest recipes", background=True)
+    # Half the bucket is held back: the next background call is dropped without waiting or borrowing
+    with pytest.raises(RuntimeError, match="background"):
+        scheduler.call(FLASH, "Suggest recipes", background=True)
+    assert flash.calls == 2 and scheduler.counters[FLASH]["deferred"] == 1
+    scheduler.call(FLASH, "Suggest recipes")
+    assert flash.calls == 3
+
+def test_background_calls_do_not_fall_back():
+    pro = FakeGenerativeModel(PRO, latency=2.0)
+    flash = FakeGenerativeModel(FLASH)
+    scheduler = make_scheduler({PRO: pro, FLASH: flash}, fallbacks={PRO: FLASH}, max_attempts=2, deadline=0.3)
+    with pytest.raises((FakeAPIError, TimeoutError)):
+        scheduler.call(PRO, "Suggest recipes", background=True)
+    assert pro.calls >= 1 and flash.calls == 0
+    assert scheduler.counters[PRO]["fallbacks"] == 0
+
+def test_hedge_wins_over_slow_primary():
+    delays = iter([1.0, 0.0])
+    model = FakeGenerativeModel(FLASH, latency=lambda: next(delays))
+    scheduler = make_scheduler({FLASH: model}, hedge_after=0.05)
+    start = time.monotonic()
+    response = scheduler.call(FLASH, ["Find the food", b"image"])
+    assert response.text == DETECTION_RESPONSE
+    assert time.monotonic() - start < 0.5
+    assert model.calls == 2
+    assert scheduler.counters[FLASH]["hedges"] == 1
+
+def test_stalled_sync_stream_is_cut_off():
+    model = FakeGenerativeModel(FLASH, latency=2.0)
+    scheduler = make_scheduler({FLASH: model}, max_attempts=1, deadline=0.2)
+    start = time.monotonic()
+    with pytest.raises(FakeAPIError) as raised:
+        scheduler.call(FLASH, "Recipe details", stream=True)
+    assert raised.value.code == 504
+    assert time.monotonic() - start < 1.0
+
+def test_cyclic_fallback_map_terminates():
+    models = {PRO: FakeGenerativeModel(PRO), FLASH: FakeGenerativeModel(FLASH)}
+    scheduler = make_scheduler(models, fallbacks={PRO: FLASH, FLASH: PRO})
+    # Both models look too slow for the deadline, so each would degrade to the other
+    scheduler.latency.update({PRO: 10.0, FLASH: 10.0})
+    with pytest.raises(TimeoutError):
+        scheduler.call(PRO, "Suggest recipes")
+    assert scheduler.counters[PRO]["fallbacks"] == 1
+
+def test_async_retries_then_succeeds():
+    model = FakeGenerativeModel(FLASH, failures=[503])
+    scheduler = make_scheduler({FLASH: model})
+    response = asyncio.run(scheduler.call_async(FLASH, "Suggest recipes"))
+    assert response.text == SUGGESTION_RESPONSE
+    assert model.calls == 2
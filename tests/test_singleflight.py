@@ -0,0 +1,162 @@
+"""
+SingleFlight coalescing for thread and asyncio callers: one call per key,
+shared errors, and waiters that time out or are cancelled on their own.
+
+    python -m pytest tests
+"""
+import asyncio
+import os
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from concurrent.futures import TimeoutError as FutureTimeoutError
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from singleflight import SingleFlight
+
+class SlowCall:
+    # Counts its calls and holds each one until released, so callers can pile up behind the first
+    def __init__(self, error=None):
+        self.error = error
+        self.calls = 0
+        self.release = threading.Event()
+
+    def __call__(self, *args):
+        self.calls += 1
+        self.release.wait(5)
+        if self.error is not None:
+            raise self.error
+        return {"args": list(args), "items": [1, 2]}
+
+    async def run_async(self, *args):
+        self.calls += 1
+        while not self.release.is_set():
+            await asyncio.sleep(0.005)
+        if self.error is not None:
+            raise self.error
+        return {"args": list(args), "items": [1, 2]}
+
+def wait_for_followers(flight, count):
+    deadline = time.monotonic() + 5
+    while flight.coalesced < count and time.monotonic() < deadline:
+        time.sleep(0.005)
+
+def test_concurrent_callers_share_one_call():
+    flight, call = SingleFlight("test"), SlowCall()
+    with ThreadPoolExecutor(8) as pool:
+        futures = [pool.submit(flight.do, "key", call, "arg") for _ in range(8)]
+        wait_for_followers(flight, 7)
+        call.release.set()
+        results = [future.result() for future in futures]
+    assert call.calls == 1
+    assert flight.leaders == 1 and flight.coalesced == 7
+    assert all(result == {"args": ["arg"], "items": [1, 2]} for result in results)
+
+def test_followers_get_independent_copies():
+    flight, call = SingleFlight("test"), SlowCall()
+    with ThreadPoolExecutor(3) as pool:
+        futures = [pool.submit(flight.do, "key", call) for _ in range(3)]
+        wait_for_followers(flight, 2)
+        call.release.set()
+        results = [future.result() for future in futures]
+    results[0]["items"].append(3)
+    assert results[1]["items"] == [1, 2] and results[2]["items"] == [1, 2]
+    assert len({id(result) for result in results}) == 3
+
+def test_leader_error_reaches_every_caller():
+    flight, call = SingleFlight("test"), SlowCall(error=RuntimeError("boom"))
+    with ThreadPoolExecutor(4) as pool:
+        futures = [pool.submit(flight.do, "key", call) for _ in range(4)]
+        wait_for_followers(flight, 3)
+        call.release.set()
+        for future in futures:
+            with pytest.raises(RuntimeError, match="boom"):
+                future.result()
+    assert call.calls == 1
+
+def test_slot_is_released_after_the_call():
+    flight, call = SingleFlight("test"), SlowCall()
+    call.release.set()
+    flight.do("key", call)
+    flight.do("key", call)
+    assert call.calls == 2 and flight.leaders == 2
+
+def test_follower_timeout_leaves_the_leader_running():
+    flight, call = SingleFlight("test"), SlowCall()
+    with ThreadPoolExecutor(2) as pool:
+        leader = pool.submit(flight.do, "key", call)
+        while flight.leaders == 0:
+            time.sleep(0.005)
+        with pytest.raises(FutureTimeoutError):
+            flight.do("key", call, timeout=0.05)
+        call.release.set()
+        assert leader.result() == {"args": [], "items": [1, 2]}
+    assert call.calls == 1
+
+def test_disabled_runs_every_call():
+    flight, call = SingleFlight("test", enabled=False), SlowCall()
+    call.release.set()
+    flight.do("key", call)
+    flight.do("key", call)
+    assert call.calls == 2 and flight.leaders == 0
+
+def test_async_callers_share_one_call():
+    async def scenario():
+        flight, call = SingleFlight("test"), SlowCall()
+        tasks = [asyncio.ensure_future(flight.do_async("key", call.run_async, "arg")) for _ in range(5)]
+        await asyncio.sleep(0.02)
+        call.release.set()
+        return call, flight, await asyncio.gather(*tasks)
+
+    call, flight, results = asyncio.run(scenario())
+    assert call.calls == 1 and flight.coalesced == 4
+    results[0]["items"].append(3)
+    assert all(result == {"args": ["arg"], "items": [1, 2]} for result in results[1:])
+
+def test_async_leader_error_reaches_followers():
+    async def scenario():
+        flight, call = SingleFlight("test"), SlowCall(error=ValueError("bad"))
+        tasks = [asyncio.ensure_future(flight.do_async("key", call.run_async)) for _ in range(3)]
+        await asyncio.sleep(0.02)
+        call.release.set()
+        return call, await asyncio.gather(*tasks, return_exceptions=True)
+
+    call, results = asyncio.run(scenario())
+    assert call.calls == 1
+    assert all(isinstance(result, ValueError) for result in results)
+
+def test_async_waiter_timeout_only_fails_that_waiter():
+    async def scenario():
+        flight, call = SingleFlight("test"), SlowCall()
+        leader = asyncio.ensure_future(flight.do_async("key", call.run_async))
+        follower = asyncio.ensure_future(flight.do_async("key", call.run_async))
+        await asyncio.sleep(0.01)
+        with pytest.raises(asyncio.TimeoutError):
+            await flight.do_async("key", call.run_async, timeout=0.02)
+        call.release.set()
+        return call, await leader, await follower
+
+    call, leader, follower = asyncio.run(scenario())
+    assert call.calls == 1
+    assert leader == follower == {"args": [], "items": [1, 2]}
+
+def test_cancelling_the_leaders_caller_keeps_the_call_for_followers():
+    async def scenario():
+        flight, call = SingleFlight("test"), SlowCall()
+        leader = asyncio.ensure_future(flight.do_async("key", call.run_async))
+        await asyncio.sleep(0.01)
+        follower = asyncio.ensure_future(flight.do_async("key", call.run_async))
+        await asyncio.sleep(0.01)
+        leader.cancel()
+        await asyncio.sleep(0.01)
+        call.release.set()
+        return call, leader, await follower
+
+    call, leader, follower = asyncio.run(scenario())
+    assert leader.cancelled()
+    assert follower == {"args": [], "items": [1, 2]}
+    assert call.calls == 1
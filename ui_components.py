@@ -1,9 +1,22 @@
+import os
 import gradio as gr
-from image_processor import upload_and_detect
-from recipe_generator import get_recipes, show_recipe_details
-from food_detector import detect_food_items
+from image_processor import ANNOTATION_MODE, upload_and_detect, upload_and_detect_async, upload_and_detect_stream, upload_and_detect_stream_async
+from recipe_generator import (
+    RECIPE_STREAMING, get_recipes, get_recipes_async, show_recipe_details, show_recipe_details_async,
+    show_recipe_details_stream, show_recipe_details_stream_async,
+)
+from recipe_html import RECIPE_COMBINED
+from prompts import CUISINES, DEFAULT_DIET, DIETS
+from food_detector import DETECTION_STREAMING, detect_food_items, detect_food_items_async, stream_food_items, stream_food_items_async
 from utils import parse_recipe_sections  # Added import
 
+# Async handlers run on Gradio's event loop, so in-flight Gemini calls don't pin worker threads
+ASYNC_HANDLERS = os.environ.get("ASYNC_HANDLERS", "true").lower() in ("1", "true", "yes")
+UPLOAD_CONCURRENCY = int(os.environ.get("UPLOAD_CONCURRENCY", "64"))
+SUGGEST_CONCURRENCY = int(os.environ.get("SUGGEST_CONCURRENCY", "128"))
+DETAIL_CONCURRENCY = int(os.environ.get("DETAIL_CONCURRENCY", "128"))
+QUEUE_MAX_SIZE = int(os.environ.get("QUEUE_MAX_SIZE", "512"))
+
 class FoodieTheme(gr.themes.Base):
     def _init_custom_css(self):
         return """
@@ -229,6 +242,110 @@ def create_gradio_interface():
         border: 2px solid rgba(224, 230, 226, 0.8) !important;
         background: rgba(255, 255, 255, 0.9) !important;
     }
+    .detection-overlay {
+        position: relative;
+        line-height: 0;
+    }
+    .detection-overlay img {
+        width: 100%;
+        height: auto;
+        border-radius: 14px;
+    }
+    .detection-box {
+        position: absolute;
+        box-sizing: border-box;
+        border: 3px solid #00ff00;
+    }
+    .detection-label {
+        position: absolute;
+        left: -3px;
+        bottom: 100%;
+        padding: 2px 6px;
+        background: #00ff00;
+        color: #000;
+        font: 700 13px 'Roboto', sans-serif;
+        line-height: 1.2;
+        white-space: nowrap;
+    }
+    
+    /* Recipe cards; recipe_html emits only the class names */
+    .recipe-card {
+        background: linear-gradient(135deg, #1a3c34 0%, #2e6b4e 100%);
+        color: white;
+        padding: 25px;
+        border-radius: 20px;
+        box-shadow: 0 6px 20px rgba(0,0,0,0.15);
+        margin-bottom: 20px;
+    }
+    
+    .recipe-card h2, .recipe-card h3 {
+        display: flex;
+        align-items: center;
+        font-family: 'Playfair Display', serif !important;
+        color: white !important;
+    }
+    
+    .recipe-card h3 {
+        margin: 0 0 15px 0 !important;
+        font-size: 24px !important;
+    }
+    
+    .recipe-card h3 span {
+        margin-right: 10px;
+        font-size: 28px;
+    }
+    
+    .recipe-header {
+        padding: 30px;
+        margin-bottom: 25px;
+        text-align: center;
+    }
+    
+    .recipe-header h2 {
+        justify-content: center;
+        margin: 0 !important;
+        font-size: 32px !important;
+    }
+    
+    .recipe-header h2 span {
+        margin-right: 15px;
+        font-size: 40px;
+    }
+    
+    .recipe-header p, .recipe-body, .recipe-body strong {
+        font-family: 'Roboto', sans-serif;
+        color: #e0e0e0 !important;
+    }
+    
+    .recipe-header p {
+        margin: 10px 0 0 0 !important;
+        font-size: 18px;
+    }
+    
+    .recipe-body {
+        line-height: 1.8;
+        font-size: 16px;
+    }
+    
+    .recipe-instructions {
+        padding: 30px;
+    }
+    
+    .recipe-instructions h3 {
+        margin-bottom: 20px !important;
+    }
+    
+    .recipe-instructions .recipe-body {
+        line-height: 1.9;
+    }
+    
+    .recipe-tips {
+        margin-bottom: 0;
+    }
+    
+    .recipe-error {
+        color: red;
+    }
     
     /* Status box styling */
     .gr-textbox {
@@ -343,20 +460,24 @@ def create_gradio_interface():
                 with gr.Column():
                     gr.Markdown("<h3 class='section-header'>🖼 Upload Your Ingredients</h3>")
                     upload_btn = gr.UploadButton("📸 Upload Image", file_types=["image"], elem_classes=["green-button"])
+                    quick_mode = gr.Checkbox(label="⚡ Quick mode (faster answers from lighter models)", value=False, elem_classes=["green-box"])
                     status = gr.Textbox(label="Status", interactive=False, elem_classes=["green-box"])
                     gr.Markdown("<h3 class='section-header'>🔍 Detected Ingredients</h3>")
-                    annotated_output = gr.Image(label="Ingredient Detection", interactive=False, elem_classes=["image-container"])
+                    if ANNOTATION_MODE == "overlay":
+                        annotated_output = gr.HTML(label="Ingredient Detection", elem_classes=["image-container"])
+                    else:
+                        annotated_output = gr.Image(label="Ingredient Detection", interactive=False, elem_classes=["image-container"])
                 
                 with gr.Column():
                     gr.Markdown("<h3 class='section-header'>🥗 Choose Ingredients</h3>")
                     ingredients_output = gr.CheckboxGroup(label="Ingredients", choices=[], interactive=True, elem_classes=["green-box"])
                     
                     gr.Markdown("<h3 class='section-header'>🍽 Dietary Preference</h3>")
-                    diet_type = gr.Radio(["Vegetarian", "Non-Vegetarian"], label="Diet Type", value="Vegetarian", elem_classes=["green-box"])
+                    diet_type = gr.Radio(list(DIETS), label="Diet Type", value=DEFAULT_DIET, elem_classes=["green-box"])
                     
                     gr.Markdown("<h3 class='section-header'>🌍 Cuisine Style</h3>")
                     cuisine_type = gr.Radio(
-                        ["Italian", "Japanese", "Chinese", "Middle Eastern", "Greek", "Mexican", "French", "Thai", "North Indian", "South Indian", "East Indian", "West Indian"],
+                        list(CUISINES),
                         label="Cuisine",
                         value="Italian",
                         elem_classes=["green-box"]
@@ -381,13 +502,18 @@ def create_gradio_interface():
             
             gr.Markdown("<h2 class='section-header'>🍽 Your Recipe</h2>")
             with gr.Column():
-                recipe_header_section = gr.HTML(label="Recipe Name")
-                ingredients_section = gr.HTML(label="Ingredients")
-                time_section = gr.HTML(label="Time")
-                equipment_section = gr.HTML(label="Equipment")
-                serving_section = gr.HTML(label="Nutrition")
-                instructions_section = gr.HTML(label="Instructions")
-                tips_section = gr.HTML(label="Tips")
+                if RECIPE_COMBINED:
+                    recipe_outputs = [gr.HTML(label="Recipe")]
+                else:
+                    recipe_outputs = [
+                        gr.HTML(label="Recipe Name"),
+                        gr.HTML(label="Ingredients"),
+                        gr.HTML(label="Time"),
+                        gr.HTML(label="Equipment"),
+                        gr.HTML(label="Nutrition"),
+                        gr.HTML(label="Instructions"),
+                        gr.HTML(label="Tips"),
+                    ]
             
             # Developer Credits Section
             gr.HTML("""
@@ -407,24 +533,72 @@ def create_gradio_interface():
             </div>
             """)
 
+        def detect(file, quick):
+            return upload_and_detect(file, detect_food_items, quick)
+        
+        async def detect_async(file, quick):
+            return await upload_and_detect_async(file, detect_food_items_async, quick)
+        
+        def detect_stream(file, quick):
+            yield from upload_and_detect_stream(file, stream_food_items, quick)
+        
+        async def detect_stream_async(file, quick):
+            async for updates in upload_and_detect_stream_async(file, stream_food_items_async, quick):
+                yield updates
+        
+        if DETECTION_STREAMING:
+            detect_fn = detect_stream_async if ASYNC_HANDLERS else detect_stream
+        else:
+            detect_fn = detect_async if ASYNC_HANDLERS else detect
+        
         upload_btn.upload(
-            fn=lambda file: upload_and_detect(file, detect_food_items),
-            inputs=[upload_btn],
-            outputs=[annotated_output, ingredients_output, status]
+            fn=detect_fn,
+            inputs=[upload_btn, quick_mode],
+            outputs=[annotated_output, ingredients_output, status],
+            concurrency_limit=UPLOAD_CONCURRENCY
         )
         
+        # Session hashes let the prefetcher tie background work to the browser tab that asked for it
+        def discover_recipes(selected_ingredients, diet_type, cuisine_type, serving_size, additional_instructions, quick, request: gr.Request):
+            return get_recipes(selected_ingredients, diet_type, cuisine_type, serving_size, additional_instructions, request.session_hash, quick)
+        
+        async def discover_recipes_async(selected_ingredients, diet_type, cuisine_type, serving_size, additional_instructions, quick, request: gr.Request):
+            return await get_recipes_async(selected_ingredients, diet_type, cuisine_type, serving_size, additional_instructions, request.session_hash, quick)
+        
         generate_btn.click(
-            fn=get_recipes,
-            inputs=[ingredients_output, diet_type, cuisine_type, serving_size, additional_instructions],
-            outputs=[recipe_selector]
+            fn=discover_recipes_async if ASYNC_HANDLERS else discover_recipes,
+            inputs=[ingredients_output, diet_type, cuisine_type, serving_size, additional_instructions, quick_mode],
+            outputs=[recipe_selector],
+            concurrency_limit=SUGGEST_CONCURRENCY
         )
         
+        # Gradio only streams from real generator functions, not lambdas returning one
+        def stream_recipe_details(recipe_name, selected_ingredients, diet_type, cuisine_type, serving_size, additional_instructions, quick, request: gr.Request):
+            yield from show_recipe_details_stream(recipe_name, selected_ingredients, diet_type, cuisine_type, serving_size, additional_instructions, request.session_hash, quick)
+        
+        async def stream_recipe_details_async(recipe_name, selected_ingredients, diet_type, cuisine_type, serving_size, additional_instructions, quick, request: gr.Request):
+            async for updates in show_recipe_details_stream_async(recipe_name, selected_ingredients, diet_type, cuisine_type, serving_size, additional_instructions, request.session_hash, quick):
+                yield updates
+        
+        def recipe_details(recipe_name, selected_ingredients, diet_type, cuisine_type, serving_size, additional_instructions, quick, request: gr.Request):
+            return show_recipe_details(recipe_name, selected_ingredients, diet_type, cuisine_type, serving_size, additional_instructions, parse_recipe_sections, request.session_hash, quick)
+        
+        async def recipe_details_async(recipe_name, selected_ingredients, diet_type, cuisine_type, serving_size, additional_instructions, quick, request: gr.Request):
+            return await show_recipe_details_async(recipe_name, selected_ingredients, diet_type, cuisine_type, serving_size, additional_instructions, parse_recipe_sections, request.session_hash, quick)
+        
+        if RECIPE_STREAMING:
+            details_fn = stream_recipe_details_async if ASYNC_HANDLERS else stream_recipe_details
+        else:
+            details_fn = recipe_details_async if ASYNC_HANDLERS else recipe_details
+        
         show_btn.click(
-            fn=lambda *args: show_recipe_details(*args, parse_recipe_sections),
-            inputs=[recipe_selector, ingredients_output, diet_type, cuisine_type, serving_size, additional_instructions],
-            outputs=[recipe_header_section, ingredients_section, time_section, equipment_section, serving_section, instructions_section, tips_section]
+            fn=details_fn,
+            inputs=[recipe_selector, ingredients_output, diet_type, cuisine_type, serving_size, additional_instructions, quick_mode],
+            outputs=recipe_outputs,
+            concurrency_limit=DETAIL_CONCURRENCY
         )
     
+    demo.queue(max_size=QUEUE_MAX_SIZE)
     return demo
 
 # Run the interface
@@ -1,64 +1,163 @@
+import json
 import re
 from collections import Counter
+from ingredients import vocabulary
+from metrics import instrument
 
 def count_food_items(annotations):
-    food_counts = Counter()
-    for ann in annotations:
-        if "label" in ann:
-            label = ann["label"].strip().lower()
-            food_counts[label] += 1
-    return food_counts
+    # Keyed by canonical ingredient name, so "Tomatoes" and "roma tomato" count together
+    counts = vocabulary.counts(ann["label"] for ann in annotations if "label" in ann)
+    return Counter(dict(counts.items()))
 
+RECIPE_SECTION_HEADERS = [
+    ('INGREDIENTS:', 'ingredients'),
+    ('PREP TIME:', 'prep_time'),
+    ('COOK TIME:', 'cook_time'),
+    ('EQUIPMENT NEEDED:', 'equipment'),
+    ('SERVING SIZE:', 'serving_size'),
+    ('CALORIES:', 'calories'),
+    ('INSTRUCTIONS:', 'instructions'),
+    ('TIPS FOR SUCCESS:', 'tips'),
+]
+
+def empty_recipe_sections():
+    return {section: '' for _, section in RECIPE_SECTION_HEADERS}
+
+def match_section_header(line):
+    upper = line.upper()
+    for header, section in RECIPE_SECTION_HEADERS:
+        if header in upper:
+            return section
+    return None
+
+def _feed_recipe_line(sections, current_section, line):
+    # Returns the section that subsequent lines belong to
+    line = line.strip()
+    if not line:
+        return current_section
+        
+    line = re.sub(r'\*+', '', line)
+    
+    section = match_section_header(line)
+    if section:
+        return section
+    if current_section:
+        if sections[current_section]:
+            sections[current_section] += '\n' + line
+        else:
+            sections[current_section] = line
+    return current_section
+
+@instrument("parse_recipe")
 def parse_recipe_sections(recipe_text):
-    sections = {
-        'ingredients': '',
-        'prep_time': '',
-        'cook_time': '',
-        'equipment': '',
-        'serving_size': '',
-        'calories': '',
-        'instructions': '',
-        'tips': ''
-    }
+    sections = empty_recipe_sections()
     
     current_section = None
-    lines = recipe_text.split('\n')
+    for line in recipe_text.split('\n'):
+        current_section = _feed_recipe_line(sections, current_section, line)
     
-    for line in lines:
-        line = line.strip()
-        if not line:
-            continue
-            
-        line = re.sub(r'\*+', '', line)
+    return sections
+
+class RecipeSectionParser:
+    """
+    Incrementally parse streamed recipe text. A section counts as complete once
+    the next header arrives, or when close() is called at the end of the stream.
+    """
+    def __init__(self):
+        self.sections = empty_recipe_sections()
+        self.completed = set()
+        self.current_section = None
+        self._buffer = ''
+    
+    def feed(self, chunk):
+        # Returns True when the chunk completed at least one section
+        self._buffer += chunk
+        lines = self._buffer.split('\n')
+        self._buffer = lines.pop()
         
-        if 'INGREDIENTS:' in line.upper():
-            current_section = 'ingredients'
-            continue
-        elif 'PREP TIME:' in line.upper():
-            current_section = 'prep_time'
-            continue
-        elif 'COOK TIME:' in line.upper():
-            current_section = 'cook_time'
-            continue
-        elif 'EQUIPMENT NEEDED:' in line.upper():
-            current_section = 'equipment'
-            continue
-        elif 'SERVING SIZE:' in line.upper():
-            current_section = 'serving_size'
-            continue
-        elif 'CALORIES:' in line.upper():
-            current_section = 'calories'
-            continue
-        elif 'INSTRUCTIONS:' in line.upper():
-            current_section = 'instructions'
-            continue
-        elif 'TIPS FOR SUCCESS:' in line.upper():
-            current_section = 'tips'
-            continue
-        elif current_section:
-            if sections[current_section]:
-                sections[current_section] += '\n' + line
-            else:
-                sections[current_section] = line
+        closed = False
+        for line in lines:
+            next_section = _feed_recipe_line(self.sections, self.current_section, line)
+            if next_section != self.current_section and self.current_section:
+                self.completed.add(self.current_section)
+                closed = True
+            self.current_section = next_section
+        return closed
     
-    return sections
\ No newline at end of file
+    def close(self):
+        _feed_recipe_line(self.sections, self.current_section, self._buffer)
+        self._buffer = ''
+        self.completed = set(self.sections)
+
+STRUCTURED_RECIPE_SCHEMA = {
+    "type": "object",
+    "properties": {
+        "ingredients": {"type": "array", "items": {"type": "string"}},
+        "prep_minutes": {"type": "integer"},
+        "cook_minutes": {"type": "integer"},
+        "equipment": {"type": "array", "items": {"type": "string"}},
+        "serving_size": {"type": "integer"},
+        "calories_per_serving": {"type": "integer"},
+        "instructions": {"type": "array", "items": {"type": "string"}},
+        "tips": {"type": "array", "items": {"type": "string"}},
+    },
+    "required": ["ingredients", "prep_minutes", "cook_minutes", "equipment", "calories_per_serving", "instructions", "tips"],
+}
+
+def validate_structured_recipe(data):
+    if not isinstance(data, dict):
+        raise ValueError("recipe is not a JSON object")
+    recipe = {}
+    for field, spec in STRUCTURED_RECIPE_SCHEMA["properties"].items():
+        value = data.get(field)
+        if value is None:
+            if field in STRUCTURED_RECIPE_SCHEMA["required"]:
+                raise ValueError(f"missing field: {field}")
+            continue
+        if spec["type"] == "array":
+            if not isinstance(value, list) or not all(isinstance(item, (str, int, float)) for item in value):
+                raise ValueError(f"{field} must be a list of strings")
+            value = [str(item).strip() for item in value if str(item).strip()]
+            if not value and field in ("ingredients", "instructions"):
+                raise ValueError(f"{field} is empty")
+        else:
+            # Models occasionally send "15" or "15 minutes" despite the schema
+            match = re.match(r'\s*(\d+(?:\.\d+)?)', str(value))
+            if isinstance(value, bool) or not match:
+                raise ValueError(f"{field} must be a number")
+            value = round(float(match.group(1)))
+        recipe[field] = value
+    return recipe
+
+def structured_recipe_to_sections(recipe):
+    sections = empty_recipe_sections()
+    sections['ingredients'] = '\n'.join(recipe['ingredients'])
+    sections['prep_time'] = str(recipe['prep_minutes'])
+    sections['cook_time'] = str(recipe['cook_minutes'])
+    sections['equipment'] = '\n'.join(recipe['equipment'])
+    sections['serving_size'] = str(recipe.get('serving_size', ''))
+    sections['calories'] = str(recipe['calories_per_serving'])
+    sections['instructions'] = '\n'.join(
+        step if re.match(r'^\d+[.)]\s', step) else f"{i}. {step}"
+        for i, step in enumerate(recipe['instructions'], 1)
+    )
+    sections['tips'] = '\n'.join(recipe['tips'])
+    return sections
+
+@instrument("parse_recipe_json")
+def parse_structured_recipe(recipe_text):
+    """
+    Parse a schema-constrained JSON recipe into the same sections dict that
+    parse_recipe_sections returns. Returns None when the text is not a valid
+    structured recipe, so callers can fall back to the text parser.
+    """
+    text = recipe_text.strip()
+    if text.startswith("```"):
+        text = re.sub(r'^```(?:json)?\s*|\s*```$', '', text)
+    if not text.startswith("{"):
+        return None
+    try:
+        return structured_recipe_to_sections(validate_structured_recipe(json.loads(text)))
+    except ValueError as e:
+        print(f"⚠ Structured recipe rejected, falling back to text parsing: {e}")
+        return None